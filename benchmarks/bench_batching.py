@@ -0,0 +1,65 @@
+"""
+    benchmarks.bench_batching
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares outbound datagram throughput of batched `sendmmsg` flushing against one `sendto` per datagram.
+
+    Usage: python benchmarks/bench_batching.py [--datagrams N] [--fanout N] [--size BYTES]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from kettle import get_event_loop
+from kettle.batching import HAS_SENDMMSG, OutboundQueue
+
+
+def run(loop, batch, datagrams, fanout, size):
+    """
+    Send `datagrams` datagrams in groups of `fanout` per loop iteration and return the measured results.
+
+    Only the sending side is measured. The receiver shares the loop and reads one datagram per iteration, so
+    most datagrams overflow its socket buffer; counting what it receives would measure that, not batching.
+    """
+    receiver_transport, _ = loop.run_until_complete(
+        loop.create_datagram_endpoint(asyncio.DatagramProtocol, local_addr=('127.0.0.1', 0)))
+    sender_transport, _ = loop.run_until_complete(
+        loop.create_datagram_endpoint(asyncio.DatagramProtocol, local_addr=('127.0.0.1', 0)))
+
+    address = receiver_transport.get_extra_info('sockname')
+    queue = OutboundQueue(sender_transport, loop, batch=batch)
+    payload = b'x' * size
+
+    start = time.perf_counter()
+    for _ in range(0, datagrams, fanout):
+        for _ in range(fanout):
+            queue.append(payload, address)
+        loop.run_until_complete(asyncio.sleep(0, loop=loop))
+    elapsed = time.perf_counter() - start
+
+    sender_transport.close()
+    receiver_transport.close()
+
+    return dict(benchmark='batching', path='sendmmsg' if batch else 'sendto', datagrams=datagrams, fanout=fanout,
+                size=size, seconds=elapsed, datagrams_per_second=datagrams / elapsed, syscalls=queue.syscalls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--datagrams', type=int, default=100000, help='Total datagrams to send per path')
+    parser.add_argument('--fanout', type=int, default=32, help='Datagrams produced per loop iteration')
+    parser.add_argument('--size', type=int, default=128, help='Datagram payload size in bytes')
+    args = parser.parse_args()
+
+    loop = get_event_loop()
+    paths = [False, True] if HAS_SENDMMSG else [False]
+    for batch in paths:
+        print(json.dumps(run(loop, batch, args.datagrams, args.fanout, args.size), sort_keys=True))
+
+    if not HAS_SENDMMSG:
+        print('# sendmmsg unavailable on this platform; only the sendto path was measured')
+
+
+if __name__ == '__main__':
+    main()
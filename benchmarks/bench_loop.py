@@ -0,0 +1,76 @@
+"""
+    benchmarks.bench_loop
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Measures ping round-trip throughput between two local nodes on the standard library and `uvloop` event loops.
+
+    Usage: python benchmarks/bench_loop.py [--loop stdlib|uvloop|both] [--requests N] [--concurrency N]
+"""
+import argparse
+import asyncio
+import functools
+import json
+import subprocess
+import sys
+import time
+
+from kettle import get_event_loop
+from kettle.admission import AdmissionController
+from kettle.meta import resolve_type
+from kettle.node import Node
+from kettle.protocol import ServerProtocol
+
+
+def run(fast, requests, concurrency, port):
+    """
+    Send `requests` pings from one node to another, `concurrency` at a time, and return the measured results.
+    """
+    # A single client sending as fast as it can must not be rate limited by the server.
+    ServerProtocol.admission_factory = functools.partial(AdmissionController, rate=1e9, burst=1e9)
+
+    loop = get_event_loop(fast=fast)
+    server = Node(('127.0.0.1', port), loop=loop)
+    client = Node(('127.0.0.1', port + 1), loop=loop)
+    server.listen()
+    client.listen()
+
+    completed = failed = 0
+    start = time.perf_counter()
+    for _ in range(0, requests, concurrency):
+        pings = [client.ping(server.address) for _ in range(concurrency)]
+        for result in loop.run_until_complete(asyncio.gather(*pings, loop=loop, return_exceptions=True)):
+            if isinstance(result, Exception):
+                failed += 1
+            else:
+                completed += 1
+    elapsed = time.perf_counter() - start
+
+    client.disconnect()
+    server.disconnect()
+
+    return dict(benchmark='loop', loop=resolve_type(loop), requests=requests, concurrency=concurrency,
+                seconds=elapsed, completed=completed, failed=failed, requests_per_second=completed / elapsed,
+                datagrams_per_second=2 * completed / elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loop', choices=('stdlib', 'uvloop', 'both'), default='both', help='Event loop to measure')
+    parser.add_argument('--requests', type=int, default=20000, help='Total number of ping requests')
+    parser.add_argument('--concurrency', type=int, default=64, help='Number of outstanding ping requests')
+    parser.add_argument('--port', type=int, default=9800, help='First of two local ports to listen on')
+    args = parser.parse_args()
+
+    # The loop policy is process wide, so each loop is measured in its own interpreter.
+    if args.loop == 'both':
+        for name in ('stdlib', 'uvloop'):
+            subprocess.check_call([sys.executable, __file__, '--loop', name, '--requests', str(args.requests),
+                                   '--concurrency', str(args.concurrency), '--port', str(args.port)])
+        return
+
+    fast = args.loop == 'uvloop'
+    print(json.dumps(run(fast, args.requests, args.concurrency, args.port), sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""
+    benchmarks.bench_micro
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures each stage a datagram passes through on its way through a node, one benchmark per stage.
+
+    Every benchmark is timed with :mod:`timeit`: the loop count is calibrated so a run takes at least 0.2s and
+    the best, median and worst time per operation over `--repeat` runs is reported, in nanoseconds. Results are
+    printed as one JSON line per benchmark and can be saved with `--output` and compared against a saved run
+    with `--compare` to check an optimization before and after.
+
+    Usage: python benchmarks/bench_micro.py [--bench NAME ...] [--repeat N] [--output FILE] [--compare FILE]
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import collections
+import functools
+import itertools
+import json
+import platform
+import random
+import statistics
+import time
+import timeit
+
+from kettle import get_event_loop
+from kettle.admission import AdmissionController
+from kettle.codec import JSONCodec
+from kettle.constants import DEFAULT_OFFLOAD_THRESHOLD
+from kettle.id import Id, NodeId
+from kettle.message import Message
+from kettle.node import Node
+from kettle.protocol import ServerProtocol
+from kettle.routing import RoutingTable
+
+
+#: Version of the results format written by `--output`.
+FORMAT_VERSION = 1
+
+
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(func):
+    """
+    Register a function that sets up a benchmark and returns the callable to time.
+    """
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def random_node(rng, n):
+    return NodeId(('10.0.{}.{}'.format(n >> 8 & 0xff, n & 0xff), 8800), rng.getrandbits(160))
+
+
+def messages(rng):
+    """
+    Return a `find_node` request and its response carrying `k` triples, as sent on the wire.
+    """
+    nodes = [random_node(rng, n) for n in range(20)]
+    request = Message.request(nodes[0].id, nodes[0].address, 'find_node', (Id.random(),))
+    response = Message.response(nodes[1].id, nodes[1].address, 'find_node', request.rpc_id,
+                                [n.to_triple() for n in nodes])
+    return request, response
+
+
+def table(rng, count=1000):
+    """
+    Return a routing table filled with `count` random nodes, and those nodes.
+    """
+    owner = collections.namedtuple('Owner', 'node_id')(random_node(rng, 0))
+    routing = RoutingTable(owner)
+    nodes = [random_node(rng, n) for n in range(1, count + 1)]
+    for node_id in nodes:
+        routing.update(node_id)
+    return routing, nodes
+
+
+@benchmark
+def codec_encode(rng):
+    codec, (_, response) = JSONCodec(), messages(rng)
+    data = response.to_dict()
+    return lambda: codec.encode(data)
+
+
+@benchmark
+def codec_decode(rng):
+    codec, (_, response) = JSONCodec(), messages(rng)
+    data = codec.encode(response.to_dict())
+    return lambda: codec.decode(data)
+
+
+@benchmark
+def codec_encode_offload_threshold(rng):
+    codec, node = JSONCodec(), random_node(rng, 1)
+    request = Message.request(node.id, node.address, 'store', (Id.random(), 'x' * DEFAULT_OFFLOAD_THRESHOLD))
+    data = request.to_dict()
+    return lambda: codec.encode(data)
+
+
+@benchmark
+def message_to_dict(rng):
+    _, response = messages(rng)
+    return response.to_dict
+
+
+@benchmark
+def message_from_dict(rng):
+    _, response = messages(rng)
+    data = JSONCodec().decode(JSONCodec().encode(response.to_dict()))
+    return lambda: Message.from_dict(data)
+
+
+@benchmark
+def node_id_new(rng):
+    address, key = ('10.0.0.1', 8800), rng.getrandbits(160)
+    return lambda: NodeId(address, key)
+
+
+@benchmark
+def node_id_from_triple(rng):
+    triple = random_node(rng, 1).to_triple()
+    return lambda: NodeId.from_triple(triple)
+
+
+@benchmark
+def get_distance_bit(rng):
+    a, b = random_node(rng, 1), random_node(rng, 2)
+    return lambda: a.get_distance_bit(b)
+
+
+@benchmark
+def routing_table_update(rng):
+    routing, nodes = table(rng)
+    nodes = itertools.cycle(nodes)
+    return lambda: routing.update(next(nodes))
+
+
+@benchmark
+def find_k_closest_nodes_triples(rng):
+    routing, _ = table(rng)
+    key = rng.getrandbits(160)
+    return lambda: routing.find_k_closest_nodes_triples(key)
+
+
+def measure(func, repeat):
+    """
+    Time the given callable and return the best, median and worst nanoseconds per call.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, number)
+    timings = [t / number * 1e9 for t in timer.repeat(repeat, number)]
+    return number, dict(min=min(timings), median=statistics.median(timings), max=max(timings))
+
+
+def measure_round_trip(repeat, port):
+    """
+    Time ping requests between two nodes over local UDP sockets, one in flight at a time, so each covers
+    encoding, `datagram_received`, dispatch and the response on both sides.
+    """
+    # Admission control stays in the path, but one client pinging back to back must not be rate limited.
+    ServerProtocol.admission_factory = functools.partial(AdmissionController, rate=1e9, burst=1e9)
+
+    loop = get_event_loop()
+    server = Node(('127.0.0.1', port), loop=loop)
+    client = Node(('127.0.0.1', port + 1), loop=loop)
+    server.listen()
+    client.listen()
+
+    @asyncio.coroutine
+    def pings(count):
+        for _ in range(count):
+            yield from client.ping(server.address)
+
+    number = 1000
+    loop.run_until_complete(pings(number // 10))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loop.run_until_complete(pings(number))
+        timings.append((time.perf_counter() - start) / number * 1e9)
+
+    client.disconnect()
+    server.disconnect()
+    return number, dict(min=min(timings), median=statistics.median(timings), max=max(timings))
+
+
+def measure_offload(repeat):
+    """
+    Time handing a trivial call to a thread pool and waiting for its result on the event loop, the overhead
+    :class:`~kettle.offload.Offloader` adds to work it moves off the loop.
+    """
+    loop = get_event_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(1)
+
+    @asyncio.coroutine
+    def calls(count):
+        for _ in range(count):
+            yield from loop.run_in_executor(executor, len, b'')
+
+    number = 1000
+    loop.run_until_complete(calls(number // 10))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loop.run_until_complete(calls(number))
+        timings.append((time.perf_counter() - start) / number * 1e9)
+
+    executor.shutdown()
+    return number, dict(min=min(timings), median=statistics.median(timings), max=max(timings))
+
+
+def compare(results, path):
+    """
+    Print the change in median time of each benchmark against the results saved in the given file.
+    """
+    with open(path) as f:
+        baseline = json.load(f)['results']
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['ns_per_op']['median'], result['ns_per_op']['median']
+        print(json.dumps(dict(benchmark='micro-compare', name=name, before=before, after=after,
+                              ratio=after / before), sort_keys=True))
+
+
+def main():
+    names = list(BENCHMARKS) + ['offload', 'round_trip']
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bench', nargs='+', choices=names, default=names, help='Benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs per benchmark')
+    parser.add_argument('--port', type=int, default=9850, help='First of two local ports for the round trip')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the generated nodes and keys')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Compare against results previously written with --output')
+    args = parser.parse_args()
+
+    results = collections.OrderedDict()
+    for name in args.bench:
+        rng = random.Random(args.seed)
+        if name == 'round_trip':
+            number, timings = measure_round_trip(args.repeat, args.port)
+        elif name == 'offload':
+            number, timings = measure_offload(args.repeat)
+        else:
+            number, timings = measure(BENCHMARKS[name](rng), args.repeat)
+        results[name] = dict(benchmark='micro', name=name, loops=number, repeat=args.repeat, ns_per_op=timings)
+        print(json.dumps(results[name], sort_keys=True))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(version=FORMAT_VERSION, python=platform.python_version(),
+                           implementation=platform.python_implementation(), results=results), f, indent=2,
+                      sort_keys=True)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
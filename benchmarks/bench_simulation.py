@@ -0,0 +1,334 @@
+"""
+    benchmarks.bench_simulation
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Simulates a network of thousands of nodes in one process over a loopback network and measures lookups.
+
+    Every workload builds and bootstraps a fresh network, stores `--keys` keys and then runs one of:
+
+    * `mix`: stores of new keys interleaved with lookups of uniformly chosen stored keys.
+    * `churn`: lookups of stored keys after a fraction of the nodes left and as many new nodes joined.
+    * `hotkeys`: lookups of stored keys chosen with a Zipf distribution so a few keys take most of the load.
+
+    Each workload prints one JSON line with lookup hops, rpcs per lookup, latency percentiles, routing table
+    fill, memory per node, and the requests that timed out or were answered too late. Runs with the same
+    arguments and seed are reproducible.
+
+    By default the network runs on a virtual clock that only advances while the loop waits for a timer, so
+    latencies and timeouts come from the simulated links however long the process takes to simulate them.
+    With `--clock real` a busy loop delays every datagram; a run where any response arrived after its request
+    timed out is marked `saturated` and the script exits with status 1.
+
+    Usage: python benchmarks/bench_simulation.py [--workload mix|churn|hotkeys|all] [--nodes N] [--operations N]
+"""
+import argparse
+import asyncio
+import bisect
+import collections
+import functools
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from kettle import get_event_loop
+from kettle.blocking import all_tasks
+from kettle.admission import AdmissionController
+from kettle.breaker import CircuitBreaker
+from kettle.connection import ServerConnection
+from kettle.id import Id
+from kettle.lookup import Lookup
+from kettle.loopback import LoopbackNetwork, VirtualClockEventLoop
+from kettle.node import Node
+from kettle.protocol import ServerProtocol
+
+
+WORKLOADS = ('mix', 'churn', 'hotkeys')
+
+
+#: Protocol counters summed over every node that took part in a run.
+PROTOCOL_COUNTERS = ('late', 'timeouts', 'errors')
+
+
+def percentile(values, p):
+    """
+    Return the `p` percentile (0-100) of the given sorted values, or `None` if there aren't any.
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def summarize(values, scale=1):
+    """
+    Return the mean and common percentiles of the given values, multiplied by `scale`.
+    """
+    values = sorted(v * scale for v in values)
+    return dict(mean=sum(values) / len(values) if values else None, p50=percentile(values, 50),
+                p90=percentile(values, 90), p99=percentile(values, 99), max=values[-1] if values else None)
+
+
+class Simulation:
+    """
+    A network of nodes that talk over a :class:`~kettle.loopback.LoopbackNetwork` on one event loop.
+    """
+
+    def __init__(self, loop, network, rng, concurrency):
+        self.loop = loop
+        self.network = network
+        self.rng = rng
+        self.concurrency = concurrency
+        self.nodes = []
+        self.spawned = 0
+        self.keys = []
+        self.lookups = []
+        self.retired = collections.Counter()
+
+    def spawn(self):
+        """
+        Create a node on the next free simulated address and start listening.
+        """
+        self.spawned += 1
+        n = self.spawned
+        address = ('10.{}.{}.{}'.format(n >> 16 & 0xff, n >> 8 & 0xff, n & 0xff), 8800)
+        connection = ServerConnection(address, self.loop, network=self.network)
+        node = Node(address, loop=self.loop, id=self.rng.getrandbits(160), connection=connection)
+        node.listen()
+        return node
+
+    def join(self, count, batch):
+        """
+        Add `count` nodes, bootstrapping `batch` at a time from random members of the network.
+        """
+        if not self.nodes:
+            self.nodes.append(self.spawn())
+            count -= 1
+
+        while count > 0:
+            size = min(batch, count)
+            joining = [self.spawn() for _ in range(size)]
+            seeds = [self.rng.choice(self.nodes).address for _ in joining]
+            self.loop.run_until_complete(asyncio.gather(*(n.bootstrap([s]) for n, s in zip(joining, seeds)),
+                                                        loop=self.loop, return_exceptions=True))
+            self.nodes.extend(joining)
+            count -= size
+
+    def leave(self, count):
+        """
+        Disconnect `count` random nodes without warning.
+        """
+        for _ in range(count):
+            node = self.nodes.pop(self.rng.randrange(len(self.nodes)))
+            self.retired.update(self.node_counters(node))
+            node.disconnect()
+
+    @asyncio.coroutine
+    def put(self, key, value):
+        """
+        Store a value on the `k` nodes closest to the key, starting from a random node.
+        """
+        node = self.rng.choice(self.nodes)
+        key_id = Id.from_key(key)
+        nodes = yield from Lookup(node, key_id, node.find_node, node.alpha, node.table.k).run()
+        yield from asyncio.gather(*(node.store(n, key_id, value) for n in nodes), loop=self.loop,
+                                  return_exceptions=True)
+        self.keys.append(key)
+
+    @asyncio.coroutine
+    def get(self, key):
+        """
+        Look up a value from a random node and record the lookup.
+        """
+        node = self.rng.choice(self.nodes)
+        lookup = Lookup(node, Id.from_key(key), node.find_value, node.alpha, node.table.k, value=True)
+        start = self.loop.time()
+        try:
+            yield from lookup.run()
+        except KeyError:
+            pass
+        self.lookups.append((lookup, self.loop.time() - start))
+
+    def run(self, operations):
+        """
+        Run the given zero-argument coroutine functions, `concurrency` at a time.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency, loop=self.loop)
+
+        @asyncio.coroutine
+        def limited(operation):
+            yield from semaphore.acquire()
+            try:
+                yield from operation()
+            finally:
+                semaphore.release()
+
+        self.loop.run_until_complete(asyncio.gather(*(limited(op) for op in operations), loop=self.loop,
+                                                    return_exceptions=True))
+
+    def populate(self, count):
+        """
+        Store `count` keys.
+        """
+        keys = ['key-{}'.format(i) for i in range(count)]
+        self.run([lambda key=key: self.put(key, key) for key in keys])
+
+    def table_fill(self):
+        """
+        Return the mean number of contacts, cached contacts and non-empty buckets per routing table.
+        """
+        contacts = cached = buckets = 0
+        for node in self.nodes:
+            for bucket in node.table:
+                contacts += len(bucket.bucket)
+                cached += len(bucket.cache)
+                buckets += 1 if bucket.bucket else 0
+        count = len(self.nodes)
+        return dict(contacts=contacts / count, cached=cached / count, buckets=buckets / count)
+
+    @staticmethod
+    def node_counters(node):
+        """
+        Return the :data:`PROTOCOL_COUNTERS` of a node's protocol.
+        """
+        stats = node.connection.protocol.stats()
+        return collections.Counter({name: stats.get(name, 0) for name in PROTOCOL_COUNTERS})
+
+    def protocol_counters(self):
+        """
+        Return the :data:`PROTOCOL_COUNTERS` summed over current and departed nodes.
+        """
+        counters = collections.Counter({name: 0 for name in PROTOCOL_COUNTERS})
+        counters.update(self.retired)
+        for node in self.nodes:
+            counters.update(self.node_counters(node))
+        return dict(counters)
+
+    def report(self):
+        """
+        Return the measurements of the lookups made so far.
+        """
+        lookups = [lookup for lookup, _ in self.lookups]
+        requests = self.protocol_counters()
+        return dict(lookups=len(lookups), found=sum(1 for l in lookups if l.found) / max(1, len(lookups)),
+                    hops=summarize([l.hops for l in lookups]), rpcs=summarize([l.rpcs for l in lookups]),
+                    failures=summarize([l.failures for l in lookups]),
+                    latency_ms=summarize([latency for _, latency in self.lookups], 1000),
+                    table=self.table_fill(), requests=requests, saturated=requests['late'] > 0)
+
+    def close(self):
+        for node in self.nodes:
+            node.disconnect()
+        self.nodes = []
+
+
+def zipf_sampler(rng, count, exponent):
+    """
+    Return a function that picks an index below `count` with a Zipf distribution.
+    """
+    totals, total = [], 0.0
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** exponent
+        totals.append(total)
+    return lambda: bisect.bisect_left(totals, rng.random() * total)
+
+
+def run(workload, args):
+    """
+    Build a network, run the workload on it and return the measured results.
+    """
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+    if args.clock == 'virtual':
+        loop = VirtualClockEventLoop()
+        # Rate limits and circuit timers must follow the simulated time, not the time taken to simulate it.
+        ServerProtocol.admission_factory = functools.partial(AdmissionController, clock=loop.time)
+        Node.breaker_factory = functools.partial(CircuitBreaker, clock=loop.time)
+    else:
+        loop = get_event_loop()
+    network = LoopbackNetwork(loop, latency=args.latency, jitter=args.jitter, loss=args.loss, seed=args.seed)
+    sim = Simulation(loop, network, rng, args.concurrency)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start, loop_start = time.perf_counter(), loop.time()
+    sim.join(args.nodes, args.join_batch)
+    bootstrap_seconds = time.perf_counter() - start
+    bootstrap_loop_seconds = loop.time() - loop_start
+    memory = (tracemalloc.get_traced_memory()[0] - baseline) / args.nodes
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    sim.populate(args.keys)
+    if workload == 'mix':
+        operations = []
+        for i in range(args.keys, args.keys + args.operations):
+            if rng.random() < args.store_ratio:
+                operations.append(lambda key='key-{}'.format(i): sim.put(key, key))
+            else:
+                operations.append(lambda: sim.get(rng.choice(sim.keys)))
+        sim.run(operations)
+    else:
+        if workload == 'churn':
+            changed = int(len(sim.nodes) * args.churn)
+            sim.leave(changed)
+            sim.join(changed, args.join_batch)
+            choose = lambda: rng.choice(sim.keys)
+        else:
+            sample = zipf_sampler(rng, len(sim.keys), args.zipf)
+            choose = lambda: sim.keys[sample()]
+        sim.run([lambda: sim.get(choose()) for _ in range(args.operations)])
+    seconds = time.perf_counter() - start
+
+    result = dict(benchmark='simulation', workload=workload, nodes=args.nodes, operations=args.operations,
+                  seed=args.seed, latency=args.latency, loss=args.loss, clock=args.clock,
+                  bootstrap_seconds=bootstrap_seconds, bootstrap_loop_seconds=bootstrap_loop_seconds,
+                  seconds=seconds, memory_per_node=memory, network=dict(network.counters))
+    result.update(sim.report())
+    sim.close()
+    if args.clock == 'virtual':
+        # Probes and refreshes started by the nodes would otherwise be destroyed pending with the loop.
+        tasks = [task for task in all_tasks(loop) if not task.done()]
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, loop=loop, return_exceptions=True))
+        loop.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workload', choices=WORKLOADS + ('all',), default='all', help='Workload to run')
+    parser.add_argument('--nodes', type=int, default=1000, help='Number of simulated nodes')
+    parser.add_argument('--operations', type=int, default=2000, help='Number of operations per workload')
+    parser.add_argument('--keys', type=int, default=500, help='Number of keys stored before lookups')
+    parser.add_argument('--store-ratio', type=float, default=0.2, help='Fraction of stores in the mix workload')
+    parser.add_argument('--churn', type=float, default=0.2, help='Fraction of nodes replaced in the churn workload')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of the hotkeys workload')
+    parser.add_argument('--concurrency', type=int, default=64, help='Number of operations in flight')
+    parser.add_argument('--join-batch', type=int, default=100, help='Number of nodes bootstrapping at once')
+    parser.add_argument('--latency', type=float, default=0.005, help='One-way network latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.002, help='Maximum extra latency in seconds')
+    parser.add_argument('--loss', type=float, default=0.0, help='Fraction of datagrams dropped')
+    parser.add_argument('--timeout', type=float, default=1.0, help='RPC timeout in seconds')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for every random choice')
+    parser.add_argument('--clock', choices=('virtual', 'real'), default='virtual',
+                        help='Run the network on simulated time or on the wall clock')
+    args = parser.parse_args()
+
+    # Departed nodes never answer; keep the wait for them in proportion to the simulated latency.
+    ServerProtocol.default_request_timeout = args.timeout
+
+    saturated = False
+    for workload in WORKLOADS if args.workload == 'all' else (args.workload,):
+        result = run(workload, args)
+        print(json.dumps(result, sort_keys=True))
+        if result['saturated']:
+            saturated = True
+            print('{}: {} responses arrived after their request timed out; the loop could not keep up with the '
+                  'simulated network'.format(workload, result['requests']['late']), file=sys.stderr)
+    return 1 if saturated else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
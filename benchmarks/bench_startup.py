@@ -0,0 +1,72 @@
+"""
+    benchmarks.bench_startup
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures how long importing kettle and constructing nodes and clients takes, for short-lived processes.
+
+    Imports are timed in fresh interpreters, from start up to the import completing, against an empty
+    interpreter as a baseline. Construction is timed in this process, without binding sockets.
+
+    Usage: python benchmarks/bench_startup.py [--runs N] [--nodes N]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+#: Statements whose import time is measured, each in a fresh interpreter.
+IMPORTS = ('pass', 'import kettle', 'from kettle import Node', 'from kettle.peer import Client')
+
+
+def time_import(statement, runs):
+    """
+    Return the median seconds a fresh interpreter takes to run the given import statement and exit.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', statement])
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def time_construct(factory, count):
+    """
+    Return the mean seconds taken to construct an object with the given factory.
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        factory()
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20, help='Number of interpreters started per import')
+    parser.add_argument('--nodes', type=int, default=2000, help='Number of nodes and clients constructed')
+    args = parser.parse_args()
+
+    baseline = time_import(IMPORTS[0], args.runs)
+    for statement in IMPORTS[1:]:
+        seconds = time_import(statement, args.runs)
+        print(json.dumps(dict(benchmark='startup', name='import', statement=statement, runs=args.runs,
+                              seconds=seconds, over_baseline=seconds - baseline), sort_keys=True))
+
+    from kettle import get_event_loop
+    from kettle.node import Node
+    from kettle.peer import Client
+
+    loop = get_event_loop()
+    constructors = (('node', lambda: Node(('127.0.0.1', 8800), loop=loop)),
+                    ('client', lambda: Client(('127.0.0.1', 0), loop=loop)))
+    for name, factory in constructors:
+        seconds = time_construct(factory, args.nodes)
+        print(json.dumps(dict(benchmark='startup', name=name, count=args.nodes, seconds=seconds,
+                              per_second=1 / seconds), sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,7 +12,10 @@ __author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
 __license__ = '???'
 
 
+import importlib
 import itertools
+import sys
+import types
 
 
 try:
@@ -23,52 +26,114 @@ else:
     __version__ = __version__
 
 
-def get_event_loop():
+def get_event_loop(fast=None):
     """
     Return the default `asyncio` event loop with conditional `create_task` patch
     for versions < 3.4.2.
+
+    When `fast` is enabled the `uvloop` event loop policy is installed first, if `uvloop` is available.
+    Otherwise the standard library event loop is used.
+
+    :param fast: Flag to use the `uvloop` event loop; default: value of the `KETTLE_UVLOOP` environment variable
     """
     import asyncio
+    import os
     import types
 
+    if fast is None:
+        fast = os.environ.get('KETTLE_UVLOOP', '').lower() in ('1', 'true', 'yes')
+
+    if fast:
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            if not isinstance(asyncio.get_event_loop_policy(), uvloop.EventLoopPolicy):
+                asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     loop = asyncio.get_event_loop()
 
     # Patch `create_task` method on loop if running older than 3.4.2.
     if not hasattr(loop, 'create_task'):
-        loop.create_task = types.MethodType(lambda loop, coro: asyncio.async(coro, loop=loop), loop)
+        ensure_future = getattr(asyncio, 'async')
+        loop.create_task = types.MethodType(lambda loop, coro: ensure_future(coro, loop=loop), loop)
 
     return loop
 
 
-from . import codec
-from .codec import *
-from . import connection
-from .connection import *
-from . import constants
-from .constants import *
-from . import exceptions
-from .exceptions import *
-from . import id
-from .id import *
-from . import message
-from .message import *
-from . import node
-from .node import *
-from . import peer
-from .peer import *
-from . import protocol
-from .protocol import *
-from . import routing
-from .routing import *
-
-
-__all__ = list(itertools.chain(codec.__all__,
-                               connection.__all__,
-                               constants.__all__,
-                               exceptions.__all__,
-                               id.__all__,
-                               message.__all__,
-                               node.__all__,
-                               peer.__all__,
-                               protocol.__all__,
-                               routing.__all__))
+#: Names exported by each submodule, imported the first time one of them is used.
+_exports = {
+    'admission': ['TokenBucket', 'AdmissionController'],
+    'batching': ['OutboundQueue', 'sendmmsg', 'HAS_SENDMMSG'],
+    'blocking': ['BlockingClient'],
+    'breaker': ['Circuit', 'CircuitBreaker'],
+    'capture': ['CaptureRecord', 'CaptureWriter', 'CaptureReader', 'Replayer'],
+    'cluster': ['Supervisor', 'Worker'],
+    'codec': ['CodecError', 'Codec', 'JSONCodec', 'PickleCodec'],
+    'congestion': ['CongestionWindow', 'CongestionController'],
+    'connection': ['Connection', 'ClientConnection', 'ServerConnection', 'MultiplexConnection', 'Endpoint'],
+    'constants': ['K', 'ALPHA', 'HASH_LENGTH', 'DEFAULT_REQUEST_TIMEOUT', 'DEFAULT_INITIAL_WINDOW',
+                  'DEFAULT_MAX_WINDOW', 'DEFAULT_MAX_INFLIGHT', 'DEFAULT_ADMISSION_RATE', 'DEFAULT_ADMISSION_BURST',
+                  'DEFAULT_MAX_SOURCES', 'DEFAULT_MAX_PENDING_REQUESTS', 'DEFAULT_MAX_ACTIVE_REQUESTS',
+                  'DEFAULT_OFFLOAD_THRESHOLD', 'DEFAULT_MAX_PEER_REQUESTS', 'DEFAULT_REJECT_RETRIES',
+                  'DEFAULT_REJECT_BACKOFF', 'DEFAULT_SNAPSHOT_INTERVAL', 'DEFAULT_VERIFY_BATCH',
+                  'DEFAULT_REFRESH_INTERVAL', 'DEFAULT_REFRESH_CHECK_INTERVAL', 'DEFAULT_REFRESH_CONCURRENCY',
+                  'DEFAULT_REFRESH_JITTER', 'DEFAULT_PROBE_DELAY', 'DEFAULT_PROBE_BATCH', 'DEFAULT_BREAKER_THRESHOLD',
+                  'DEFAULT_BREAKER_TIMEOUT', 'DEFAULT_LATENCY_BUCKETS', 'DEFAULT_TRACE_SAMPLE_RATE',
+                  'DEFAULT_CAPTURE_BUFFER', 'ID_ENDIANNESS', 'ID_SIGNED'],
+    'exceptions': ['KettleError', 'KettleConnectionError', 'KettleConnectionClosed', 'KettleRpcError',
+                   'KettleRpcTimeout', 'KettleRpcRejected', 'KettleRpcUnavailable', 'KettleMessageFormatError'],
+    'hooks': ['Hook', 'Hookable', 'StageTimer'],
+    'id': ['Id', 'NodeId'],
+    'loadgen': ['LoadGenerator'],
+    'lookup': ['Lookup'],
+    'loopback': ['LoopbackNetwork', 'LoopbackTransport', 'VirtualClockEventLoop'],
+    'maintenance': ['RefreshScheduler', 'LivenessProber'],
+    'message': ['MessageType', 'Message'],
+    'metrics': ['Counter', 'Gauge', 'Histogram', 'Registry', 'ProtocolMetrics', 'MetricsServer'],
+    'node': ['Server', 'Node'],
+    'offload': ['Offloader'],
+    'peer': ['Client'],
+    'protocol': ['Protocol', 'ClientProtocol', 'ServerProtocol', 'MultiplexProtocol', 'rpc'],
+    'routing': ['KBucket', 'RoutingTable'],
+    'snapshot': ['SnapshotError', 'dumps', 'loads', 'save', 'load'],
+    'tracing': ['Span', 'Tracer'],
+}
+
+
+#: Submodule exporting each public name.
+_origins = dict((name, module) for module, names in _exports.items() for name in names)
+
+
+__all__ = list(itertools.chain.from_iterable(_exports[module] for module in sorted(_exports)))
+
+
+class LazyModule(types.ModuleType):
+    """
+    Package module that imports submodules on first attribute access, so `import kettle` doesn't pay for
+    the ones a program never uses. Resolved names are stored on the module and later lookups are plain reads.
+    """
+
+    def __getattr__(self, name):
+        if name in _exports:
+            return importlib.import_module('.' + name, __name__)
+        try:
+            module = _origins[name]
+        except KeyError:
+            raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+        value = getattr(importlib.import_module('.' + module, __name__), name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_exports) | set(__all__))
+
+
+try:
+    sys.modules[__name__].__class__ = LazyModule
+except TypeError:
+    # Module classes can't be replaced before Python 3.5, so import everything up front instead.
+    for _module in sorted(_exports):
+        _module = importlib.import_module('.' + _module, __name__)
+        globals().update((name, getattr(_module, name)) for name in _module.__all__)
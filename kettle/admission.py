@@ -0,0 +1,130 @@
+"""
+    kettle.admission
+    ~~~~~~~~~~~~~~~~
+
+    Contains inbound admission control and load shedding for RPC requests.
+"""
+__all__ = ['TokenBucket', 'AdmissionController']
+
+
+import collections
+import time
+
+from kettle.constants import DEFAULT_ADMISSION_RATE, DEFAULT_ADMISSION_BURST, DEFAULT_MAX_SOURCES, \
+    DEFAULT_MAX_PENDING_REQUESTS, DEFAULT_MAX_ACTIVE_REQUESTS
+
+
+class TokenBucket:
+    """
+    Rate limiter that refills at a fixed rate up to a maximum burst size.
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'timestamp')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.timestamp = now
+
+    def __repr__(self):
+        return '<{}(rate={}, burst={}, tokens={:.2f})>'.format(self.__class__.__name__, self.rate, self.burst,
+                                                               self.tokens)
+
+    def consume(self, now):
+        """
+        Return `True` and take a token if one is available at time `now`.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class AdmissionController:
+    """
+    Decides which inbound RPC requests a protocol will handle.
+
+    Every source address gets its own :class:`~kettle.admission.TokenBucket`. Admitted requests wait in a bounded
+    queue and only a limited number are handled at once. Requests over either limit are shed and counted.
+    """
+
+    #: Reasons a request can be shed, used as counter names.
+    rate_limited = 'shed_rate_limited'
+    queue_full = 'shed_queue_full'
+
+    def __init__(self, rate=DEFAULT_ADMISSION_RATE, burst=DEFAULT_ADMISSION_BURST, max_sources=DEFAULT_MAX_SOURCES,
+                 max_pending=DEFAULT_MAX_PENDING_REQUESTS, max_active=DEFAULT_MAX_ACTIVE_REQUESTS, reply=True,
+                 clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_sources = max_sources
+        self.max_pending = max_pending
+        self.max_active = max_active
+        self.reply = reply
+        self.clock = clock
+        self.sources = collections.OrderedDict()
+        self.pending = collections.deque()
+        self.active = 0
+        self.counters = collections.Counter()
+
+    def __repr__(self):
+        return '<{}(pending={}/{}, active={}/{}, sources={})>'.format(self.__class__.__name__, len(self.pending),
+                                                                      self.max_pending, self.active,
+                                                                      self.max_active, len(self.sources))
+
+    def admit(self, message, address):
+        """
+        Queue an inbound request if its source is within its rate and the queue has room.
+
+        Returns `None` when the request was queued, otherwise the reason it was shed.
+
+        :param message: Inbound request :class:`~kettle.message.Message`.
+        :param address: Source address of the request.
+        """
+        if not self.consume(address):
+            self.counters[self.rate_limited] += 1
+            return self.rate_limited
+
+        if len(self.pending) >= self.max_pending:
+            self.counters[self.queue_full] += 1
+            return self.queue_full
+
+        self.counters['admitted'] += 1
+        self.pending.append((message, address))
+        return None
+
+    def consume(self, address):
+        """
+        Take a token from the bucket of the given source address; least-recently seen sources are
+        forgotten once more than `max_sources` are tracked.
+        """
+        now = self.clock()
+        sources = self.sources
+        try:
+            bucket = sources[address]
+        except KeyError:
+            bucket = sources[address] = TokenBucket(self.rate, self.burst, now)
+            if len(sources) > self.max_sources:
+                sources.popitem(last=False)
+        else:
+            sources.move_to_end(address)
+        return bucket.consume(now)
+
+    def next(self):
+        """
+        Return the next queued `(message, address)` pair that may start now, or `None`.
+        """
+        if not self.pending or self.active >= self.max_active:
+            return None
+        self.active += 1
+        return self.pending.popleft()
+
+    def done(self, *args):
+        """
+        Mark an admitted request as finished.
+        """
+        self.active -= 1
+        self.counters['handled'] += 1
@@ -0,0 +1,220 @@
+"""
+    kettle.batching
+    ~~~~~~~~~~~~~~~
+
+    Contains batching of outbound datagrams to reduce the number of send syscalls.
+"""
+__all__ = ['OutboundQueue', 'sendmmsg', 'HAS_SENDMMSG']
+
+
+import ctypes
+import errno
+import socket
+import struct
+import sys
+
+
+#: Maximum number of datagrams handed to a single `sendmmsg` call.
+MAX_BATCH_SIZE = 1024
+
+#: Flag passed to `sendmmsg` so a full socket buffer never blocks the event loop.
+MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0x40)
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p),
+                ('iov_len', ctypes.c_size_t)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p),
+                ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.c_void_p),
+                ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p),
+                ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', msghdr),
+                ('msg_len', ctypes.c_uint)]
+
+
+def _load_sendmmsg():
+    """
+    Return the libc `sendmmsg` function if this platform provides one, otherwise `None`.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    # The interpreter is already linked against libc, so look the symbol up in the running process rather than
+    # searching for the library with `ctypes.util.find_library`, which spawns subprocesses and slows imports.
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        func = libc.sendmmsg
+    except (OSError, AttributeError, TypeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+    func.restype = ctypes.c_int
+    return func
+
+
+_sendmmsg = _load_sendmmsg()
+
+
+#: Native layouts used to fill `iovec` and `mmsghdr` arrays in bulk.
+IOVEC = struct.Struct('@PN')
+IOVEC_SIZE = ctypes.sizeof(iovec)
+MSGHDR = struct.Struct('@PIPNPNi')
+MMSGHDR_SIZE = ctypes.sizeof(mmsghdr)
+
+
+#: Flag denoting if batched sends can be performed with a single syscall on this platform.
+HAS_SENDMMSG = _sendmmsg is not None
+
+
+def pack_sockaddr(address):
+    """
+    Return the raw `sockaddr` bytes for a numeric (host, port) address, or `None` if it isn't numeric.
+    """
+    host, port = address[:2]
+    try:
+        packed = socket.inet_pton(socket.AF_INET, host)
+    except (OSError, TypeError):
+        pass
+    else:
+        return struct.pack('=H', socket.AF_INET) + struct.pack('!H', port) + packed + bytes(8)
+
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, host)
+    except (OSError, TypeError):
+        return None
+    flowinfo, scope_id = (tuple(address[2:4]) + (0, 0))[:2]
+    return struct.pack('=H', socket.AF_INET6) + struct.pack('!HI', port, flowinfo) + packed + \
+        struct.pack('=I', scope_id)
+
+
+def sendmmsg(sock, datagrams, sockaddrs=None):
+    """
+    Send a sequence of `(data, address)` datagrams on a non-blocking socket using as few syscalls as
+    possible. Returns the number of datagrams sent; a short count means the socket buffer filled up
+    or an address could not be sent in a batch, and the caller should send the remainder itself.
+
+    :param sock: Unconnected datagram socket.
+    :param datagrams: Sequence of `(data, address)` pairs.
+    :param sockaddrs: Optional dictionary used to cache packed addresses between calls.
+    """
+    if _sendmmsg is None:
+        return 0
+
+    sockaddrs = {} if sockaddrs is None else sockaddrs
+    datagrams = datagrams[:MAX_BATCH_SIZE]
+    payloads = []
+    names = []
+
+    for data, address in datagrams:
+        try:
+            name = sockaddrs[address]
+        except KeyError:
+            packed = pack_sockaddr(address)
+            if packed is None:
+                break
+            buf = ctypes.create_string_buffer(packed, len(packed))
+            name = sockaddrs[address] = (ctypes.addressof(buf), len(packed), buf)
+        payloads.append(data)
+        names.append(name)
+
+    count = len(payloads)
+    if not count:
+        return 0
+
+    # Lay every payload out in one buffer and build the iovec/mmsghdr arrays with struct rather than
+    # per-field ctypes assignment, which would cost more than the syscalls being saved.
+    blob = b''.join(payloads)
+    blob_base = ctypes.cast(ctypes.c_char_p(blob), ctypes.c_void_p).value
+    iovecs = bytearray(IOVEC_SIZE * count)
+    offset = 0
+    for i, data in enumerate(payloads):
+        IOVEC.pack_into(iovecs, i * IOVEC_SIZE, blob_base + offset, len(data))
+        offset += len(data)
+    iovecs = (iovec * count).from_buffer(iovecs)
+    iovecs_base = ctypes.addressof(iovecs)
+
+    messages = bytearray(MMSGHDR_SIZE * count)
+    for i, (name, namelen, _) in enumerate(names):
+        MSGHDR.pack_into(messages, i * MMSGHDR_SIZE, name, namelen, iovecs_base + i * IOVEC_SIZE, 1, 0, 0, 0)
+    messages = (mmsghdr * count).from_buffer(messages)
+
+    sent = _sendmmsg(sock.fileno(), messages, count, MSG_DONTWAIT)
+    if sent < 0:
+        err = ctypes.get_errno()
+        if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+            return 0
+        raise OSError(err, 'sendmmsg failed: {}'.format(errno.errorcode.get(err, err)))
+    return sent
+
+
+class OutboundQueue:
+    """
+    Gathers datagrams sent during a single event loop iteration and flushes them together at the end of it.
+
+    When the platform supports `sendmmsg` the whole batch is written with one syscall; otherwise, or for
+    anything the batch could not take, datagrams fall back to individual `transport.sendto` calls.
+    """
+
+    def __init__(self, transport, loop, batch=HAS_SENDMMSG):
+        self.transport = transport
+        self.loop = loop
+        self.batch = batch
+        self.sock = transport.get_extra_info('socket') if batch else None
+        self.datagrams = []
+        self.sockaddrs = {}
+        self.scheduled = False
+        self.flushes = 0
+        self.syscalls = 0
+
+    def __repr__(self):
+        return '<{}(pending={}, batch={})>'.format(self.__class__.__name__, len(self.datagrams), self.batch)
+
+    def __len__(self):
+        return len(self.datagrams)
+
+    def append(self, data, address):
+        """
+        Queue a datagram to be sent at the end of the current loop iteration.
+        """
+        self.datagrams.append((data, address))
+        if not self.scheduled:
+            self.scheduled = True
+            self.loop.call_soon(self.flush)
+
+    def flush(self):
+        """
+        Send every queued datagram.
+        """
+        self.scheduled = False
+        datagrams, self.datagrams = self.datagrams, []
+        if not datagrams or self.transport.is_closing():
+            return
+
+        self.flushes += 1
+        sent = 0
+
+        # Write straight to the socket only when the transport has nothing buffered, otherwise
+        # the batch would overtake datagrams that are still waiting to be sent.
+        if self.sock is not None and not self.transport.get_write_buffer_size():
+            if len(self.sockaddrs) > MAX_BATCH_SIZE:
+                self.sockaddrs.clear()
+            while sent < len(datagrams):
+                try:
+                    count = sendmmsg(self.sock, datagrams[sent:], self.sockaddrs)
+                except OSError:
+                    break
+                self.syscalls += 1
+                if not count:
+                    break
+                sent += count
+
+        for data, address in datagrams[sent:]:
+            self.syscalls += 1
+            self.transport.sendto(data, address)
@@ -0,0 +1,152 @@
+"""
+    kettle.blocking
+    ~~~~~~~~~~~~~~~
+
+    Contains a synchronous, thread-safe facade for using a DHT network from code without an event loop.
+"""
+__all__ = ['BlockingClient']
+
+
+import asyncio
+import concurrent.futures
+import threading
+
+from kettle.log import LOGGER
+from kettle.peer import Client
+
+
+#: Returns the tasks of a loop; `asyncio.all_tasks` replaces `Task.all_tasks` from Python 3.7.
+all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+
+
+class BlockingClient:
+    """
+    Synchronous :class:`~kettle.peer.Client` that runs its event loop in a dedicated background thread.
+
+    Every method may be called from any thread; calls are submitted to the loop thread and block until they
+    complete. Batch helpers such as :meth:`get_many` run their operations concurrently on the loop, so
+    synchronous callers still get pipelining.
+    """
+
+    client_factory = Client
+
+    def __init__(self, address=('0.0.0.0', 0), seeds=None, timeout=None, **kwargs):
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self.client = None
+        self.error = None
+        self.started = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(address, kwargs), name='kettle-loop')
+        self.thread.daemon = True
+        self.logger = LOGGER.child(self)
+
+        self.thread.start()
+        self.started.wait()
+        if self.error is not None:
+            raise self.error
+
+        if seeds:
+            try:
+                self.bootstrap(seeds)
+            except BaseException:
+                self.close()
+                raise
+
+    def __repr__(self):
+        return '<{}(client={}, running={})>'.format(self.__class__.__name__, self.client, self.thread.is_alive())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def run(self, address, kwargs):
+        """
+        Body of the loop thread; connects the client and runs the loop until :meth:`close` is called.
+        """
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.client = self.client_factory(address, loop=self.loop, **kwargs)
+            self.client.connect()
+        except Exception as e:
+            self.error = e
+            self.started.set()
+            self.loop.close()
+            return
+
+        self.started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.client.disconnect()
+            self.cancel_tasks()
+            self.loop.close()
+
+    def cancel_tasks(self):
+        """
+        Cancel the tasks left on the stopped loop and run it until they have finished and the transport closed
+        by disconnecting has called `connection_lost`, which closes its socket.
+        """
+        tasks = [task for task in all_tasks(self.loop) if not task.done()]
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, loop=self.loop, return_exceptions=True))
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+
+    def call(self, coro, timeout=None):
+        """
+        Run a coroutine on the loop thread and block until it returns, raising its exception if it fails.
+        Pending work is cancelled if it doesn't finish within `timeout` seconds.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout or self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def bootstrap(self, seeds, timeout=None):
+        """
+        Ping the given seed addresses to fill the contact table. Returns the number that answered.
+        """
+        return self.call(self.client.bootstrap(list(seeds)), timeout)
+
+    def ping(self, address, timeout=None):
+        """
+        Ping a node; returns its id.
+        """
+        return self.call(self.client.ping(address), timeout)
+
+    def get(self, key, timeout=None):
+        """
+        Return the value stored under the given key; raises `KeyError` if no node has it.
+        """
+        return self.call(self.client.get(key), timeout)
+
+    def put(self, key, value, timeout=None):
+        """
+        Store a value under the given key. Returns the number of nodes that stored it.
+        """
+        return self.call(self.client.put(key, value), timeout)
+
+    def get_many(self, keys, timeout=None):
+        """
+        Get many keys concurrently. Returns a dictionary of the keys that were found and their values.
+        """
+        return self.call(self.client.get_many(list(keys)), timeout)
+
+    def put_many(self, items, timeout=None):
+        """
+        Put many key/value pairs concurrently. Returns a dictionary of each key and the number of nodes storing it.
+        """
+        items = list(items.items() if hasattr(items, 'items') else items)
+        return self.call(self.client.put_many(items), timeout)
+
+    def close(self):
+        """
+        Stop the loop thread and disconnect the client.
+        """
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
@@ -0,0 +1,131 @@
+"""
+    kettle.breaker
+    ~~~~~~~~~~~~~~
+
+    Contains a per-address circuit breaker for remembering unreachable peers.
+"""
+__all__ = ['Circuit', 'CircuitBreaker']
+
+
+import collections
+import time
+
+from kettle.constants import DEFAULT_BREAKER_THRESHOLD, DEFAULT_BREAKER_TIMEOUT, DEFAULT_MAX_SOURCES
+
+
+class Circuit:
+    """
+    Failure state of a single address; `trial` is the token of the half-open trial request in flight, if any.
+    """
+
+    __slots__ = ('failures', 'opened', 'trial')
+
+    def __init__(self):
+        self.failures = 0
+        self.opened = None
+        self.trial = None
+
+    def __repr__(self):
+        return '<{}(failures={}, opened={}, trial={})>'.format(self.__class__.__name__, self.failures, self.opened,
+                                                               self.trial)
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive request failures per address.
+
+    After `threshold` consecutive failures the circuit opens and the address sits in a negative cache for
+    `timeout` seconds, during which requests to it fail immediately instead of waiting out another timeout.
+    Afterwards the circuit is half-open: a single trial request is let through and its outcome either closes
+    the circuit or opens it again. :meth:`allow` returns a token that the caller passes back with the outcome of
+    its request, so only the trial request's outcome ends the trial.
+    """
+
+    closed = 'closed'
+    open = 'open'
+    half_open = 'half_open'
+
+    def __init__(self, threshold=DEFAULT_BREAKER_THRESHOLD, timeout=DEFAULT_BREAKER_TIMEOUT,
+                 max_addresses=DEFAULT_MAX_SOURCES, clock=time.monotonic):
+        self.threshold = threshold
+        self.timeout = timeout
+        self.max_addresses = max_addresses
+        self.clock = clock
+        self.circuits = collections.OrderedDict()
+        self.counters = collections.Counter()
+
+    def __repr__(self):
+        return '<{}(threshold={}, timeout={}, circuits={})>'.format(self.__class__.__name__, self.threshold,
+                                                                    self.timeout, len(self.circuits))
+
+    def state(self, address):
+        """
+        Return the state of the circuit for the given address.
+        """
+        circuit = self.circuits.get(address)
+        if circuit is None or circuit.opened is None:
+            return self.closed
+        if self.clock() - circuit.opened < self.timeout:
+            return self.open
+        return self.half_open
+
+    def is_open(self, address):
+        """
+        Return `True` if the address is in the negative cache. Unlike :meth:`allow` this never claims the
+        half-open trial, so it is suitable for filtering candidates.
+        """
+        return self.state(address) == self.open
+
+    def allow(self, address):
+        """
+        Return a token if a request may be sent to the given address now, or `False` if it may not. The token is
+        `True` while the circuit is closed, and identifies the trial request while it is half-open.
+        """
+        state = self.state(address)
+        if state == self.closed:
+            return True
+        if state == self.half_open:
+            circuit = self.circuits[address]
+            if circuit.trial is None:
+                circuit.trial = object()
+                return circuit.trial
+        self.counters['rejected'] += 1
+        return False
+
+    def release(self, address, token):
+        """
+        Record that the request allowed with the given token has finished, whatever its outcome. If it was the
+        trial of a half-open circuit that it didn't close or reopen, another trial request may be let through.
+        """
+        circuit = self.circuits.get(address)
+        if circuit is not None and circuit.trial is token:
+            circuit.trial = None
+
+    def record_success(self, address):
+        """
+        Record a successful request to the given address, closing its circuit.
+        """
+        self.circuits.pop(address, None)
+
+    def record_failure(self, address, token=True):
+        """
+        Record a failed request to the given address, allowed with the given token. Returns `True` if this
+        failure opened the circuit; a failed trial reopens it, other failures only count toward opening it.
+        """
+        circuit = self.circuits.get(address)
+        if circuit is None:
+            circuit = self.circuits[address] = Circuit()
+            if len(self.circuits) > self.max_addresses:
+                self.circuits.popitem(last=False)
+        else:
+            self.circuits.move_to_end(address)
+
+        circuit.failures += 1
+        reopened = circuit.trial is token
+        if reopened:
+            circuit.trial = None
+        if reopened or (circuit.opened is None and circuit.failures >= self.threshold):
+            circuit.opened = self.clock()
+            self.counters['opened'] += 1
+            return True
+        return False
@@ -0,0 +1,298 @@
+"""
+    kettle.capture
+    ~~~~~~~~~~~~~~
+
+    Contains capture of the datagrams a node sends and receives to a compact binary log, and replay of
+    captured traffic into a node for offline benchmarking and profiling.
+"""
+__all__ = ['CaptureRecord', 'CaptureWriter', 'CaptureReader', 'Replayer']
+
+
+import asyncio
+import collections
+import socket
+import struct
+import time
+
+from kettle.constants import DEFAULT_CAPTURE_BUFFER
+
+
+#: Magic bytes identifying a capture file.
+MAGIC = b'KCAP'
+
+
+#: Version of the capture format.
+VERSION = 1
+
+
+#: File header: magic, format version and wall clock time the capture started.
+HEADER = struct.Struct('!4sBd')
+
+
+#: Record header: microseconds since the capture started, flags, port, address length and datagram length.
+RECORD = struct.Struct('!QBHBH')
+
+
+#: Record flag set for datagrams sent by the node; unset for datagrams it received.
+OUTBOUND = 0x01
+
+
+#: Record flags for the encoding of the peer host.
+ADDRESS_IPV4 = 0x02
+ADDRESS_IPV6 = 0x04
+ADDRESS_NAME = 0x08
+
+
+#: A captured datagram; `offset` is seconds since the capture started.
+CaptureRecord = collections.namedtuple('CaptureRecord', 'offset outbound address data')
+
+
+def pack_host(host):
+    """
+    Return the flag and bytes encoding a host.
+    """
+    for family, flag in ((socket.AF_INET, ADDRESS_IPV4), (socket.AF_INET6, ADDRESS_IPV6)):
+        try:
+            return flag, socket.inet_pton(family, host)
+        except (OSError, ValueError):
+            pass
+    return ADDRESS_NAME, host.encode('utf-8')[:255]
+
+
+def unpack_host(flags, packed):
+    """
+    Return the host encoded by :func:`pack_host`.
+    """
+    if flags & ADDRESS_IPV4:
+        return socket.inet_ntop(socket.AF_INET, packed)
+    if flags & ADDRESS_IPV6:
+        return socket.inet_ntop(socket.AF_INET6, packed)
+    return packed.decode('utf-8')
+
+
+class CaptureWriter:
+    """
+    Writes timestamped inbound and outbound datagrams to `path` or a binary `stream`.
+
+    Set as the `capture` attribute of a :class:`~kettle.protocol.Protocol` to record everything it receives
+    and sends. Each record costs a 14 byte header plus the peer host and the datagram itself; packed hosts
+    are cached so recording stays cheap on the hot path.
+    """
+
+    def __init__(self, path=None, stream=None, buffering=DEFAULT_CAPTURE_BUFFER, clock=time.perf_counter):
+        self.path = path
+        self.stream = stream if stream is not None else open(path, 'wb', buffering=buffering)
+        self.clock = clock
+        self.start = clock()
+        self.hosts = {}
+        self.records = 0
+        self.bytes = 0
+        self.stream.write(HEADER.pack(MAGIC, VERSION, time.time()))
+
+    def __repr__(self):
+        return '<{}(path={}, records={}, bytes={})>'.format(self.__class__.__name__, self.path, self.records,
+                                                           self.bytes)
+
+    def write(self, data, address, outbound):
+        """
+        Record a datagram received from or sent to the given address.
+        """
+        host, port = address[:2]
+        try:
+            flags, packed = self.hosts[host]
+        except KeyError:
+            flags, packed = self.hosts[host] = pack_host(host)
+        if outbound:
+            flags |= OUTBOUND
+        offset = int((self.clock() - self.start) * 1000000)
+        self.stream.write(RECORD.pack(offset, flags, port, len(packed), len(data)) + packed + data)
+        self.records += 1
+        self.bytes += len(data)
+
+    def inbound(self, data, address):
+        self.write(data, address, False)
+
+    def outbound(self, data, address):
+        self.write(data, address, True)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        """
+        Flush the capture and close the output file, if the writer opened it.
+        """
+        if self.path is not None:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+
+class CaptureReader:
+    """
+    Iterates over the :class:`CaptureRecord` entries of a capture written by :class:`CaptureWriter`.
+
+    A record cut short at the end of the file, as left by a process killed while capturing, ends iteration.
+    """
+
+    def __init__(self, path=None, stream=None):
+        self.path = path
+        self.stream = stream if stream is not None else open(path, 'rb')
+        header = self.stream.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError('Capture is too short')
+        magic, version, self.timestamp = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('Not a capture file')
+        if version != VERSION:
+            raise ValueError('Unsupported capture version: {}'.format(version))
+
+    def __repr__(self):
+        return '<{}(path={}, timestamp={})>'.format(self.__class__.__name__, self.path, self.timestamp)
+
+    def __iter__(self):
+        read = self.stream.read
+        while True:
+            header = read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            offset, flags, port, host_size, size = RECORD.unpack(header)
+            body = read(host_size + size)
+            if len(body) < host_size + size:
+                return
+            address = (unpack_host(flags, body[:host_size]), port)
+            yield CaptureRecord(offset / 1000000, bool(flags & OUTBOUND), address, body[host_size:])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.path is not None:
+            self.stream.close()
+
+
+class Replayer:
+    """
+    Feeds the inbound datagrams of a capture into a protocol, starting with the first one straight away and
+    keeping their original spacing divided by `speed`.
+
+    A `speed` of `2` replays twice as fast as the traffic was captured; `0` replays as fast as possible.
+    Outbound records are what the captured node sent and are skipped; the protocol sends its own replies.
+    """
+
+    def __init__(self, protocol, records, speed=1.0, loop=None):
+        self.protocol = protocol
+        self.records = records
+        self.speed = speed
+        self.loop = loop
+        self.replayed = 0
+        self.bytes = 0
+        self.max_lag = 0.0
+        self.elapsed = None
+
+    def __repr__(self):
+        return '<{}(speed={}, replayed={})>'.format(self.__class__.__name__, self.speed, self.replayed)
+
+    @asyncio.coroutine
+    def run(self):
+        """
+        Replay the capture. Returns the report.
+        """
+        start, origin = self.loop.time(), None
+        for record in self.records:
+            if record.outbound:
+                continue
+            if origin is None:
+                origin = record.offset
+            if self.speed:
+                delay = start + (record.offset - origin) / self.speed - self.loop.time()
+                if delay > 0:
+                    yield from asyncio.sleep(delay, loop=self.loop)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+            else:
+                # Still let the handlers scheduled by earlier datagrams run.
+                yield from asyncio.sleep(0, loop=self.loop)
+            self.protocol.datagram_received(record.data, record.address)
+            self.replayed += 1
+            self.bytes += len(record.data)
+
+        # Give requests handled in tasks a chance to finish.
+        yield from asyncio.sleep(0, loop=self.loop)
+        self.elapsed = self.loop.time() - start
+        return self.report()
+
+    def report(self):
+        elapsed = self.elapsed or 0.0
+        return dict(replayed=self.replayed, bytes=self.bytes, speed=self.speed, elapsed=elapsed,
+                    rate=self.replayed / elapsed if elapsed else None, max_lag_ms=round(self.max_lag * 1000, 3))
+
+
+def main():
+    import argparse
+    import cProfile
+    import json
+    import logging
+    import random
+
+    from kettle import get_event_loop
+    from kettle.connection import ServerConnection
+    from kettle.hooks import StageTimer
+    from kettle.loopback import LoopbackNetwork
+    from kettle.node import Node
+
+    parser = argparse.ArgumentParser(description='Replay the inbound datagrams of a capture into a node on an '
+                                                 'in-memory network and report how it kept up.')
+    parser.add_argument('path', help='Capture file written by kettle.capture.CaptureWriter')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay speed relative to the capture; 0 replays as fast as possible')
+    parser.add_argument('--address', default='127.0.0.1:8800', help='Address of the replay node as host:port')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the node id and request ids')
+    parser.add_argument('--stages', action='store_true', help='Time protocol stages with hook points')
+    parser.add_argument('--profile', default=None, help='Write cProfile statistics of the replay to this path')
+    parser.add_argument('--uvloop', dest='fast', action='store_true', default=None, help='Use uvloop if installed')
+    parser.add_argument('--verbose', action='store_true', help='Log warnings, such as responses to unknown requests')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(message)s', level=logging.WARNING if args.verbose else logging.ERROR)
+    random.seed(args.seed)
+    host, _, port = args.address.rpartition(':')
+    address = (host, int(port))
+
+    # Replies go out over an in-memory network, so nothing replayed reaches the peers that were captured.
+    loop = get_event_loop(args.fast)
+    network = LoopbackNetwork(loop, seed=args.seed)
+    node = Node(address, loop=loop, connection=ServerConnection(address, loop, network=network))
+    node.listen()
+    protocol = node.connection.protocol
+
+    timer = None
+    if args.stages:
+        timer = StageTimer()
+        timer.attach(protocol)
+        timer.attach(node)
+
+    profiler = cProfile.Profile() if args.profile else None
+    with CaptureReader(args.path) as reader:
+        replayer = Replayer(protocol, reader, args.speed, loop)
+        if profiler is not None:
+            profiler.enable()
+        try:
+            report = loop.run_until_complete(replayer.run())
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(args.profile)
+            node.disconnect()
+
+    report.update(captured=reader.timestamp, network=dict(network.counters), protocol=protocol.stats())
+    if timer is not None:
+        report.update(stages=timer.report())
+    print(json.dumps(report, sort_keys=True, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+"""
+    kettle.cluster
+    ~~~~~~~~~~~~~~
+
+    Contains a supervisor that runs nodes across several worker processes to use every core of a host.
+"""
+__all__ = ['Supervisor', 'Worker']
+
+
+import asyncio
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import time
+
+from kettle import get_event_loop
+from kettle.connection import MultiplexConnection
+from kettle.log import LOGGER
+from kettle.node import Node
+
+
+#: Number of seconds between worker reports to the supervisor.
+DEFAULT_REPORT_INTERVAL = 5
+
+
+#: Number of missed reports after which a worker is considered unhealthy.
+MISSED_REPORTS = 3
+
+
+#: Number of seconds workers are given to exit before they are killed.
+SHUTDOWN_TIMEOUT = 5
+
+
+#: Number of seconds before restarting a worker that exited; doubled for every consecutive failure.
+RESTART_BACKOFF = 1
+
+
+#: Maximum number of seconds before restarting a worker.
+MAX_RESTART_BACKOFF = 30
+
+
+#: Number of consecutive failures after which a worker is no longer restarted.
+MAX_RESTART_FAILURES = 5
+
+
+#: Number of seconds a worker must run for its exit not to count as a consecutive failure.
+STABLE_UPTIME = 60
+
+
+class Worker:
+    """
+    Runs inside a worker process; hosts one or more :class:`~kettle.node.Node` identities on a shared socket,
+    joins them to the network through the seed addresses, if any, and periodically reports its counters to the
+    supervisor.
+    """
+
+    def __init__(self, index, address, nodes, reuse_port, conn, report_interval, loop, seeds=()):
+        self.index = index
+        self.address = address
+        self.seeds = list(seeds)
+        self.conn = conn
+        self.report_interval = report_interval
+        self.loop = loop
+        self.connection = MultiplexConnection(address, loop, reuse_port)
+        self.nodes = [Node(address, loop=loop, connection=self.connection) for _ in range(nodes)]
+        self.logger = LOGGER.child(self)
+
+    def __repr__(self):
+        return '<{}(index={}, address={}, nodes={})>'.format(self.__class__.__name__, self.index, self.address,
+                                                             len(self.nodes))
+
+    def stats(self):
+        """
+        Return a dictionary of counters for this worker.
+        """
+        protocol = self.connection.protocol
+        stats = protocol.stats() if protocol is not None else dict()
+        stats.update(nodes=len(self.nodes),
+                     contacts=sum(len(node.table) for node in self.nodes),
+                     keys=sum(len(node.db) for node in self.nodes))
+        return stats
+
+    @asyncio.coroutine
+    def bootstrap(self, attempts=5, delay=0.5):
+        """
+        Join every node to the network through the seed addresses.
+
+        Workers start together, so a seed may not be listening yet; nodes that fail are retried up to `attempts`
+        times, doubling the `delay` in seconds between tries.
+        """
+        pending = self.nodes
+        for attempt in range(attempts):
+            results = yield from asyncio.gather(*(node.bootstrap(self.seeds) for node in pending), loop=self.loop,
+                                                return_exceptions=True)
+            pending = [node for node, r in zip(pending, results) if isinstance(r, Exception)]
+            if not pending:
+                return
+            if attempt + 1 < attempts:
+                yield from asyncio.sleep(delay * 2 ** attempt, loop=self.loop)
+        self.logger.warning('{} of {} nodes failed to bootstrap from {}'.format(len(pending), len(self.nodes),
+                                                                               self.seeds))
+
+    def report(self):
+        """
+        Send a report to the supervisor and schedule the next one. Stops the worker if the supervisor is gone.
+        """
+        report = dict(worker=self.index, pid=os.getpid(), time=time.time(), address=self.address,
+                      stats=self.stats())
+        try:
+            self.conn.send(report)
+        except (EOFError, OSError):
+            self.logger.warning('Lost connection to supervisor')
+            self.loop.stop()
+        else:
+            self.loop.call_later(self.report_interval, self.report)
+
+    def run_forever(self):
+        """
+        Listen on the shared socket and serve requests until the supervisor asks the worker to stop.
+        """
+        for node in self.nodes:
+            node.listen()
+
+        self.loop.add_signal_handler(signal.SIGTERM, self.loop.stop)
+        self.logger.info('Worker {} serving {} nodes on {}:{}'.format(self.index, len(self.nodes), *self.address))
+        if self.seeds:
+            self.loop.create_task(self.bootstrap())
+        self.report()
+
+        try:
+            self.loop.run_forever()
+        finally:
+            for node in self.nodes:
+                node.disconnect()
+            self.loop.close()
+            self.conn.close()
+
+
+def run_worker(index, address, nodes, reuse_port, conn, report_interval, fast, seeds):
+    """
+    Entry point of a worker process.
+    """
+    # The supervisor owns interrupt handling and stops workers with SIGTERM.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    loop = get_event_loop(fast=fast)
+    worker = Worker(index, address, nodes, reuse_port, conn, report_interval, loop, seeds)
+    worker.run_forever()
+
+
+class Supervisor:
+    """
+    Forks worker processes that each run their own event loop and node identities.
+
+    Workers listen on consecutive ports starting at the given one. Their nodes join the network through `seeds`,
+    or by default through the first worker, so the workers form one network. The supervisor restarts workers that
+    exit, tracks their health from periodic reports and aggregates their counters.
+
+    With `reuse_port` the workers share one port with `SO_REUSEPORT` instead. The kernel picks the worker that
+    receives a datagram by hashing the sender's address, not by its content, so a response to one worker's
+    request or a request for one of its node ids can reach another worker, which drops it. Only use it for
+    workers that serve requests addressed to the port and send none of their own; no seeds are used by default.
+
+    Restarts back off exponentially from `RESTART_BACKOFF` seconds. A worker that exits `MAX_RESTART_FAILURES`
+    times in a row, each time within `STABLE_UPTIME` seconds of starting, is given up on, and the supervisor
+    stops once every worker has been given up on.
+    """
+
+    def __init__(self, address, workers=None, nodes=1, reuse_port=False, report_interval=DEFAULT_REPORT_INTERVAL,
+                 fast=None, seeds=None):
+        self.address = address
+        self.workers = workers or os.cpu_count() or 1
+        self.nodes = nodes
+        self.reuse_port = reuse_port
+        self.seeds = seeds
+        self.report_interval = report_interval
+        self.fast = fast
+        self.processes = {}
+        self.reports = {}
+        self.restarts = collections.Counter()
+        self.failures = collections.Counter()
+        self.started = {}
+        self.scheduled = {}
+        self.failed = set()
+        self.stopping = False
+        self.logger = LOGGER.child(self)
+
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+    def __repr__(self):
+        return '<{}(address={}, workers={}, nodes={}, reuse_port={})>'.format(self.__class__.__name__, self.address,
+                                                                              self.workers, self.nodes,
+                                                                              self.reuse_port)
+
+    def worker_address(self, index):
+        """
+        Return the address the worker with the given index listens on.
+        """
+        if self.reuse_port:
+            return self.address
+        return self.address[0], self.address[1] + index
+
+    def worker_seeds(self, index):
+        """
+        Return the addresses the nodes of the worker with the given index join the network through.
+        """
+        if self.seeds is not None:
+            return [seed for seed in self.seeds if seed != self.worker_address(index)]
+        if self.reuse_port or index == 0:
+            return []
+        return [self.worker_address(0)]
+
+    def spawn(self, index):
+        """
+        Start the worker process with the given index.
+        """
+        reader, writer = self.context.Pipe(duplex=False)
+        process = self.context.Process(target=run_worker, name='kettle-worker-{}'.format(index),
+                                       args=(index, self.worker_address(index), self.nodes, self.reuse_port, writer,
+                                             self.report_interval, self.fast, self.worker_seeds(index)))
+        process.daemon = True
+        process.start()
+        writer.close()
+        self.processes[index] = (process, reader)
+        self.started[index] = time.time()
+
+    def start(self):
+        """
+        Start every worker process.
+        """
+        for index in range(self.workers):
+            self.spawn(index)
+
+    def poll(self, timeout):
+        """
+        Wait up to `timeout` seconds for worker reports and record them.
+        """
+        readers = dict((reader, index) for index, (process, reader) in self.processes.items())
+        for reader in multiprocessing.connection.wait(list(readers), timeout):
+            try:
+                self.reports[readers[reader]] = reader.recv()
+            except (EOFError, OSError):
+                # Worker has exited; it will be noticed and restarted by `check`.
+                pass
+
+    def check(self):
+        """
+        Schedule a restart of any worker process that has exited, and start those whose backoff has passed,
+        unless the supervisor is shutting down.
+        """
+        now = time.time()
+        for index, (process, reader) in list(self.processes.items()):
+            if process.is_alive():
+                continue
+
+            self.logger.warning('Worker {} (pid {}) exited with code {}'.format(index, process.pid, process.exitcode))
+            reader.close()
+            del self.processes[index]
+            self.reports.pop(index, None)
+
+            if now - self.started[index] >= STABLE_UPTIME:
+                self.failures[index] = 0
+            self.failures[index] += 1
+            if self.failures[index] >= MAX_RESTART_FAILURES:
+                self.logger.error('Worker {} failed {} times in a row; not restarting it'.format(index,
+                                                                                                self.failures[index]))
+                self.failed.add(index)
+                continue
+
+            delay = min(MAX_RESTART_BACKOFF, RESTART_BACKOFF * 2 ** (self.failures[index] - 1))
+            self.logger.info('Restarting worker {} in {}s'.format(index, delay))
+            self.scheduled[index] = now + delay
+
+        for index, when in list(self.scheduled.items()):
+            if when <= now and not self.stopping:
+                del self.scheduled[index]
+                self.restarts[index] += 1
+                self.spawn(index)
+
+        if len(self.failed) == self.workers:
+            self.logger.error('Every worker has failed; stopping')
+            self.stopping = True
+
+    def health(self):
+        """
+        Return a dictionary of health information keyed by worker index.
+        """
+        now = time.time()
+        health = dict()
+        for index, (process, reader) in self.processes.items():
+            report = self.reports.get(index)
+            age = now - report['time'] if report else None
+            healthy = process.is_alive() and age is not None and age < self.report_interval * MISSED_REPORTS
+            health[index] = dict(pid=process.pid, alive=process.is_alive(), report_age=age, healthy=healthy,
+                                 restarts=self.restarts[index])
+        for index in self.scheduled:
+            health[index] = dict(pid=None, alive=False, report_age=None, healthy=False, restarts=self.restarts[index])
+        for index in self.failed:
+            health[index] = dict(pid=None, alive=False, report_age=None, healthy=False, restarts=self.restarts[index],
+                                 failed=True)
+        return health
+
+    def metrics(self):
+        """
+        Return the sum of every numeric counter reported by the workers.
+        """
+        totals = collections.Counter()
+        for report in self.reports.values():
+            for name, value in report['stats'].items():
+                if isinstance(value, (int, float)):
+                    totals[name] += value
+        totals['workers'] = len(self.processes)
+        return dict(totals)
+
+    def stop(self, timeout=SHUTDOWN_TIMEOUT):
+        """
+        Ask every worker to exit gracefully, killing any that are still running after `timeout` seconds.
+        """
+        self.stopping = True
+        for process, reader in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.time() + timeout
+        for process, reader in self.processes.values():
+            process.join(max(0, deadline - time.time()))
+            if process.is_alive():
+                self.logger.warning('Killing worker pid {}'.format(process.pid))
+                os.kill(process.pid, signal.SIGKILL)
+                process.join()
+            reader.close()
+
+        self.processes.clear()
+
+    def run_forever(self):
+        """
+        Start the workers and supervise them until interrupted or sent SIGTERM.
+        """
+        def on_terminate(signum, frame):
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, on_terminate)
+        self.start()
+        if self.reuse_port:
+            self.logger.warning('Workers share a port; responses to their own requests may reach another worker')
+        self.logger.info('Started {} workers on {}:{} (reuse_port={})'.format(self.workers, self.address[0],
+                                                                              self.address[1], self.reuse_port))
+
+        next_report = time.time() + self.report_interval
+        try:
+            while not self.stopping:
+                self.poll(timeout=1.0)
+                self.check()
+                if time.time() >= next_report:
+                    next_report = time.time() + self.report_interval
+                    unhealthy = [i for i, h in self.health().items() if not h['healthy']]
+                    if unhealthy:
+                        self.logger.warning('Unhealthy workers: {}'.format(unhealthy))
+                    self.logger.info('Metrics: {}'.format(self.metrics()))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.logger.info('Shutting down')
+            self.stop()
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main():
+    import argparse
+    import logging
+
+    parser = argparse.ArgumentParser(description='Run a cluster of kettle nodes across worker processes.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8800, help='First of the consecutive ports workers listen on')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes; default: cores')
+    parser.add_argument('--nodes', type=int, default=1, help='Number of node identities per worker')
+    parser.add_argument('--seed', dest='seeds', action='append', type=parse_address, default=None,
+                        help='HOST:PORT of a node to join the network through; default: the first worker')
+    parser.add_argument('--reuse-port', action='store_true',
+                        help='Share one port with SO_REUSEPORT; only for workers that send no requests of their own')
+    parser.add_argument('--uvloop', dest='fast', action='store_true', default=None, help='Use uvloop if installed')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(process)d %(message)s', level=logging.INFO)
+    supervisor = Supervisor((args.host, args.port), workers=args.workers, nodes=args.nodes,
+                            reuse_port=args.reuse_port, fast=args.fast, seeds=args.seeds)
+    supervisor.run_forever()
+    if len(supervisor.failed) == supervisor.workers:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+    kettle.congestion
+    ~~~~~~~~~~~~~~~~~
+
+    Contains outbound congestion control for RPC requests.
+"""
+__all__ = ['CongestionWindow', 'CongestionController']
+
+
+import collections
+
+from kettle.constants import DEFAULT_INITIAL_WINDOW, DEFAULT_MAX_WINDOW, DEFAULT_MAX_INFLIGHT
+
+
+class CongestionWindow:
+    """
+    Tracks in-flight requests to a single address. The window grows additively for every successful
+    response and is halved for every timeout (AIMD), never dropping below a single request.
+    """
+
+    __slots__ = ('size', 'initial_size', 'max_size', 'inflight', 'pending')
+
+    def __init__(self, size=DEFAULT_INITIAL_WINDOW, max_size=DEFAULT_MAX_WINDOW):
+        self.size = float(size)
+        self.initial_size = float(size)
+        self.max_size = max_size
+        self.inflight = 0
+        self.pending = collections.deque()
+
+    def __repr__(self):
+        return '<{}(size={:.2f}, inflight={}, pending={})>'.format(self.__class__.__name__, self.size,
+                                                                   self.inflight, len(self.pending))
+
+    def is_open(self):
+        """
+        Return `True` if another request may be sent to this address.
+        """
+        return self.inflight < int(self.size)
+
+    def is_idle(self):
+        """
+        Return `True` if there are no in-flight or pending requests to this address.
+        """
+        return not self.inflight and not self.pending
+
+    def increase(self):
+        """
+        Additive increase; grows the window by roughly one request per window of successful responses.
+        """
+        self.size = min(self.max_size, self.size + 1.0 / self.size)
+
+    def decrease(self):
+        """
+        Multiplicative decrease; halves the window after a timeout.
+        """
+        self.size = max(1.0, self.size / 2.0)
+
+
+class CongestionController:
+    """
+    Limits outbound RPC requests with a per-address :class:`~kettle.congestion.CongestionWindow` and a global
+    in-flight cap. Requests that cannot be sent immediately are queued per address and released round-robin
+    across addresses so a single slow peer cannot starve requests to the rest of the network.
+    """
+
+    window_factory = CongestionWindow
+
+    def __init__(self, window=DEFAULT_INITIAL_WINDOW, max_window=DEFAULT_MAX_WINDOW,
+                 max_inflight=DEFAULT_MAX_INFLIGHT):
+        self.initial_window = window
+        self.max_window = max_window
+        self.max_inflight = max_inflight
+        self.windows = {}
+        self.ready = collections.deque()
+        self.inflight = 0
+        self.queued = 0
+        self.timeouts = 0
+        self.rejections = 0
+
+    def __repr__(self):
+        return '<{}(inflight={}/{}, queued={}, windows={})>'.format(self.__class__.__name__, self.inflight,
+                                                                    self.max_inflight, self.queued,
+                                                                    len(self.windows))
+
+    def window(self, address):
+        """
+        Return the :class:`~kettle.congestion.CongestionWindow` for the given address, creating it if needed.
+        """
+        try:
+            return self.windows[address]
+        except KeyError:
+            window = self.windows[address] = self.window_factory(self.initial_window, self.max_window)
+            return window
+
+    def submit(self, address, send):
+        """
+        Send a request to the given address now if its window and the global cap allow it, otherwise queue it.
+
+        :param address: Destination address of the request.
+        :param send: Callable that transmits the request; returns `False` if the request was abandoned.
+        """
+        window = self.window(address)
+        if not window.pending and window.is_open() and self.inflight < self.max_inflight:
+            self.dispatch(window, send)
+        else:
+            if not window.pending:
+                self.ready.append(address)
+            window.pending.append(send)
+            self.queued += 1
+
+    def discard(self, address, send):
+        """
+        Remove a request that is still waiting to be sent, e.g. because its deadline passed in the queue.
+
+        :param address: Destination address of the request.
+        :param send: Callable given to :meth:`submit` for the request.
+        """
+        window = self.windows.get(address)
+        if window is None:
+            return
+        try:
+            window.pending.remove(send)
+        except ValueError:
+            return
+
+        self.queued -= 1
+        if not window.pending:
+            self.ready.remove(address)
+            self.forget(address, window)
+
+    def release(self, address, success=True, rejected=False):
+        """
+        Release an in-flight request slot for the given address and adjust its window.
+
+        Timeouts are counted as loss. Rejections by an overloaded peer shrink the window the same way but are
+        counted separately, since the request did reach the peer.
+
+        :param address: Destination address of the completed request.
+        :param success: Flag indicating if a response was received; `False` for timeouts/errors.
+        :param rejected: Flag indicating the peer answered with an admission rejection.
+        """
+        window = self.windows.get(address)
+        if window is None or window.inflight <= 0:
+            return
+
+        window.inflight -= 1
+        self.inflight -= 1
+        if rejected:
+            self.rejections += 1
+            window.decrease()
+        elif success:
+            window.increase()
+        else:
+            self.timeouts += 1
+            window.decrease()
+
+        self.forget(address, window)
+        self.drain()
+
+    def forget(self, address, window):
+        """
+        Forget addresses that have nothing outstanding and no congestion history worth keeping.
+        """
+        if window.is_idle() and window.size >= window.initial_size:
+            del self.windows[address]
+
+    def dispatch(self, window, send):
+        """
+        Take an in-flight slot on the window and transmit. Abandoned requests give the slot straight back.
+        """
+        window.inflight += 1
+        self.inflight += 1
+        if send() is False:
+            window.inflight -= 1
+            self.inflight -= 1
+
+    def drain(self):
+        """
+        Send queued requests, one per address in turn, until every window is closed or the global cap is hit.
+        """
+        ready = self.ready
+        blocked = 0
+        while ready and blocked < len(ready) and self.inflight < self.max_inflight:
+            address = ready.popleft()
+            window = self.windows[address]
+            if not window.is_open():
+                ready.append(address)
+                blocked += 1
+                continue
+
+            send = window.pending.popleft()
+            self.queued -= 1
+            if window.pending:
+                ready.append(address)
+            blocked = 0
+            self.dispatch(window, send)
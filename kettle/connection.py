@@ -4,25 +4,30 @@
 
     Contains functionality for specifying specific connection types to a DHT.
 """
-__all__ = ['Connection', 'ClientConnection', 'ServerConnection', 'Endpoint']
+__all__ = ['Connection', 'ClientConnection', 'ServerConnection', 'MultiplexConnection', 'Endpoint']
 
 
 import asyncio
 
+from kettle.hooks import Hookable
 from kettle.log import LOGGER
-from kettle.protocol import ClientProtocol, ServerProtocol
+from kettle.protocol import ClientProtocol, MultiplexProtocol, ServerProtocol
 
 
 class Connection:
     """
     Base class describing a specific connection to a DHT network.
+
+    Transports are created by the event loop, or by `network` when one is given, e.g. a
+    :class:`~kettle.loopback.LoopbackNetwork` to run without sockets.
     """
 
     protocol_factory = None
 
-    def __init__(self, address, loop):
+    def __init__(self, address, loop, network=None):
         self.address = address
         self.loop = loop
+        self.network = network
         self.protocol = None
         self.logger = LOGGER.child(self)
 
@@ -30,6 +35,13 @@ class Connection:
         return '<{}(address={}, protocol={})>'.format(self.__class__.__name__, self.address,
                                                       self.protocol_factory.__name__)
 
+    @property
+    def transport_provider(self):
+        """
+        Object whose `create_datagram_endpoint` creates the transport for this connection.
+        """
+        return self.network if self.network is not None else self.loop
+
     @asyncio.coroutine
     def connect(self, endpoint):
         """
@@ -57,7 +69,14 @@ class Connection:
         """
         return self.protocol.send_response(response, address)
 
-    def disconnect(self):
+    def fail_requests(self, address, exception):
+        """
+        Fail requests to the given address that are still waiting to be sent.
+        """
+        if self.protocol is not None:
+            self.protocol.fail_requests(address, exception)
+
+    def disconnect(self, endpoint=None):
         """
         Close connection.
         """
@@ -67,13 +86,15 @@ class Connection:
 class ClientConnection(Connection):
     """
     Connection type for actors that wish to query the DHT network without participating.
+
+    The socket is bound locally but left unconnected so a single client can talk to any number of nodes.
     """
 
     protocol_factory = ClientProtocol
 
     @asyncio.coroutine
     def create_endpoint(self, protocol_factory, address):
-        yield from self.loop.create_datagram_endpoint(protocol_factory, remote_addr=address)
+        yield from self.transport_provider.create_datagram_endpoint(protocol_factory, local_addr=address)
 
 
 class ServerConnection(Connection):
@@ -83,20 +104,81 @@ class ServerConnection(Connection):
 
     protocol_factory = ServerProtocol
 
+    def __init__(self, address, loop, reuse_port=False, network=None):
+        super(ServerConnection, self).__init__(address, loop, network)
+        self.reuse_port = reuse_port
+
     @asyncio.coroutine
     def create_endpoint(self, protocol_factory, address):
-        yield from self.loop.create_datagram_endpoint(protocol_factory, local_addr=address)
+        # Only pass `reuse_port` when requested so platforms without SO_REUSEPORT keep working.
+        options = dict(reuse_port=True) if self.reuse_port else dict()
+        yield from self.transport_provider.create_datagram_endpoint(protocol_factory, local_addr=address, **options)
+
+
+class MultiplexConnection(ServerConnection):
+    """
+    Connection type that serves many endpoints, keyed by node id, from a single listening socket.
+
+    The socket and protocol are created when the first endpoint connects and closed once the last one
+    disconnects, so each additional endpoint costs memory but no file descriptor or task.
+    """
 
+    protocol_factory = MultiplexProtocol
 
-class Endpoint:
+    def __init__(self, address, loop, reuse_port=False, network=None):
+        super(MultiplexConnection, self).__init__(address, loop, reuse_port, network)
+        self.endpoints = {}
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    @asyncio.coroutine
+    def connect(self, endpoint):
+        """
+        Attach endpoint to the shared protocol, creating the protocol and socket on first use.
+        """
+        self.endpoints[endpoint.id] = endpoint
+        if self.protocol is None:
+            self.protocol = self.protocol_factory(endpoint=endpoint, loop=self.loop)
+            self.protocol.endpoints = self.endpoints
+            yield from self.create_endpoint(lambda: self.protocol, self.address)
+
+    def disconnect(self, endpoint=None):
+        """
+        Detach endpoint from the shared protocol, closing the socket once no endpoints remain.
+        """
+        if self.protocol is None:
+            return
+
+        if endpoint is not None:
+            self.endpoints.pop(endpoint.id, None)
+            if self.endpoints and self.protocol.endpoint is endpoint:
+                self.protocol.endpoint = next(iter(self.endpoints.values()))
+
+        if endpoint is None or not self.endpoints:
+            self.endpoints.clear()
+            self.protocol.close()
+            self.protocol = None
+
+
+class Endpoint(Hookable):
     """
     Represents either a client or server within the network.
     """
 
     connection_factory = None
 
-    def __init__(self, address, loop=None):
-        self.connection = self.connection_factory(address, loop)
+    #: Stages that can be timed with :meth:`~kettle.hooks.Hookable.add_hook`.
+    hook_points = ('rpc', 'rpc_remote')
+
+    #: Called when a request sent by a local @rpc call completes.
+    hook_rpc = None
+
+    #: Called when an @rpc handler has served a request.
+    hook_rpc_remote = None
+
+    def __init__(self, address, loop=None, connection=None):
+        self.connection = connection if connection is not None else self.connection_factory(address, loop)
         self.loop = loop
         self.logger = LOGGER.child(self)
 
@@ -112,4 +194,4 @@ class Endpoint:
         return self.loop.run_until_complete(connector)
 
     def disconnect(self):
-        return self.connection.disconnect()
+        return self.connection.disconnect(self)
@@ -4,7 +4,15 @@
 
     Contains package level constants.
 """
-__all__ = ['K', 'ALPHA', 'HASH_LENGTH', 'DEFAULT_REQUEST_TIMEOUT', 'ID_ENDIANNESS', 'ID_SIGNED']
+__all__ = ['K', 'ALPHA', 'HASH_LENGTH', 'DEFAULT_REQUEST_TIMEOUT', 'DEFAULT_INITIAL_WINDOW', 'DEFAULT_MAX_WINDOW',
+           'DEFAULT_MAX_INFLIGHT', 'DEFAULT_ADMISSION_RATE', 'DEFAULT_ADMISSION_BURST', 'DEFAULT_MAX_SOURCES',
+           'DEFAULT_MAX_PENDING_REQUESTS', 'DEFAULT_MAX_ACTIVE_REQUESTS', 'DEFAULT_OFFLOAD_THRESHOLD',
+           'DEFAULT_MAX_PEER_REQUESTS', 'DEFAULT_REJECT_RETRIES', 'DEFAULT_REJECT_BACKOFF',
+           'DEFAULT_SNAPSHOT_INTERVAL', 'DEFAULT_VERIFY_BATCH', 'DEFAULT_REFRESH_INTERVAL',
+           'DEFAULT_REFRESH_CHECK_INTERVAL', 'DEFAULT_REFRESH_CONCURRENCY', 'DEFAULT_REFRESH_JITTER',
+           'DEFAULT_PROBE_DELAY', 'DEFAULT_PROBE_BATCH', 'DEFAULT_BREAKER_THRESHOLD', 'DEFAULT_BREAKER_TIMEOUT',
+           'DEFAULT_LATENCY_BUCKETS', 'DEFAULT_TRACE_SAMPLE_RATE', 'DEFAULT_CAPTURE_BUFFER', 'ID_ENDIANNESS',
+           'ID_SIGNED']
 
 
 import sys
@@ -26,6 +34,108 @@ HASH_LENGTH = 160
 DEFAULT_REQUEST_TIMEOUT = 10
 
 
+#: Initial number of in-flight RPC requests allowed to a single address.
+DEFAULT_INITIAL_WINDOW = 4
+
+
+#: Maximum number of in-flight RPC requests allowed to a single address.
+DEFAULT_MAX_WINDOW = 64
+
+
+#: Maximum number of in-flight RPC requests allowed across all addresses.
+DEFAULT_MAX_INFLIGHT = 1024
+
+
+#: Sustained number of inbound RPC requests per second accepted from a single address. A node handles a few
+#: thousand requests per second, so no one address can take more than a fraction of it.
+DEFAULT_ADMISSION_RATE = 1000
+
+
+#: Number of inbound RPC requests a single address may burst above its sustained rate.
+DEFAULT_ADMISSION_BURST = 2000
+
+
+#: Maximum number of source addresses to track inbound request rates for.
+DEFAULT_MAX_SOURCES = 10000
+
+
+#: Maximum number of inbound RPC requests waiting to be handled.
+DEFAULT_MAX_PENDING_REQUESTS = 1024
+
+
+#: Maximum number of inbound RPC requests handled concurrently.
+DEFAULT_MAX_ACTIVE_REQUESTS = 256
+
+
+#: Size in bytes of payloads/keys above which encoding and hashing are moved off the event loop. Encoding a
+#: 16KiB value takes about as long as handing work to a thread pool and back; see `benchmarks/bench_micro.py`.
+DEFAULT_OFFLOAD_THRESHOLD = 16 * 1024
+
+
+#: Maximum number of requests a client has in flight to a single node; further requests wait before being sent.
+DEFAULT_MAX_PEER_REQUESTS = 32
+
+
+#: Number of times a client retries a request rejected by an overloaded node.
+DEFAULT_REJECT_RETRIES = 3
+
+
+#: Number of seconds a client waits before retrying a rejected request; doubled for every retry.
+DEFAULT_REJECT_BACKOFF = 0.05
+
+
+#: Number of seconds between routing table snapshots.
+DEFAULT_SNAPSHOT_INTERVAL = 300
+
+
+#: Number of contacts pinged at once when verifying a restored routing table.
+DEFAULT_VERIFY_BATCH = 32
+
+
+#: Number of seconds without activity after which a bucket is refreshed.
+DEFAULT_REFRESH_INTERVAL = 3600
+
+
+#: Number of seconds between checks for stale buckets.
+DEFAULT_REFRESH_CHECK_INTERVAL = 60
+
+
+#: Maximum number of bucket refresh lookups run at once.
+DEFAULT_REFRESH_CONCURRENCY = 4
+
+
+#: Fraction of the check interval used to randomly spread out bucket refreshes.
+DEFAULT_REFRESH_JITTER = 0.5
+
+
+#: Number of seconds to gather full buckets before probing their least-recently seen nodes.
+DEFAULT_PROBE_DELAY = 0.1
+
+
+#: Maximum number of liveness probes sent at once.
+DEFAULT_PROBE_BATCH = 32
+
+
+#: Number of consecutive request failures after which an address is considered unreachable.
+DEFAULT_BREAKER_THRESHOLD = 2
+
+
+#: Number of seconds an unreachable address is avoided before a single retry is allowed.
+DEFAULT_BREAKER_TIMEOUT = 30
+
+
+#: Upper bounds, in seconds, of the buckets of request latency histograms.
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+#: Fraction of lookups recorded by a tracer.
+DEFAULT_TRACE_SAMPLE_RATE = 0.01
+
+
+#: Number of bytes of captured datagrams buffered before they are written out.
+DEFAULT_CAPTURE_BUFFER = 1 << 20
+
+
 #: Endianness of the node/rpc id's.
 ID_ENDIANNESS = sys.byteorder
 
@@ -5,7 +5,8 @@
     Contains custom exceptions used by Kettle.
 """
 __all__ = ['KettleError', 'KettleConnectionError', 'KettleConnectionClosed',
-           'KettleRpcError', 'KettleRpcTimeout', 'KettleMessageFormatError']
+           'KettleRpcError', 'KettleRpcTimeout', 'KettleRpcRejected', 'KettleRpcUnavailable',
+           'KettleMessageFormatError']
 
 
 class KettleError(Exception):
@@ -28,5 +29,13 @@ class KettleRpcTimeout(KettleRpcError):
     pass
 
 
+class KettleRpcRejected(KettleRpcError):
+    pass
+
+
+class KettleRpcUnavailable(KettleRpcError):
+    pass
+
+
 class KettleMessageFormatError(KettleError):
     pass
@@ -0,0 +1,115 @@
+"""
+    kettle.hooks
+    ~~~~~~~~~~~~
+
+    Contains named hook points for timing the stages a message passes through.
+"""
+__all__ = ['Hook', 'Hookable', 'StageTimer']
+
+
+import collections
+import time
+
+
+class Hook:
+    """
+    Callbacks registered at one hook point.
+
+    Every callback is called as `callback(point, detail, start, end, size)`: the hook point name, a detail
+    such as the rpc name or `None`, the start and end timestamps of the stage from the hook clock, and the
+    number of bytes handled or `None`.
+    """
+
+    __slots__ = ('callbacks',)
+
+    def __init__(self):
+        self.callbacks = []
+
+    def __repr__(self):
+        return '<{}(callbacks={})>'.format(self.__class__.__name__, len(self.callbacks))
+
+    def __call__(self, point, detail, start, end, size):
+        for callback in self.callbacks:
+            callback(point, detail, start, end, size)
+
+
+class Hookable:
+    """
+    Mixin for classes with named hook points.
+
+    Each point in `hook_points` has a `hook_<point>` attribute that is `None` until a callback is added, so a
+    stage without hooks costs a single attribute check.
+    """
+
+    #: Names of the hook points of the class.
+    hook_points = ()
+
+    #: Clock used for hook timestamps.
+    hook_clock = time.perf_counter
+
+    def add_hook(self, point, callback):
+        """
+        Call `callback` whenever the stage at the given hook point finishes. Returns the callback.
+        """
+        if point not in self.hook_points:
+            raise ValueError('Unknown hook point: {}'.format(point))
+        name = 'hook_' + point
+        hook = self.__dict__.get(name)
+        if hook is None:
+            hook = Hook()
+            setattr(self, name, hook)
+        hook.callbacks.append(callback)
+        return callback
+
+    def remove_hook(self, point, callback):
+        """
+        Stop calling `callback` at the given hook point.
+        """
+        name = 'hook_' + point
+        hook = self.__dict__.get(name)
+        if hook is None or callback not in hook.callbacks:
+            return
+        hook.callbacks.remove(callback)
+        if not hook.callbacks:
+            delattr(self, name)
+
+
+class StageTimer:
+    """
+    Hook callback that totals the calls, seconds and bytes of every hook point and detail it is added to.
+    """
+
+    def __init__(self):
+        self.stages = collections.defaultdict(lambda: [0, 0.0, 0])
+
+    def __repr__(self):
+        return '<{}(stages={})>'.format(self.__class__.__name__, len(self.stages))
+
+    def __call__(self, point, detail, start, end, size):
+        stage = self.stages[(point, detail)]
+        stage[0] += 1
+        stage[1] += end - start
+        stage[2] += size or 0
+
+    def attach(self, hookable, points=None):
+        """
+        Add the timer to the given hook points of an object, or to all of them.
+        """
+        for point in points or hookable.hook_points:
+            hookable.add_hook(point, self)
+
+    def detach(self, hookable, points=None):
+        """
+        Remove the timer from the given hook points of an object, or from all of them.
+        """
+        for point in points or hookable.hook_points:
+            hookable.remove_hook(point, self)
+
+    def report(self):
+        """
+        Return a list of dictionaries with the totals and mean time per call of each stage, slowest first.
+        """
+        rows = [dict(point=point, detail=detail, calls=calls, seconds=seconds, bytes=size,
+                     mean=seconds / calls if calls else 0.0)
+                for (point, detail), (calls, seconds, size) in self.stages.items()]
+        return sorted(rows, key=lambda r: r['seconds'], reverse=True)
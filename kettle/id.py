@@ -44,6 +44,13 @@ class Id:
         key_as_bytes = key.to_bytes(sz // 8, byteorder=byteorder, signed=signed)
         return cls.from_key(key_as_bytes, byteorder, signed)
 
+    @classmethod
+    def new_id(cls):
+        """
+        Generate a new random identifier used to correlate RPC requests and responses.
+        """
+        return cls.random()
+
 
 class NodeId:
     """
@@ -62,7 +69,7 @@ class NodeId:
         return cls(triple[:2], triple[2])
 
     def __init__(self, address, id=None):
-        self.address = address
+        self.address = tuple(address)
         self.id = id or Id.random()
 
     def __repr__(self):
@@ -0,0 +1,263 @@
+"""
+    kettle.loadgen
+    ~~~~~~~~~~~~~~
+
+    Contains an open-loop load generator that drives running nodes over UDP at a fixed request rate.
+"""
+__all__ = ['LoadGenerator']
+
+
+import asyncio
+import bisect
+import collections
+import itertools
+import json
+import math
+import random
+
+from kettle import get_event_loop
+from kettle.constants import DEFAULT_ADMISSION_RATE
+from kettle.exceptions import KettleRpcTimeout
+from kettle.id import Id
+from kettle.metrics import Registry
+from kettle.peer import Client
+
+
+#: Histogram bounds for request latencies: 20% steps from 50 microseconds to about 30 seconds.
+LATENCY_BUCKETS = tuple(0.00005 * 1.2 ** i for i in range(74))
+
+
+#: Quantiles reported for each operation.
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+#: Default operation mix, as relative weights.
+DEFAULT_MIX = (('ping', 1), ('store', 1), ('find_value', 2))
+
+
+class LoadGenerator:
+    """
+    Sends `ping`, `store` and `find_value` requests to a set of node addresses at a fixed rate.
+
+    Request `i` is due at `start + i / rate` whether or not earlier requests have been answered, so a slow
+    node doesn't slow the load down. Latency is measured from when each request was due rather than from
+    when it was sent, so time requests spent waiting behind a stalled event loop is counted instead of
+    hidden (coordinated omission). The uncorrected service time is recorded alongside for comparison.
+    Requests that time out or fail are recorded at the time they finished, and requests that are dropped at
+    `+Inf`, so quantiles and the mean cover every request that was due rather than only the answered ones.
+
+    Requests are sent straight to the given addresses from `clients` sockets in turn, without lookups,
+    congestion control or circuit breaking, so nothing on the sending side holds requests back. Requests
+    that would exceed `max_outstanding` are dropped and counted rather than queued.
+
+    Nodes shed requests from any one source address beyond their admission rate. Pass the per-source rate the
+    targets admit as `admission_rate` and enough sockets are used that none of them exceeds it, so the load
+    measures the nodes rather than their rate limit; pass `None` to use exactly `clients` sockets.
+    """
+
+    def __init__(self, targets, rate, duration, mix=DEFAULT_MIX, clients=1, keys=1000, value_size=64,
+                 timeout=1.0, max_outstanding=10000, seed=None, loop=None, registry=None,
+                 admission_rate=DEFAULT_ADMISSION_RATE):
+        self.targets = [tuple(t) for t in targets]
+        self.rate = rate
+        self.duration = duration
+        self.mix = tuple(mix)
+        self.timeout = timeout
+        self.max_outstanding = max_outstanding
+        self.admission_rate = admission_rate
+        self.loop = loop
+        self.random = random.Random(seed)
+        self.keys = [Id.from_key('loadgen-{}'.format(i)) for i in range(keys)]
+        self.value = 'x' * value_size
+        if admission_rate:
+            clients = max(clients, math.ceil(rate / admission_rate))
+        self.clients = [Client(('0.0.0.0', 0), loop=loop) for _ in range(clients)]
+        self.outstanding = set()
+        self.dropped = 0
+        self.max_lag = 0.0
+        self.elapsed = None
+
+        self.registry = registry if registry is not None else Registry()
+        self.latency = self.registry.histogram('kettle_loadgen_latency_seconds',
+                                               'Request latency measured from when each request was due.',
+                                               ('op',), LATENCY_BUCKETS)
+        self.service = self.registry.histogram('kettle_loadgen_service_seconds',
+                                               'Request latency measured from when each request was sent.',
+                                               ('op',), LATENCY_BUCKETS)
+        self.outcomes = self.registry.counter('kettle_loadgen_requests_total', 'Requests by outcome.',
+                                              ('op', 'outcome'))
+
+    def __repr__(self):
+        return '<{}(targets={}, rate={}, duration={})>'.format(self.__class__.__name__, len(self.targets),
+                                                               self.rate, self.duration)
+
+    @asyncio.coroutine
+    def connect(self):
+        """
+        Bind the client sockets.
+        """
+        for client in self.clients:
+            yield from client.connection.connect(client)
+            client.breaker = None
+            client.connection.protocol.congestion = None
+
+    def disconnect(self):
+        for client in self.clients:
+            client.disconnect()
+
+    def request(self, client, op, address):
+        """
+        Return a coroutine that performs the given operation against a node address.
+        """
+        if op == 'ping':
+            return client.ping(address, timeout=self.timeout)
+        key = self.random.choice(self.keys)
+        if op == 'store':
+            return client.store(address, key, self.value, timeout=self.timeout)
+        if op == 'find_value':
+            return client.find_value(address, key, timeout=self.timeout)
+        raise ValueError('Unknown operation: {}'.format(op))
+
+    @asyncio.coroutine
+    def measure(self, op, coro, due):
+        """
+        Wait for a request and record its outcome and latency.
+        """
+        sent = self.loop.time()
+        try:
+            yield from coro
+        except KettleRpcTimeout:
+            outcome = 'timeout'
+        except Exception as e:
+            outcome = e.__class__.__name__
+        else:
+            outcome = 'ok'
+        done = self.loop.time()
+        self.outcomes.inc((op, outcome))
+        self.latency.observe(done - due, (op,))
+        self.service.observe(done - sent, (op,))
+
+    @asyncio.coroutine
+    def run(self):
+        """
+        Send requests on schedule for `duration` seconds, then wait for the outstanding ones to finish.
+        Returns the report.
+        """
+        ops, weights = zip(*self.mix)
+        cumulative = list(itertools.accumulate(weights))
+        total = int(self.rate * self.duration)
+        clients = itertools.cycle(self.clients)
+        targets = itertools.cycle(self.targets)
+        interval = 1.0 / self.rate
+
+        start = self.loop.time()
+        for i in range(total):
+            due = start + i * interval
+            delay = due - self.loop.time()
+            if delay > 0:
+                yield from asyncio.sleep(delay, loop=self.loop)
+            else:
+                self.max_lag = max(self.max_lag, -delay)
+
+            op = ops[bisect.bisect_right(cumulative, self.random.random() * cumulative[-1])]
+            if len(self.outstanding) >= self.max_outstanding:
+                self.dropped += 1
+                self.outcomes.inc((op, 'dropped'))
+                self.latency.observe(float('inf'), (op,))
+                continue
+
+            task = self.loop.create_task(self.measure(op, self.request(next(clients), op, next(targets)), due))
+            self.outstanding.add(task)
+            task.add_done_callback(self.outstanding.discard)
+
+        if self.outstanding:
+            yield from asyncio.wait(list(self.outstanding), loop=self.loop)
+        self.elapsed = self.loop.time() - start
+        return self.report()
+
+    def report(self):
+        """
+        Return a dictionary with the achieved throughput, loss, timeouts and latency quantiles of each operation.
+        Quantiles and means that include dropped requests are infinite.
+        """
+        counts = collections.defaultdict(collections.Counter)
+        for (op, outcome), count in self.outcomes.values.items():
+            counts[op][outcome] += count
+
+        ops = {}
+        for op, outcomes in sorted(counts.items()):
+            key = (op,)
+            latency = dict(('p{:g}'.format(q * 100), self.ms(self.latency.quantile(q, key))) for q in QUANTILES)
+            service = dict(('p{:g}'.format(q * 100), self.ms(self.service.quantile(q, key))) for q in QUANTILES)
+            count = self.latency.count(key)
+            latency.update(mean=self.ms(self.latency.values[key][-1] / count) if count else None)
+            ops[op] = dict(outcomes=dict(outcomes), latency_ms=latency, service_ms=service)
+
+        outcomes = sum(counts.values(), collections.Counter())
+        sent = sum(outcomes.values()) - outcomes['dropped']
+        elapsed = self.elapsed or self.duration
+        return dict(targets=['{}:{}'.format(*t) for t in self.targets], rate=self.rate, duration=self.duration,
+                    elapsed=elapsed, sent=sent, completed=outcomes['ok'], throughput=outcomes['ok'] / elapsed,
+                    timeouts=outcomes['timeout'], loss=outcomes['timeout'] / sent if sent else 0.0,
+                    errors=sent - outcomes['ok'] - outcomes['timeout'], dropped=self.dropped,
+                    clients=len(self.clients), max_lag_ms=self.ms(self.max_lag), ops=ops)
+
+    @staticmethod
+    def ms(seconds):
+        return None if seconds is None else round(seconds * 1000, 3)
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def parse_mix(value):
+    mix = []
+    for item in value.split(','):
+        op, _, weight = item.partition('=')
+        mix.append((op.strip(), float(weight or 1)))
+    return mix
+
+
+def main():
+    import argparse
+    import logging
+
+    parser = argparse.ArgumentParser(description='Send requests to running kettle nodes at a fixed rate and '
+                                                 'report throughput, loss and latency.')
+    parser.add_argument('targets', nargs='*', type=parse_address, default=[('127.0.0.1', 8888)],
+                        help='Node addresses as host:port; default: 127.0.0.1:8888')
+    parser.add_argument('--rate', type=float, default=1000, help='Requests per second across all targets')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to send requests for')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Operation weights, e.g. ping=1,store=1,find_value=2')
+    parser.add_argument('--clients', type=int, default=1, help='Number of client sockets to send from')
+    parser.add_argument('--keys', type=int, default=1000, help='Number of distinct keys stored and looked up')
+    parser.add_argument('--value-size', type=int, default=64, help='Size of stored values in bytes')
+    parser.add_argument('--timeout', type=float, default=1.0, help='Seconds before a request times out')
+    parser.add_argument('--max-outstanding', type=int, default=10000,
+                        help='Requests in flight beyond which new requests are dropped')
+    parser.add_argument('--admission', type=float, default=DEFAULT_ADMISSION_RATE,
+                        help='Requests per second the targets admit from one source; more client sockets are used '
+                             'to stay under it. 0 if the targets have admission control off')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for operations and keys')
+    parser.add_argument('--uvloop', dest='fast', action='store_true', default=None, help='Use uvloop if installed')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    loop = get_event_loop(args.fast)
+    generator = LoadGenerator(args.targets, args.rate, args.duration, mix=args.mix, clients=args.clients,
+                              keys=args.keys, value_size=args.value_size, timeout=args.timeout,
+                              max_outstanding=args.max_outstanding, seed=args.seed, loop=loop,
+                              admission_rate=args.admission or None)
+    loop.run_until_complete(generator.connect())
+    try:
+        report = loop.run_until_complete(generator.run())
+    finally:
+        generator.disconnect()
+    print(json.dumps(report, sort_keys=True, indent=2))
+
+
+if __name__ == '__main__':
+    main()
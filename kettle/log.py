@@ -3,11 +3,15 @@
     ~~~~~~~~~~
 
     Contains Kettle logging.
+
+    Hot paths pass `%`-style arguments rather than formatted strings, so nothing is formatted unless a record
+    is emitted, and guard anything costlier with :meth:`~logging.Logger.isEnabledFor`.
 """
-__all__ = ['LOGGER']
+__all__ = ['LOGGER', 'ClassLogger', 'JSONFormatter']
 
 
 import logging
+import random
 
 from kettle.meta import resolve_type
 
@@ -22,14 +26,33 @@ def create_logger(name=None):
         Extends the python standard logger to automatically resolve child object type names.
         """
 
+        #: Child loggers already created, keyed by resolved type name.
+        children = {}
+
         def child(self, obj):
             """
             Return a :class: `~kettle.log.KettleLogger` instance attached as a child
-            to this logger keyed by tag.
+            to this logger keyed by tag. Every instance of a type shares the same child.
+            """
+            key = (self.name, resolve_type(obj))
+            try:
+                return self.children[key]
+            except KeyError:
+                child = super(KettleLogger, self).getChild(key[1])
+                child.__class__ = KettleLogger
+                self.children[key] = child
+                return child
+
+        def event(self, name, level=logging.INFO, sample=1.0, **fields):
             """
-            child = super(KettleLogger, self).getChild(resolve_type(obj))
-            child.__class__ = KettleLogger
-            return child
+            Log a structured event with the given fields, keeping only a `sample` fraction of them.
+
+            The fields are attached to the record as `event` and `fields` attributes for handlers such as
+            :class:`~kettle.log.JSONFormatter`; the message is only rendered if the record is emitted.
+            """
+            if not self.isEnabledFor(level) or (sample < 1 and random.random() >= sample):
+                return
+            self.log(level, '%s %s', name, EventFields(fields), extra=dict(event=name, fields=fields))
 
     # Configure new Kettle logger.
     logger = logging.getLogger(name)
@@ -37,4 +60,53 @@ def create_logger(name=None):
     return logger
 
 
+class EventFields:
+    """
+    Renders event fields as `key=value` pairs when a record is formatted.
+    """
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join('{}={}'.format(k, v) for k, v in sorted(self.fields.items()))
+
+
+class ClassLogger:
+    """
+    Descriptor giving every instance of a class one shared child logger.
+
+    The logger is created on first access and then stored on the class in place of the descriptor, so later
+    lookups are plain class attribute reads and instances don't each hold a logger.
+    """
+
+    def __init__(self, name='logger'):
+        self.name = name
+
+    def __get__(self, obj, cls):
+        logger = LOGGER.child(cls)
+        setattr(cls, self.name, logger)
+        return logger
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats records as JSON lines, including the fields of structured events.
+    """
+
+    def format(self, record):
+        import json
+        data = dict(time=record.created, level=record.levelname, logger=record.name)
+        event = getattr(record, 'event', None)
+        if event is not None:
+            data.update(record.fields, event=event)
+        else:
+            data.update(message=record.getMessage())
+        if record.exc_info:
+            data.update(exception=self.formatException(record.exc_info))
+        return json.dumps(data, sort_keys=True, default=str)
+
+
 LOGGER = create_logger()
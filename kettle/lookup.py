@@ -0,0 +1,146 @@
+"""
+    kettle.lookup
+    ~~~~~~~~~~~~~
+
+    Contains the iterative node and value lookup procedure.
+"""
+__all__ = ['Lookup']
+
+
+import asyncio
+import heapq
+
+from kettle.constants import ALPHA, K
+from kettle.id import NodeId
+
+
+class Lookup:
+    """
+    Iterative lookup of the `k` nodes closest to a key, or of the value stored under it.
+
+    Up to `alpha` queries are kept in flight at once. Whenever one completes, the closest node that has not been
+    queried yet is asked next, until the `k` closest nodes known have all answered or failed. Value lookups
+    finish as soon as any node returns the value.
+
+    When the endpoint has a :class:`~kettle.tracing.Tracer`, a sampled lookup records a span per query with the
+    peer's distance from the key, how many hops away it was learned, the round trip and the outcome.
+    """
+
+    def __init__(self, endpoint, key, find, alpha=ALPHA, k=K, value=False):
+        self.endpoint = endpoint
+        self.loop = endpoint.loop
+        self.key = key
+        self.find = find
+        self.alpha = alpha
+        self.k = k
+        self.value = value
+        self.shortlist = set()
+        self.queried = set()
+        self.failed = set()
+        self.depth = dict()
+        self.rpcs = 0
+        self.failures = 0
+        self.hops = 0
+        self.found = False
+        self.span = None
+        tracer = getattr(endpoint, 'tracer', None)
+        if tracer is not None:
+            self.span = tracer.start('lookup', key='{:040x}'.format(key), value=value, alpha=alpha, k=k)
+
+    def __repr__(self):
+        return '<{}(key={}, value={}, rpcs={}, hops={}, found={})>'.format(self.__class__.__name__, self.key,
+                                                                            self.value, self.rpcs, self.hops,
+                                                                            self.found)
+
+    def distance(self, node_id):
+        return node_id.id ^ self.key
+
+    def closest(self):
+        """
+        Return the `k` closest nodes in the shortlist that have not failed, nearest first. Nodes whose address is
+        known to be unreachable are skipped.
+        """
+        breaker = getattr(self.endpoint, 'breaker', None)
+        candidates = (n for n in self.shortlist
+                      if n not in self.failed and (breaker is None or not breaker.is_open(n.address)))
+        return heapq.nsmallest(self.k, candidates, key=self.distance)
+
+    def add(self, node_id, depth):
+        """
+        Add a node to the shortlist, remembering how many hops away from us it was learned.
+        """
+        if node_id == getattr(self.endpoint, 'node_id', None) or node_id in self.shortlist:
+            return
+        self.shortlist.add(node_id)
+        self.depth[node_id] = depth
+
+    @asyncio.coroutine
+    def run(self):
+        """
+        Perform the lookup. Returns the closest nodes for node lookups, or the value for value lookups.
+
+        Raises `KeyError` if the routing table is empty or, for value lookups, if no node holds the value.
+        """
+        for node_id in self.endpoint.table.find_k_closest_nodes(self.key, k=self.k):
+            self.add(node_id, 1)
+        if not self.shortlist:
+            if self.span is not None:
+                self.span.finish('empty')
+            raise KeyError('Routing table is empty')
+
+        pending = dict()
+        spans = dict()
+        try:
+            while True:
+                # Top up the in-flight queries with the closest nodes we haven't asked yet.
+                for node_id in self.closest():
+                    if len(pending) >= self.alpha:
+                        break
+                    if node_id not in self.queried:
+                        self.queried.add(node_id)
+                        span = None
+                        if self.span is not None:
+                            span = spans[node_id] = self.span.child('query', depth=self.depth[node_id],
+                                                                    distance=self.distance(node_id).bit_length())
+                        pending[self.loop.create_task(self.find(node_id, self.key, span=span))] = node_id
+
+                if not pending:
+                    break
+
+                done, _ = yield from asyncio.wait(pending, loop=self.loop, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    node_id = pending.pop(future)
+                    self.rpcs += 1
+                    try:
+                        result = future.result()
+                    except Exception:
+                        self.failed.add(node_id)
+                        self.failures += 1
+                        continue
+
+                    depth = self.depth[node_id]
+                    self.hops = max(self.hops, depth)
+
+                    if self.value:
+                        found, result = result
+                        if found:
+                            self.found = True
+                            return result
+
+                    known = len(self.shortlist)
+                    for triple in result:
+                        self.add(NodeId.from_triple(triple), depth + 1)
+                    if self.span is not None:
+                        spans[node_id].update(learned=len(self.shortlist) - known)
+        finally:
+            for future, node_id in pending.items():
+                future.cancel()
+                if self.span is not None:
+                    spans[node_id].finish('cancelled')
+            if self.span is not None:
+                self.span.finish('found' if self.found else 'done', rpcs=self.rpcs, hops=self.hops,
+                                 failures=self.failures, shortlist=len(self.shortlist))
+
+        if self.value:
+            raise KeyError(self.key)
+        return self.closest()
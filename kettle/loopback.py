@@ -0,0 +1,242 @@
+"""
+    kettle.loopback
+    ~~~~~~~~~~~~~~~
+
+    Contains an in-memory datagram network for running many nodes inside one process without sockets.
+"""
+__all__ = ['LoopbackNetwork', 'LoopbackTransport', 'VirtualClockEventLoop']
+
+
+import asyncio
+import collections
+import errno
+import random
+import selectors
+
+
+#: First port handed out to transports bound to port zero.
+EPHEMERAL_PORT = 49152
+
+
+#: Host that receives datagrams sent to any host on its port.
+WILDCARD_HOST = '0.0.0.0'
+
+
+class LoopbackTransport(asyncio.DatagramTransport):
+    """
+    Datagram transport bound to an address of a :class:`LoopbackNetwork`.
+
+    Implements the part of :class:`asyncio.DatagramTransport` used by :class:`~kettle.protocol.Protocol`.
+    Sends never block or buffer; datagrams are handed to the network which delivers or drops them.
+    """
+
+    def __init__(self, network, protocol, address):
+        super(LoopbackTransport, self).__init__()
+        self.network = network
+        self.protocol = protocol
+        self.address = address
+        self.closing = False
+
+    def __repr__(self):
+        return '<{}(address={}, closing={})>'.format(self.__class__.__name__, self.address, self.closing)
+
+    def get_extra_info(self, name, default=None):
+        if name == 'sockname':
+            return self.address
+        return default
+
+    def get_protocol(self):
+        return self.protocol
+
+    def set_protocol(self, protocol):
+        self.protocol = protocol
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def is_closing(self):
+        return self.closing
+
+    def sendto(self, data, addr=None):
+        if self.closing:
+            return
+        self.network.send(self.address, bytes(data), tuple(addr))
+
+    def close(self):
+        if self.closing:
+            return
+        self.closing = True
+        self.network.unbind(self)
+        self.network.loop.call_soon(self.protocol.connection_lost, None)
+
+    def abort(self):
+        self.close()
+
+
+class LoopbackNetwork:
+    """
+    In-process network that connects :class:`LoopbackTransport` instances by address.
+
+    Each datagram is delayed by `latency` seconds plus up to `jitter` seconds, dropped with probability `loss`
+    and, when `bandwidth` (bytes per second) is set, serialized behind earlier datagrams from the same sender.
+    All randomness comes from one generator seeded with `seed`, so a simulation driven by a single event loop
+    behaves identically on every run.
+
+    Pass an instance as the `network` of a :class:`~kettle.connection.Connection` to use it in place of
+    real UDP sockets.
+    """
+
+    transport_factory = LoopbackTransport
+
+    def __init__(self, loop, latency=0.0, jitter=0.0, loss=0.0, bandwidth=None, seed=None):
+        self.loop = loop
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.bandwidth = bandwidth
+        self.random = random.Random(seed)
+        self.transports = {}
+        self.busy = {}
+        self.next_port = EPHEMERAL_PORT
+        self.counters = collections.Counter()
+
+    def __repr__(self):
+        return '<{}(latency={}, jitter={}, loss={}, bandwidth={}, transports={})>'.format(
+            self.__class__.__name__, self.latency, self.jitter, self.loss, self.bandwidth, len(self.transports))
+
+    def __len__(self):
+        return len(self.transports)
+
+    @asyncio.coroutine
+    def create_datagram_endpoint(self, protocol_factory, local_addr=None, **kwargs):
+        """
+        Create a transport bound to `local_addr`, mirroring :meth:`asyncio.AbstractEventLoop.create_datagram_endpoint`.
+
+        Binding to port zero picks an unused port; binding to an address already in use raises :class:`OSError`.
+        Other socket options are accepted and ignored.
+        """
+        host, port = local_addr or (WILDCARD_HOST, 0)
+        if not port:
+            port = self.allocate_port(host)
+
+        address = (host, port)
+        if address in self.transports:
+            raise OSError(errno.EADDRINUSE, 'Address already in use: {}:{}'.format(*address))
+
+        protocol = protocol_factory()
+        transport = self.transport_factory(self, protocol, address)
+        self.transports[address] = transport
+        protocol.connection_made(transport)
+        return transport, protocol
+
+    def allocate_port(self, host):
+        """
+        Return the next port that isn't bound on the given host.
+        """
+        while (host, self.next_port) in self.transports:
+            self.next_port += 1
+        port, self.next_port = self.next_port, self.next_port + 1
+        return port
+
+    def unbind(self, transport):
+        """
+        Remove a closed transport from the network. Datagrams still in flight to it are dropped.
+        """
+        if self.transports.get(transport.address) is transport:
+            del self.transports[transport.address]
+        self.busy.pop(transport.address, None)
+
+    def resolve(self, address):
+        """
+        Return the transport that receives datagrams sent to the given address, or `None`.
+        """
+        transport = self.transports.get(address)
+        if transport is None:
+            transport = self.transports.get((WILDCARD_HOST, address[1]))
+        return transport
+
+    def delay(self, source, size):
+        """
+        Return the number of seconds until a datagram of the given size sent now by `source` arrives.
+        """
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+
+        if self.bandwidth:
+            now = self.loop.time()
+            start = max(now, self.busy.get(source, now))
+            finish = start + size / self.bandwidth
+            self.busy[source] = finish
+            delay += finish - now
+
+        return delay
+
+    def send(self, source, data, destination):
+        """
+        Carry a datagram from `source` to `destination`, subject to loss and delay.
+        """
+        self.counters['sent'] += 1
+        self.counters['bytes'] += len(data)
+
+        if self.loss and self.random.random() < self.loss:
+            self.counters['lost'] += 1
+            return
+
+        delay = self.delay(source, len(data))
+        if delay > 0:
+            self.loop.call_later(delay, self.deliver, source, data, destination)
+        else:
+            self.loop.call_soon(self.deliver, source, data, destination)
+
+    def deliver(self, source, data, destination):
+        """
+        Hand a datagram to the protocol of the transport bound to `destination`, if any.
+        """
+        transport = self.resolve(destination)
+        if transport is None or transport.closing:
+            self.counters['unreachable'] += 1
+            return
+
+        self.counters['delivered'] += 1
+        transport.protocol.datagram_received(data, source)
+
+
+class VirtualSelector:
+    """
+    Selector that polls without blocking and advances the clock of a :class:`VirtualClockEventLoop` by the
+    timeout the loop would have waited instead.
+    """
+
+    def __init__(self, selector, loop):
+        self.selector = selector
+        self.loop = loop
+
+    def __getattr__(self, name):
+        return getattr(self.selector, name)
+
+    def select(self, timeout=None):
+        if timeout is None:
+            return self.selector.select(timeout)
+        events = self.selector.select(0)
+        if not events:
+            self.loop.now += timeout
+        return events
+
+
+class VirtualClockEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose clock only moves when the loop would otherwise wait for the next timer.
+
+    Callbacks take no time on the clock, so a :class:`LoopbackNetwork` driven by this loop measures latency
+    from the simulated links alone, however much work the process does, and sleeps and timeouts return at
+    once. Real sockets still work, but are only polled between callbacks.
+    """
+
+    def __init__(self, start=0.0):
+        #: Current time of the loop in seconds.
+        self.now = start
+        super(VirtualClockEventLoop, self).__init__(VirtualSelector(selectors.DefaultSelector(), self))
+
+    def time(self):
+        return self.now
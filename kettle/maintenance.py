@@ -0,0 +1,195 @@
+"""
+    kettle.maintenance
+    ~~~~~~~~~~~~~~~~~~
+
+    Contains background tasks that keep a node's routing table fresh.
+"""
+__all__ = ['RefreshScheduler', 'LivenessProber']
+
+
+import asyncio
+import collections
+import random
+
+from kettle.constants import DEFAULT_REFRESH_INTERVAL, DEFAULT_REFRESH_CHECK_INTERVAL, \
+    DEFAULT_REFRESH_CONCURRENCY, DEFAULT_REFRESH_JITTER, DEFAULT_PROBE_DELAY, DEFAULT_PROBE_BATCH
+
+
+class RefreshScheduler:
+    """
+    Periodically refreshes the buckets of a node's routing table that have gone stale.
+
+    Every check interval (with jitter) the buckets untouched for `stale_after` seconds are refreshed with a
+    lookup of a random id in their range. Refreshes are spread out over part of the interval and at most
+    `concurrency` run at once, so the table stays fresh without bursts of traffic.
+    """
+
+    def __init__(self, node, stale_after=DEFAULT_REFRESH_INTERVAL, interval=DEFAULT_REFRESH_CHECK_INTERVAL,
+                 concurrency=DEFAULT_REFRESH_CONCURRENCY, jitter=DEFAULT_REFRESH_JITTER):
+        self.node = node
+        self.loop = node.loop
+        self.stale_after = stale_after
+        self.interval = interval
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.handle = None
+        self.task = None
+        self.refreshes = 0
+
+    def __repr__(self):
+        return '<{}(stale_after={}, interval={}, refreshes={})>'.format(self.__class__.__name__, self.stale_after,
+                                                                        self.interval, self.refreshes)
+
+    def start(self):
+        """
+        Start checking for stale buckets.
+        """
+        self.schedule()
+
+    def stop(self):
+        """
+        Stop checking for stale buckets and cancel any refresh in progress.
+        """
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def schedule(self):
+        """
+        Schedule the next check, randomly moved by up to `jitter` of the interval either way.
+        """
+        delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+        self.handle = self.loop.call_later(delay, self.on_interval)
+
+    def on_interval(self):
+        """
+        Callback raised every check interval to start refreshing stale buckets.
+        """
+        self.handle = None
+        self.task = self.loop.create_task(self.refresh())
+        self.task.add_done_callback(lambda task: self.schedule() if self.task is task else None)
+
+    @asyncio.coroutine
+    def refresh(self):
+        """
+        Refresh every stale bucket. Returns the number of buckets refreshed.
+        """
+        indices = self.node.table.stale_buckets(self.stale_after)
+        if not indices:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency, loop=self.loop)
+        spread = self.interval * self.jitter
+        yield from asyncio.gather(*(self.refresh_bucket(i, semaphore, spread) for i in indices), loop=self.loop,
+                                  return_exceptions=True)
+        return len(indices)
+
+    @asyncio.coroutine
+    def refresh_bucket(self, index, semaphore, spread):
+        """
+        Refresh a single bucket after a random delay of up to `spread` seconds.
+        """
+        yield from asyncio.sleep(random.uniform(0, spread), loop=self.loop)
+        yield from semaphore.acquire()
+        try:
+            self.refreshes += 1
+            self.node.table.table[index].touch()
+            yield from self.node.lookup_node(self.node.table.random_id(index))
+        finally:
+            semaphore.release()
+
+
+class LivenessProber:
+    """
+    Pings the least-recently seen node of full buckets and evicts it if it doesn't answer, letting the most
+    recently seen node from the bucket's cache take its place.
+
+    Scheduling a probe only records the bucket, so it is cheap enough to call from every routing table update.
+    Probes are deduplicated per bucket and per node, gathered for `delay` seconds and sent in batches of at most
+    `batch` pings.
+    """
+
+    def __init__(self, node, delay=DEFAULT_PROBE_DELAY, batch=DEFAULT_PROBE_BATCH):
+        self.node = node
+        self.loop = node.loop
+        self.delay = delay
+        self.batch = batch
+        self.pending = collections.OrderedDict()
+        self.probing = set()
+        self.handle = None
+        self.probes = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return '<{}(pending={}, probing={}, evictions={})>'.format(self.__class__.__name__, len(self.pending),
+                                                                   len(self.probing), self.evictions)
+
+    def schedule(self, index):
+        """
+        Queue a probe of the least-recently seen node in the bucket at the given index.
+        """
+        bucket = self.node.table.table[index]
+        if index in self.pending or not bucket.bucket:
+            return
+
+        head = bucket.bucket[0]
+        if head in self.probing:
+            return
+
+        self.pending[index] = head
+        if self.handle is None:
+            self.handle = self.loop.call_later(self.delay, self.flush)
+
+    def stop(self):
+        """
+        Stop probing and forget queued probes.
+        """
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        self.pending.clear()
+
+    def flush(self):
+        """
+        Send the next batch of queued probes.
+        """
+        self.handle = None
+
+        # Probes queued before the node is connected, e.g. while restoring a snapshot, wait until it is.
+        if self.node.connection.protocol is None:
+            self.handle = self.loop.call_later(self.delay, self.flush)
+            return
+
+        probes = []
+        while self.pending and len(probes) < self.batch:
+            index, head = self.pending.popitem(last=False)
+            self.probing.add(head)
+            probes.append((index, head))
+
+        if probes:
+            self.loop.create_task(self.probe(probes))
+        if self.pending:
+            self.handle = self.loop.call_later(self.delay, self.flush)
+
+    @asyncio.coroutine
+    def probe(self, probes):
+        """
+        Ping the given `(index, node_id)` pairs and evict the nodes that don't answer.
+
+        Nodes that answer are moved to the tail of their bucket by the ping itself.
+        """
+        self.probes += len(probes)
+        try:
+            results = yield from asyncio.gather(*(self.node.ping(head) for _, head in probes), loop=self.loop,
+                                                return_exceptions=True)
+        finally:
+            for _, head in probes:
+                self.probing.discard(head)
+
+        for (index, head), result in zip(probes, results):
+            if isinstance(result, Exception):
+                self.evictions += 1
+                self.node.table.table[index].remove(head)
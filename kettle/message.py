@@ -29,15 +29,17 @@ class Message:
     Represents a payload sent between two peers on the network.
     """
 
-    __slots__ = ('type', 'node_id', 'address', 'rpc', 'rpc_id', 'payload')
+    __slots__ = ('type', 'node_id', 'address', 'rpc', 'rpc_id', 'payload', 'target')
 
     @classmethod
-    def request(cls, node_id, address, rpc, args):
+    def request(cls, node_id, address, rpc, args, target=None):
         """
         Create message to request network for data.
+
+        :param target: Optional id of the node the request is destined for; Default: `None`
         """
         rpc_id = Id.new_id()
-        return cls(MessageType.request.name, node_id, address, rpc, rpc_id, args)
+        return cls(MessageType.request.name, node_id, address, rpc, rpc_id, args, target)
 
     @classmethod
     def response(cls, node_id, address, rpc, rpc_id, args):
@@ -46,11 +48,12 @@ class Message:
         """
         return cls(MessageType.response.name, node_id, address, rpc, rpc_id, args)
 
-    # @classmethod
-    # def error(cls, node_id, address, rpc, rpc_id, args):
-    #     """
-    #     """
-    #     return cls(MessageType.error.name, node_id, address, rpc, rpc_id, args)
+    @classmethod
+    def error(cls, node_id, address, rpc, rpc_id, args):
+        """
+        Create message to reject a network request.
+        """
+        return cls(MessageType.error.name, node_id, address, rpc, rpc_id, args)
 
     @classmethod
     def encode(cls, msg):
@@ -70,22 +73,19 @@ class Message:
         except Exception as e:
             raise KettleMessageFormatError('Invalid message attributes: {}'.format(e))
 
-    def __init__(self, type, node_id, address, rpc, rpc_id, payload):
+    def __init__(self, type, node_id, address, rpc, rpc_id, payload, target=None):
         self.type = type
         self.node_id = node_id
         self.address = address
         self.rpc = rpc
         self.rpc_id = rpc_id
         self.payload = payload
+        self.target = target
 
     def __repr__(self):
-        return '<{}(type={}, node_id={}, address={}, rpc={}, rpc_id={}, payload={})>'.format(self.__class__.__name__,
-                                                                                             self.type,
-                                                                                             self.node_id,
-                                                                                             self.address,
-                                                                                             self.rpc,
-                                                                                             self.rpc_id,
-                                                                                             self.payload)
+        return '<{}(type={}, node_id={}, address={}, rpc={}, rpc_id={}, payload={}, target={})>'.format(
+            self.__class__.__name__, self.type, self.node_id, self.address, self.rpc, self.rpc_id, self.payload,
+            self.target)
 
     def __str__(self):
         direction = '>>>' if self.type == MessageType.request.name else '<<<'
@@ -96,4 +96,8 @@ class Message:
         return cls(**data)
 
     def to_dict(self):
-        return dict((a, getattr(self, a)) for a in self.__slots__)
+        data = dict((a, getattr(self, a)) for a in self.__slots__)
+        # Releases without multiplexing reject a `target` key, so it is only sent when set.
+        if self.target is None:
+            del data['target']
+        return data
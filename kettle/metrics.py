@@ -0,0 +1,383 @@
+"""
+    kettle.metrics
+    ~~~~~~~~~~~~~~
+
+    Contains a small metrics registry, the metrics collected by a protocol and a Prometheus text exporter.
+"""
+__all__ = ['Counter', 'Gauge', 'Histogram', 'Registry', 'ProtocolMetrics', 'MetricsServer']
+
+
+import asyncio
+import bisect
+
+from kettle.constants import DEFAULT_LATENCY_BUCKETS
+from kettle.log import LOGGER
+
+
+def escape(value):
+    """
+    Escape a label value for the Prometheus text format.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, key, extra=None):
+    """
+    Return the `{name="value",...}` label set for a sample, or an empty string if it has no labels.
+    """
+    pairs = ['{}="{}"'.format(n, escape(v)) for n, v in zip(names, key)]
+    if extra is not None:
+        pairs.append('{}="{}"'.format(*extra))
+    return '{{{}}}'.format(','.join(pairs)) if pairs else ''
+
+
+class Metric:
+    """
+    Base class for a named metric whose samples are keyed by a tuple of label values.
+    """
+
+    type = None
+
+    def __init__(self, name, help='', labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def __repr__(self):
+        return '<{}(name={}, labels={})>'.format(self.__class__.__name__, self.name, self.labels)
+
+    def samples(self):
+        """
+        Return an iterable of `(suffix, key, extra_label, value)` samples.
+        """
+        raise NotImplementedError('samples must be implemented in derived class!')
+
+    def expose(self):
+        """
+        Return the metric in the Prometheus text format.
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} {}'.format(self.name, self.type)]
+        for suffix, key, extra, value in self.samples():
+            lines.append('{}{}{} {}'.format(self.name, suffix, format_labels(self.labels, key, extra), value))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count.
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, help='', labels=()):
+        super(Counter, self).__init__(name, help, labels)
+        self.values = {}
+
+    def inc(self, key=(), amount=1):
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, key=()):
+        return self.values.get(key, 0)
+
+    def samples(self):
+        return (('', key, None, value) for key, value in sorted(self.values.items()))
+
+
+class Gauge(Metric):
+    """
+    Value that goes up and down. Callbacks registered with :meth:`add_callback` are read at collection time
+    and their values added to the set ones, so state that already lives elsewhere costs nothing to track.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, help='', labels=()):
+        super(Gauge, self).__init__(name, help, labels)
+        self.values = {}
+        self.callbacks = []
+
+    def set(self, value, key=()):
+        self.values[key] = value
+
+    def inc(self, key=(), amount=1):
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, key=(), amount=1):
+        self.values[key] = self.values.get(key, 0) - amount
+
+    def add_callback(self, callback):
+        """
+        Register a callable returning either a single value or an iterable of `(key, value)` pairs.
+        """
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def collect(self):
+        """
+        Return the current values, including those read from callbacks.
+        """
+        values = dict(self.values)
+        for callback in self.callbacks:
+            result = callback()
+            for key, value in (((), result),) if isinstance(result, (int, float)) else result:
+                values[key] = values.get(key, 0) + value
+        return values
+
+    def samples(self):
+        return (('', key, None, value) for key, value in sorted(self.collect().items()))
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over fixed upper bounds.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, help='', labels=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+
+    def observe(self, value, key=()):
+        try:
+            counts = self.values[key]
+        except KeyError:
+            # Per key: a count per bucket, one for values above every bucket, then the sum.
+            counts = self.values[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def count(self, key=()):
+        counts = self.values.get(key)
+        return sum(counts[:-1]) if counts else 0
+
+    def quantile(self, q, key=()):
+        """
+        Return the upper bound of the bucket holding the `q` quantile of the observed values, `inf` if it lies
+        above every bucket, or `None` if nothing was observed.
+        """
+        counts = self.values.get(key)
+        if not counts:
+            return None
+        rank = q * sum(counts[:-1])
+        total = 0
+        for bound, count in zip(self.buckets, counts):
+            total += count
+            if count and total >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        for key, counts in sorted(self.values.items()):
+            total = 0
+            for bound, count in zip(self.buckets, counts):
+                total += count
+                yield '_bucket', key, ('le', repr(float(bound))), total
+            total += counts[-2]
+            yield '_bucket', key, ('le', '+Inf'), total
+            yield '_sum', key, None, counts[-1]
+            yield '_count', key, None, total
+
+
+class Registry:
+    """
+    Collection of metrics, keyed by name.
+
+    Metrics are created with :meth:`counter`, :meth:`gauge` and :meth:`histogram`, which return the existing
+    metric when the name is already registered, so many protocols can share one registry.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def __repr__(self):
+        return '<{}(metrics={})>'.format(self.__class__.__name__, len(self.metrics))
+
+    def __iter__(self):
+        return iter(self.metrics[name] for name in sorted(self.metrics))
+
+    def __getitem__(self, name):
+        return self.metrics[name]
+
+    def register(self, metric):
+        """
+        Register a metric, returning the one already registered under its name if there is one.
+        """
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help='', labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help='', labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help='', labels=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def expose(self):
+        """
+        Return every metric in the Prometheus text format.
+        """
+        return ''.join(metric.expose() + '\n' for metric in self)
+
+
+class ProtocolMetrics:
+    """
+    Metrics collected by a :class:`~kettle.protocol.Protocol`.
+
+    Counts messages per rpc, type and direction, outbound request latency and outcomes, and decode and socket
+    errors. Table occupancy, storage size and in-flight requests are read from the protocol and its endpoint
+    only when the metrics are collected.
+
+    Every sample is labelled with `endpoint`, by default the `host:port` of the protocol's endpoint, so protocols
+    sharing one registry stay apart.
+    """
+
+    def __init__(self, protocol, registry=None, endpoint=None):
+        self.protocol = protocol
+        self.loop = protocol.loop
+        self.registry = registry if registry is not None else Registry()
+        self.endpoint = endpoint if endpoint is not None else '{}:{}'.format(*protocol.endpoint.address)
+        self.started = {}
+
+        registry = self.registry
+        self.messages = registry.counter('kettle_messages_total', 'Messages sent and received.',
+                                         ('endpoint', 'rpc', 'type', 'direction'))
+        self.latency = registry.histogram('kettle_request_latency_seconds',
+                                          'Seconds from sending a request until it completed.',
+                                          ('endpoint', 'rpc', 'outcome'))
+        self.outcomes = registry.counter('kettle_requests_total', 'Outbound requests by outcome.',
+                                         ('endpoint', 'rpc', 'outcome'))
+        self.errors = registry.counter('kettle_errors_total', 'Datagrams that failed to decode, encode or send.',
+                                       ('endpoint', 'kind'))
+
+        registry.gauge('kettle_in_flight', 'Outbound requests waiting for a response.',
+                       ('endpoint', 'state')).add_callback(self.in_flight)
+        registry.gauge('kettle_table_nodes', 'Nodes in each routing table bucket.',
+                       ('endpoint', 'bucket', 'list')).add_callback(self.table_nodes)
+        registry.gauge('kettle_storage_keys', 'Keys stored by the node.',
+                       ('endpoint',)).add_callback(self.storage_keys)
+
+    def __repr__(self):
+        return '<{}(endpoint={}, registry={}, started={})>'.format(self.__class__.__name__, self.endpoint,
+                                                                  self.registry, len(self.started))
+
+    def message(self, message_type, rpc, direction):
+        self.messages.inc((self.endpoint, rpc, message_type, direction))
+
+    def error(self, kind):
+        self.errors.inc((self.endpoint, kind))
+
+    def request_sent(self, request):
+        self.started[request.rpc_id] = (request.rpc, self.loop.time())
+
+    def request_done(self, request_id, outcome):
+        try:
+            rpc, start = self.started.pop(request_id)
+        except KeyError:
+            return
+        self.latency.observe(self.loop.time() - start, (self.endpoint, rpc, outcome))
+        self.outcomes.inc((self.endpoint, rpc, outcome))
+
+    def in_flight(self):
+        protocol, endpoint = self.protocol, self.endpoint
+        values = [((endpoint, 'futures'), len(protocol.futures)),
+                  ((endpoint, 'sent'), len(protocol.requests) - len(protocol.queued))]
+        if protocol.congestion is not None:
+            values.append(((endpoint, 'queued'), protocol.congestion.queued))
+        if protocol.admission is not None:
+            values.append(((endpoint, 'inbound_pending'), len(protocol.admission.pending)))
+            values.append(((endpoint, 'inbound_active'), protocol.admission.active))
+        return values
+
+    def table_nodes(self):
+        table = getattr(self.protocol.endpoint, 'table', None)
+        if table is None:
+            return ()
+        values = []
+        for bucket in table:
+            if bucket.bucket:
+                values.append(((self.endpoint, bucket.i, 'bucket'), len(bucket.bucket)))
+            if bucket.cache:
+                values.append(((self.endpoint, bucket.i, 'cache'), len(bucket.cache)))
+        return values
+
+    def storage_keys(self):
+        return [((self.endpoint,), len(getattr(self.protocol.endpoint, 'db', ())))]
+
+    def close(self):
+        """
+        Stop reading from the protocol when metrics are collected.
+        """
+        for name, callback in (('kettle_in_flight', self.in_flight), ('kettle_table_nodes', self.table_nodes),
+                               ('kettle_storage_keys', self.storage_keys)):
+            self.registry[name].remove_callback(callback)
+
+
+class MetricsServer:
+    """
+    Minimal HTTP server exposing a :class:`Registry` in the Prometheus text format at `/metrics`.
+
+    Meant to be bound to a local address for a scraper; it serves one request per connection.
+    """
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, registry, address=('127.0.0.1', 9100), loop=None):
+        self.registry = registry
+        self.address = address
+        self.loop = loop
+        self.server = None
+        self.logger = LOGGER.child(self)
+
+    def __repr__(self):
+        return '<{}(address={}, serving={})>'.format(self.__class__.__name__, self.address, self.server is not None)
+
+    @asyncio.coroutine
+    def start(self):
+        """
+        Start listening for scrapes.
+        """
+        host, port = self.address
+        self.server = yield from asyncio.start_server(self.handle, host, port, loop=self.loop)
+        self.logger.info('Serving metrics on http://{}:{}/metrics'.format(host, port))
+
+    def close(self):
+        """
+        Stop listening for scrapes.
+        """
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    @asyncio.coroutine
+    def handle(self, reader, writer):
+        """
+        Answer a single HTTP request.
+        """
+        try:
+            request = yield from reader.readline()
+            while (yield from reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+
+            parts = request.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] != 'GET':
+                status, body = '405 Method Not Allowed', ''
+            elif parts[1].split('?')[0] != '/metrics':
+                status, body = '404 Not Found', ''
+            else:
+                status, body = '200 OK', self.registry.expose()
+
+            body = body.encode('utf-8')
+            head = 'HTTP/1.0 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'.format(
+                status, self.content_type, len(body))
+            writer.write(head.encode('latin-1') + body)
+            yield from writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            self.logger.debug('Metrics request failed: {}'.format(e))
+        finally:
+            writer.close()
@@ -7,12 +7,17 @@
 __all__ = ['Server', 'Node']
 
 import asyncio
-import itertools
+import os
 
-from kettle import get_event_loop
+from kettle import get_event_loop, snapshot
+from kettle.breaker import CircuitBreaker
 from kettle.connection import Endpoint, ServerConnection
-from kettle.constants import ALPHA
-from kettle.id import Id
+from kettle.constants import ALPHA, DEFAULT_SNAPSHOT_INTERVAL, DEFAULT_VERIFY_BATCH
+from kettle.exceptions import KettleConnectionError
+from kettle.id import Id, NodeId
+from kettle.lookup import Lookup
+from kettle.maintenance import LivenessProber, RefreshScheduler
+from kettle.meta import resolve_type
 from kettle.protocol import rpc
 from kettle.routing import RoutingTable
 
@@ -38,13 +43,14 @@ class Server(Endpoint):
 
         # Listen on socket for incoming connections until explicitly stopped.
         try:
+            self.logger.info('Using event loop {}'.format(resolve_type(self.loop)))
             self.logger.info('Listening on socket {}:{}'.format(*self.address))
             self.loop.run_forever()
         except KeyboardInterrupt:
             pass
         finally:
             self.logger.info('Shutting down')
-            self.connection.disconnect()
+            self.disconnect()
             self.loop.close()
 
 
@@ -54,14 +60,45 @@ class Node(Server):
 
     Nodes are cooperative members of the network. They are responsible for listening to requests, storing data
     and fulfilling all the requirements of being a network peer.
+
+    Inbound requests pass through the protocol's :class:`~kettle.admission.AdmissionController`, which by default
+    sheds requests from any single address beyond 1000 per second (bursts of 2000) and when 256 are being
+    handled with 1024 more waiting. Shed requests are answered with an error that a :class:`~kettle.peer.Client`
+    retries after backing off. Change the limits with `ServerProtocol.admission_factory`, or set it to `None` to
+    disable admission control.
     """
 
-    def __init__(self, address, loop=None, alpha=None):
-        super(Node, self).__init__(address, loop)
-        self.node_id = Id(address)
+    #:
+    refresh_factory = RefreshScheduler
+
+    #:
+    prober_factory = LivenessProber
+
+    #:
+    breaker_factory = CircuitBreaker
+
+    #: :class:`~kettle.tracing.Tracer` recording a sample of lookups; disabled when `None`.
+    tracer = None
+
+    def __init__(self, address, loop=None, alpha=None, id=None, connection=None, snapshot_path=None,
+                 snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        super(Node, self).__init__(address, loop, connection)
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_handle = None
+
+        # Restart with the id and contacts from our last snapshot, if there is one.
+        table_id, entries = self.read_snapshot()
+        self.node_id = NodeId(address, id or table_id)
         self.table = RoutingTable(self)
+        self.prober = self.table.prober = self.prober_factory(self) if self.prober_factory else None
+        self.table.restore(entries)
+
         self.db = dict()
         self.alpha = alpha or ALPHA
+        self.ready_time = None
+        self.refresher = self.refresh_factory(self) if self.refresh_factory else None
+        self.breaker = self.breaker_factory() if self.breaker_factory else None
 
     @property
     def id(self):
@@ -71,6 +108,92 @@ class Node(Server):
     def address(self):
         return self.node_id.address
 
+    def listen(self):
+        """
+        Listen for incoming requests, start refreshing stale buckets, verify any contacts restored from
+        a snapshot in the background and start taking periodic snapshots.
+        """
+        result = super(Node, self).listen()
+        if self.refresher is not None:
+            self.refresher.start()
+        if self.snapshot_path is not None:
+            if len(self.table):
+                self.loop.create_task(self.verify_table())
+            self.snapshot_handle = self.loop.call_later(self.snapshot_interval, self.on_snapshot_interval)
+        return result
+
+    def disconnect(self):
+        """
+        Stop background maintenance, save a final snapshot and disconnect.
+        """
+        if self.refresher is not None:
+            self.refresher.stop()
+        if self.prober is not None:
+            self.prober.stop()
+        if self.snapshot_handle is not None:
+            self.snapshot_handle.cancel()
+            self.snapshot_handle = None
+            self.save_snapshot()
+        return super(Node, self).disconnect()
+
+    def read_snapshot(self):
+        """
+        Return the table id and entries of the routing table snapshot, or `(None, ())` if there isn't a usable one.
+        """
+        if self.snapshot_path is None or not os.path.exists(self.snapshot_path):
+            return None, ()
+        try:
+            return snapshot.load(self.snapshot_path)
+        except (OSError, snapshot.SnapshotError) as e:
+            self.logger.warning('Ignoring routing table snapshot {}: {}'.format(self.snapshot_path, e))
+            return None, ()
+
+    def save_snapshot(self):
+        """
+        Write a snapshot of the routing table to `snapshot_path`.
+        """
+        try:
+            snapshot.save(self.table, self.snapshot_path)
+        except OSError as e:
+            self.logger.warning('Failed to save routing table snapshot {}: {}'.format(self.snapshot_path, e))
+
+    def on_snapshot_interval(self):
+        """
+        Callback raised every `snapshot_interval` seconds to save a routing table snapshot.
+        """
+        self.save_snapshot()
+        self.snapshot_handle = self.loop.call_later(self.snapshot_interval, self.on_snapshot_interval)
+
+    @asyncio.coroutine
+    def verify_table(self, batch=DEFAULT_VERIFY_BATCH):
+        """
+        Ping every contact in the routing table, `batch` at a time, removing those that don't answer.
+        Returns the number of contacts removed.
+        """
+        nodes = [node_id for bucket in self.table for node_id in bucket.bucket]
+        removed = 0
+        for i in range(0, len(nodes), batch):
+            chunk = nodes[i:i + batch]
+            results = yield from asyncio.gather(*(self.ping(node_id) for node_id in chunk), loop=self.loop,
+                                                return_exceptions=True)
+            for node_id, result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    self.table.remove(node_id)
+                    removed += 1
+        self.logger.info('Verified {} restored contacts, removed {}'.format(len(nodes), removed))
+        return removed
+
+    @asyncio.coroutine
+    def hash_key(self, key):
+        """
+        Return the identifier for the given key. Large keys are hashed off the event loop when the protocol
+        has offloading enabled.
+        """
+        protocol = self.connection.protocol
+        if protocol is None or protocol.offload is None:
+            return Id.from_key(key)
+        return (yield from protocol.offload.run(len(key), Id.from_key, key))
+
     @rpc
     def ping(self, node_id):
         """
@@ -111,106 +234,53 @@ class Node(Server):
         except KeyError:
             return False, self.table.find_k_closest_nodes_triples(key, exclude=node_id)
 
-    def lookup_node(self, key):
+    @asyncio.coroutine
+    def bootstrap(self, seeds):
         """
-        Perform a node lookup.
-        """
-        def is_completed(future, results):
-            """
-            """
-            nodes = yield from future
-            return nodes
-
-        return self.lookup(key, self.find_node, is_completed)
+        Join the network through the given seed addresses and warm up the routing table.
 
-    def lookup_value(self, key):
-        """
-        Perform a value lookup.
-        """
-        def is_completed(future, results):
-            """
-            """
-            return (yield from future)
-
-        return self.lookup(key, self.find_value, is_completed)
-
-    def lookup(self, key, find, predicate):
-        """
-        Perform a node or value lookup in the network.
+        Seeds are pinged concurrently, then a lookup of our own id finds our neighbours. Finally every bucket
+        further away than our closest neighbour is refreshed with a lookup of a random id in its range, all in
+        parallel. Returns the number of seconds taken until the node was ready, which is also kept as `ready_time`.
 
-        TODO
+        :param seeds: Addresses of nodes already in the network.
         """
-        # Grab alpha of our k-closest nodes. If we don't know of any nodes, fail immediately.
-        closest = set(self.table.find_k_closest_nodes(key, k=self.alpha))
-        if not closest:
-            raise KeyError('Routing table is empty')
+        start = self.loop.time()
 
-       # k_closest = set()
-        queried = set()
+        results = yield from asyncio.gather(*(self.ping(seed) for seed in seeds), loop=self.loop,
+                                            return_exceptions=True)
+        if all(isinstance(r, Exception) for r in results):
+            raise KettleConnectionError('No seed nodes answered')
 
-        closest_node = None
+        yield from self.lookup_node(self.id)
 
-        for i in itertools.count():
+        nearest = self.table.nearest_index()
+        if nearest is not None:
+            refreshes = (self.lookup_node(self.table.random_id(i)) for i in range(nearest + 1, self.table.sz))
+            yield from asyncio.gather(*refreshes, loop=self.loop, return_exceptions=True)
 
-            remaining = closest - queried
-            if not remaining:
-                break
+        self.ready_time = self.loop.time() - start
+        self.logger.info('Bootstrapped in {:.3f}s with {} contacts'.format(self.ready_time, len(self.table)))
+        return self.ready_time
 
-            alpha_closest = None
-
-            for future in asyncio.as_completed((find(node, key) for node in alpha_closest), loop=self.loop):
-                try:
-                    completed, result = predicate(future, closest)
-                except Exception:
-                    pass
-                else:
-                    if completed:
-                        return result
-
-                    closest.add((Id.from_triple(n) for n in result))
-        else:
-            pass
-
-            #for future in asyncio.as_completed(())
-
-        # ...
-        # take alpha from closest and make RPC calls to them
-        # if we found the value, end quickly
-        #
-        #alpha_nodes = closest[:self.alpha]
-        #futures = (func(n, key) for n in alpha_nodes)
-
-            # result = yield from f
-            # futures2 = [func(n, key) for n in result]
-            # for f2 in asyncio.as_completed(futures2, loop=self.loop):
-            #     pass
-
-    def lookup2(self, key, func, nodes, visited, cb):
+    def lookup_node(self, key):
         """
-        TODO
+        Perform a node lookup; returns the `k` closest nodes to the key.
         """
-        for future in asyncio.as_completed((func(node, key) for node in nodes), loop=self.loop):
-            try:
-                completed, result = cb(future)
-                if completed:
-                    return result
-                return None
-            except Exception:
-                pass
-            #yield from (yield from future)
-            #return None
-            #result = yield from future
-            #yield result
+        return self.lookup(key, self.find_node)
 
+    def lookup_value(self, key):
+        """
+        Perform a value lookup; returns the value stored under the key or raises `KeyError`.
+        """
+        return self.lookup(key, self.find_value, value=True)
 
-    def lookup_nodes(self, key):
+    def lookup(self, key, find, value=False):
         """
-        TODO
+        Perform a node or value lookup in the network.
         """
-        # function which takes a list of nodes and async find_node or find_value's them
-        # if find_value and value found, done
-        # otherwise continue on
-        # if find_node, continue on
+        self.table.touch(key)
+        return Lookup(self, key, find, self.alpha, self.table.k, value).run()
 
 
 def main():
@@ -0,0 +1,101 @@
+"""
+    kettle.offload
+    ~~~~~~~~~~~~~~
+
+    Contains functionality for moving CPU-heavy work off of the event loop thread.
+"""
+__all__ = ['Offloader']
+
+
+import asyncio
+import collections
+import collections.abc
+
+from kettle.constants import DEFAULT_OFFLOAD_THRESHOLD
+
+
+class Offloader:
+    """
+    Runs work whose input is at least `threshold` bytes in an executor and everything smaller inline.
+
+    The executor may be a thread or process pool; when `None` the event loop's default executor is used. Work sent
+    to a process pool must be picklable, which holds for the codecs and :meth:`~kettle.id.Id.from_key`.
+    """
+
+    def __init__(self, loop, executor=None, threshold=DEFAULT_OFFLOAD_THRESHOLD):
+        self.loop = loop
+        self.executor = executor
+        self.threshold = threshold
+        self.pending = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.counters = collections.Counter()
+
+    def __repr__(self):
+        return '<{}(threshold={}, pending={}, executor={})>'.format(self.__class__.__name__, self.threshold,
+                                                                    self.pending, self.executor)
+
+    def should_offload(self, size):
+        """
+        Return `True` if work on an input of `size` bytes should run in the executor.
+        """
+        return size >= self.threshold
+
+    def record_inline(self):
+        """
+        Count work that a caller ran inline after :meth:`should_offload` returned `False`.
+        """
+        self.counters['inline'] += 1
+
+    def estimate(self, obj, depth=3):
+        """
+        Cheaply estimate the encoded size of an object by adding up the lengths of the strings and bytes it holds.
+        """
+        if isinstance(obj, (str, bytes, bytearray)):
+            return len(obj)
+        if depth <= 0:
+            return 0
+        if isinstance(obj, collections.abc.Mapping):
+            return sum(self.estimate(v, depth - 1) for v in obj.values())
+        if isinstance(obj, (list, tuple)):
+            return sum(self.estimate(v, depth - 1) for v in obj)
+        return 0
+
+    def submit(self, func, *args):
+        """
+        Run `func` in the executor and return a future for its result.
+        """
+        start = self.loop.time()
+        self.pending += 1
+        self.counters['offloaded'] += 1
+        future = self.loop.run_in_executor(self.executor, func, *args)
+        future.add_done_callback(lambda f: self.on_done(start))
+        return future
+
+    def on_done(self, start):
+        """
+        Callback raised when offloaded work completes.
+        """
+        latency = self.loop.time() - start
+        self.pending -= 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    @asyncio.coroutine
+    def run(self, size, func, *args):
+        """
+        Run `func` inline if `size` is below the threshold, otherwise in the executor.
+        """
+        if not self.should_offload(size):
+            self.record_inline()
+            return func(*args)
+        return (yield from self.submit(func, *args))
+
+    def stats(self):
+        """
+        Return a dictionary of executor queue depth, latency and inline/offloaded counts.
+        """
+        offloaded = self.counters['offloaded']
+        completed = offloaded - self.pending
+        return dict(pending=self.pending, inline=self.counters['inline'], offloaded=offloaded,
+                    latency_avg=self.latency_total / completed if completed else 0.0, latency_max=self.latency_max)
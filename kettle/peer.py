@@ -7,18 +7,149 @@
 __all__ = ['Client']
 
 
+import asyncio
+import functools
+import itertools
+import random
+
 from kettle import get_event_loop
+from kettle.breaker import CircuitBreaker
 from kettle.connection import Endpoint, ClientConnection
+from kettle.constants import ALPHA, K, DEFAULT_MAX_PEER_REQUESTS, DEFAULT_REJECT_RETRIES, DEFAULT_REJECT_BACKOFF
+from kettle.exceptions import KettleRpcRejected
+from kettle.id import NodeId
+from kettle.lookup import Lookup
 from kettle.node import Node
+from kettle.routing import RoutingTable
 
 
 class Client(Endpoint):
     """
+    Represents a consumer of the network.
+
+    Clients read and write values without participating: they talk to any number of nodes over one unconnected
+    socket, never serve requests and never announce an id, so they are not added to other nodes' routing tables.
+    Each client keeps its own table of contacts it has heard from to start lookups with.
 
+    Operations run concurrently without a limit of their own; instead at most `max_peer_requests` requests are in
+    flight to any one node, so a node the client talks to a lot queues the client's requests before their timeout
+    starts. Requests rejected by an overloaded node are retried `retries` times, backing off exponentially from
+    `backoff` seconds.
     """
 
     connection_factory = ClientConnection
 
+    #:
+    breaker_factory = CircuitBreaker
+
+    #: :class:`~kettle.tracing.Tracer` recording a sample of lookups; disabled when `None`.
+    tracer = None
+
+    ping = Node.ping
+    store = Node.store
+    find_node = Node.find_node
+    find_value = Node.find_value
+    hash_key = Node.hash_key
+
+    def __init__(self, address=('0.0.0.0', 0), loop=None, alpha=None, k=None,
+                 max_peer_requests=DEFAULT_MAX_PEER_REQUESTS, retries=DEFAULT_REJECT_RETRIES,
+                 backoff=DEFAULT_REJECT_BACKOFF):
+        super(Client, self).__init__(address, loop)
+        self.node_id = NodeId(address)
+        self.table = RoutingTable(self, k or K)
+        self.alpha = alpha or ALPHA
+        self.max_peer_requests = max_peer_requests
+        self.retries = retries
+        self.backoff = backoff
+        self.peers = {}
+        self.breaker = self.breaker_factory() if self.breaker_factory else None
+
+    @property
+    def id(self):
+        """
+        Clients don't announce an id to the network.
+        """
+        return None
+
+    @asyncio.coroutine
+    def bootstrap(self, seeds):
+        """
+        Ping the given seed addresses concurrently to fill the contact table. Returns the number that answered.
+        """
+        results = yield from asyncio.gather(*(self.ping(seed) for seed in seeds), loop=self.loop,
+                                            return_exceptions=True)
+        return sum(1 for r in results if not isinstance(r, Exception))
+
+    @asyncio.coroutine
+    def call(self, rpc, node, *args, span=None):
+        """
+        Send a request for the given rpc to a node once fewer than `max_peer_requests` are in flight to it,
+        retrying with exponential backoff while the node rejects it.
+        """
+        address = node.address if isinstance(node, NodeId) else node
+        peer = self.peers.get(address)
+        if peer is None:
+            # Per node: the semaphore and the number of requests waiting for or holding it.
+            peer = self.peers[address] = [asyncio.Semaphore(self.max_peer_requests, loop=self.loop), 0]
+        peer[1] += 1
+        try:
+            for attempt in itertools.count():
+                yield from peer[0].acquire()
+                try:
+                    return (yield from rpc(node, *args, span=span))
+                except KettleRpcRejected:
+                    if attempt >= self.retries:
+                        raise
+                finally:
+                    peer[0].release()
+                delay = self.backoff * 2 ** attempt
+                yield from asyncio.sleep(random.uniform(delay / 2, delay), loop=self.loop)
+        finally:
+            peer[1] -= 1
+            if not peer[1]:
+                del self.peers[address]
+
+    @asyncio.coroutine
+    def get(self, key):
+        """
+        Return the value stored in the network under the given key; raises `KeyError` if no node has it.
+        """
+        key_id = yield from self.hash_key(key)
+        find = functools.partial(self.call, self.find_value)
+        return (yield from Lookup(self, key_id, find, self.alpha, self.table.k, value=True).run())
+
+    @asyncio.coroutine
+    def put(self, key, value):
+        """
+        Store the value under the given key on the `k` closest nodes. Returns the number of nodes that stored it.
+        """
+        key_id = yield from self.hash_key(key)
+        find = functools.partial(self.call, self.find_node)
+        nodes = yield from Lookup(self, key_id, find, self.alpha, self.table.k).run()
+        results = yield from asyncio.gather(*(self.call(self.store, node, key_id, value) for node in nodes),
+                                            loop=self.loop, return_exceptions=True)
+        return sum(1 for r in results if r is True)
+
+    @asyncio.coroutine
+    def get_many(self, keys):
+        """
+        Get many keys concurrently. Returns a dictionary of the keys that were found and their values.
+        """
+        keys = list(keys)
+        results = yield from asyncio.gather(*(self.get(key) for key in keys), loop=self.loop,
+                                            return_exceptions=True)
+        return dict((k, v) for k, v in zip(keys, results) if not isinstance(v, Exception))
+
+    @asyncio.coroutine
+    def put_many(self, items):
+        """
+        Put many key/value pairs concurrently. Returns a dictionary of each key and the number of nodes storing it.
+        """
+        items = list(items.items() if hasattr(items, 'items') else items)
+        results = yield from asyncio.gather(*(self.put(k, v) for k, v in items), loop=self.loop,
+                                            return_exceptions=True)
+        return dict((k, 0 if isinstance(r, Exception) else r) for (k, v), r in zip(items, results))
+
 
 def main():
     import logging
@@ -30,4 +161,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
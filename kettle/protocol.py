@@ -4,16 +4,20 @@
 
     Contains the Kademlia DHT protocol.
 """
-__all__ = ['Protocol', 'ClientProtocol', 'ServerProtocol', 'rpc']
+__all__ = ['Protocol', 'ClientProtocol', 'ServerProtocol', 'MultiplexProtocol', 'rpc']
 
 
 import asyncio
 import functools
 
+from kettle.admission import AdmissionController
+from kettle.batching import OutboundQueue
 from kettle.codec import CodecError, JSONCodec
+from kettle.congestion import CongestionController
 from kettle.constants import DEFAULT_REQUEST_TIMEOUT
-from kettle.exceptions import KettleRpcTimeout
-from kettle.id import Id
+from kettle.exceptions import KettleRpcRejected, KettleRpcTimeout, KettleRpcUnavailable
+from kettle.hooks import Hookable
+from kettle.id import NodeId
 from kettle.message import Message, KettleMessageFormatError, MessageType
 
 
@@ -23,40 +27,125 @@ def rpc(func):
     """
     @asyncio.coroutine
     @functools.wraps(func)
-    def local(self, address, *args, timeout=None):
+    def local(self, address, *args, timeout=None, span=None):
         """
         Local @rpc handler for sending RPC request to a remote node.
+
+        The remote node may be given as an address or a :class:`~kettle.id.NodeId`. Requests to a node id
+        are tagged with it so the remote side can route them when many nodes share one socket. When a
+        :class:`~kettle.tracing.Span` is given, it is finished with the request's peer, round trip and outcome.
         """
         # Build and send request for rpc call to a remote node.
-        msg = Message.request(self.id, self.address, func.__name__, args)
+        node, target = None, None
+        if isinstance(address, NodeId):
+            node, target, address = address, address.id, address.address
+        msg = Message.request(self.id, self.address, func.__name__, args, target)
+
+        if span is not None:
+            span.update(rpc=func.__name__, peer='{}:{}'.format(*address))
+
+        # Fail fast if the remote node has recently been unreachable; no request is sent, so none is timed.
+        breaker = self.breaker
+        if breaker is not None:
+            token = breaker.allow(address)
+            if not token:
+                if span is not None:
+                    span.finish(KettleRpcUnavailable.__name__)
+                raise KettleRpcUnavailable('Circuit open for {}:{}'.format(*address))
+
+        hook = self.hook_rpc
+        if hook is not None:
+            start = self.hook_clock()
 
         # Wait for future to return result of rpc call on remote node.
-        response = yield from self.connection.send_request(msg, address, timeout=timeout)
+        try:
+            response = yield from self.connection.send_request(msg, address, timeout=timeout)
+        except Exception as e:
+            if hook is not None:
+                hook('rpc', func.__name__, start, self.hook_clock(), None)
+            if span is not None:
+                span.finish(e.__class__.__name__)
+            if breaker is not None:
+                # A node that rejects a request because it is overloaded is still reachable.
+                if isinstance(e, KettleRpcRejected):
+                    breaker.record_success(address)
+                # Evict the remote node from the routing table once it is considered unreachable.
+                elif isinstance(e, KettleRpcTimeout) and breaker.record_failure(address, token):
+                    self.logger.event('circuit_open', peer=address)
+                    self.connection.fail_requests(address,
+                                                  KettleRpcUnavailable('Circuit open for {}:{}'.format(*address)))
+                    if node is not None:
+                        self.table.remove(node)
+            raise
+        finally:
+            # Let a half-open circuit try again whatever became of its trial request, even if it was cancelled.
+            if breaker is not None:
+                breaker.release(address, token)
+
+        if hook is not None:
+            hook('rpc', func.__name__, start, self.hook_clock(), None)
+        if span is not None:
+            span.finish()
+        if breaker is not None:
+            breaker.record_success(address)
 
         # Update routing table with id/address of remote node.
-        node_id = Id(response.address, response.node_id)
+        node_id = NodeId(response.address, response.node_id)
         self.table.update(node_id)
 
         return response.payload
 
-    @asyncio.coroutine
-    @functools.wraps(func)
-    def remote(self, msg, address):
+    def respond(self, msg, address, result):
         """
-        Remote @rpc handler for receiving RPC request and returning response to caller.
+        Build and send response message containing the rpc payload result.
         """
-        # Create identifier for request node.
-        node_id = Id(msg.address, msg.node_id)
-        try:
-            # Call decorated func to generate rpc payload result.
-            result = func(self, node_id, *msg.payload)
+        response = Message.response(self.id, self.address, msg.rpc, msg.rpc_id, result)
+        self.connection.send_response(response, address)
 
-            # Build and send response message containing result.
-            response = Message.response(self.id, self.address, msg.rpc, msg.rpc_id, result)
-            self.connection.send_response(response, address)
-        finally:
-            # Update routing table with latest info from request node.
-            self.table.update(node_id)
+    if asyncio.iscoroutinefunction(func):
+        @asyncio.coroutine
+        @functools.wraps(func)
+        def remote(self, msg, address):
+            """
+            Remote @rpc handler for receiving RPC request and returning response to caller.
+            """
+            # Create identifier for request node; clients send no id and are never added to the table.
+            node_id = NodeId(msg.address, msg.node_id) if msg.node_id is not None else None
+            hook = self.hook_rpc_remote
+            if hook is not None:
+                start = self.hook_clock()
+            try:
+                # Wait for decorated func to generate rpc payload result.
+                result = yield from func(self, node_id, *msg.payload)
+                respond(self, msg, address, result)
+            finally:
+                # Update routing table with latest info from request node.
+                if node_id is not None:
+                    self.table.update(node_id)
+                if hook is not None:
+                    hook('rpc_remote', msg.rpc, start, self.hook_clock(), None)
+    else:
+        @functools.wraps(func)
+        def remote(self, msg, address):
+            """
+            Remote @rpc handler for receiving RPC request and returning response to caller. The decorated
+            func never waits, so the response is sent inline without scheduling a task.
+            """
+            # Create identifier for request node; clients send no id and are never added to the table.
+            node_id = NodeId(msg.address, msg.node_id) if msg.node_id is not None else None
+            hook = self.hook_rpc_remote
+            if hook is not None:
+                start = self.hook_clock()
+            try:
+                # Call decorated func to generate rpc payload result.
+                result = func(self, node_id, *msg.payload)
+                respond(self, msg, address, result)
+            finally:
+                # Update routing table with latest info from request node.
+                if node_id is not None:
+                    self.table.update(node_id)
+                if hook is not None:
+                    hook('rpc_remote', msg.rpc, start, self.hook_clock(), None)
 
     local.__remote__ = remote
     return local
@@ -76,29 +165,61 @@ def msg(message_type):
     return decorator
 
 
+@functools.lru_cache(maxsize=None)
+def get_class_handlers(cls):
+    """
+    Get mapping of all incoming message request handler functions defined on a protocol class.
+    """
+    return dict(((h.__handler__.name, a)
+                 for a, h in ((a, getattr(cls, a)) for a in dir(cls)) if hasattr(h, '__handler__')))
+
+
 def get_handlers(protocol):
     """
     Get mapping of all incoming message request handlers for a protocol instance.
+
+    The handlers are found once per class and bound to each instance, rather than walking `dir()` of every
+    new protocol.
     """
-    return dict(((h.__handler__.name, h)
-                 for h in (getattr(protocol, a)
-                           for a in dir(protocol)) if hasattr(h, '__handler__')))
+    return dict((name, getattr(protocol, a)) for name, a in get_class_handlers(type(protocol)).items())
 
 
-def get_remotes(endpoint):
+@functools.lru_cache(maxsize=None)
+def get_remotes(cls):
     """
-    Get mapping of all @rpc decorated functions on an endpoint that are exposed.
+    Get mapping of all @rpc decorated functions on an endpoint class that are exposed.
+
+    The mapping is built once per class and shared by every protocol serving an endpoint of that class, so
+    it must not be modified.
     """
     return dict(((h.__remote__.__name__, h.__remote__)
-                 for h in (getattr(endpoint, a)
-                           for a in dir(endpoint)) if hasattr(h, '__remote__')))
+                 for h in (getattr(cls, a)
+                           for a in dir(cls)) if hasattr(h, '__remote__')))
 
 
-class Protocol(asyncio.DatagramProtocol):
+class Protocol(Hookable, asyncio.DatagramProtocol):
     """
     Protocol for sending/receiving requests to other nodes in a Kademlia DHT network.
     """
 
+    #: Stages that can be timed with :meth:`~kettle.hooks.Hookable.add_hook`.
+    hook_points = ('datagram_received', 'decode', 'on_message_request', 'send_message', 'encode')
+
+    #:
+    hook_datagram_received = None
+
+    #:
+    hook_decode = None
+
+    #:
+    hook_on_message_request = None
+
+    #:
+    hook_send_message = None
+
+    #:
+    hook_encode = None
+
     #:
     codec_factory = JSONCodec
 
@@ -111,6 +232,30 @@ class Protocol(asyncio.DatagramProtocol):
     #:
     default_request_timeout_exception = KettleRpcTimeout
 
+    #:
+    congestion_factory = CongestionController
+
+    #:
+    admission_factory = AdmissionController
+
+    #:
+    outbound_queue_factory = OutboundQueue
+
+    #: Gather outbound datagrams and send them in batches once per loop iteration.
+    batch_sends = False
+
+    #: Factory for an :class:`~kettle.offload.Offloader` to move large encode/decode work off the loop.
+    offload_factory = None
+
+    #: Factory for a :class:`~kettle.metrics.ProtocolMetrics` to collect metrics; disabled when `None`.
+    metrics_factory = None
+
+    #: Fraction of shed requests logged as structured events.
+    shed_event_sample = 0.01
+
+    #: :class:`~kettle.capture.CaptureWriter` recording every datagram received and sent; disabled when `None`.
+    capture = None
+
     #:
     inbound_message_factory = None
 
@@ -122,16 +267,27 @@ class Protocol(asyncio.DatagramProtocol):
         self.loop = loop
         self.codec = self.codec_factory()
         self.transport = None
+        self.outbound = None
         self.error_count = 0
+        self.late_count = 0
         self.futures = {}
-        self.remotes = get_remotes(endpoint)
+        self.requests = {}
+        self.queued = {}
+        self.congestion = self.congestion_factory() if self.congestion_factory else None
+        self.admission = self.admission_factory() if self.admission_factory else None
+        self.offload = self.offload_factory(loop) if self.offload_factory else None
+        self.draining = False
+        self.remotes = get_remotes(type(endpoint))
         self.handlers = get_handlers(self)
+        self.metrics = self.metrics_factory(self) if self.metrics_factory else None
 
     def connection_made(self, transport):
         """
         Callback raised by asyncio protocol when connected.
         """
         self.transport = transport
+        if self.batch_sends:
+            self.outbound = self.outbound_queue_factory(transport, self.loop)
         self.loop.create_task(self.on_connect(transport))
 
     def connection_lost(self, exc):
@@ -139,6 +295,7 @@ class Protocol(asyncio.DatagramProtocol):
         Callback raised by asyncio protocol when disconnected.
         """
         self.transport = None
+        self.outbound = None
         self.error_count = 0
         self.loop.create_task(self.on_disconnect(exc))
 
@@ -146,57 +303,271 @@ class Protocol(asyncio.DatagramProtocol):
         """
         Callback raised by asyncio protocol when UDP datagram is received.
         """
+        if self.capture is not None:
+            self.capture.inbound(data, address)
+
+        hook = self.hook_datagram_received
+        if hook is not None:
+            start = self.hook_clock()
+
         try:
-            data = self.codec.decode(data)
+            # Decode large datagrams in the executor so they don't stall every other message.
+            if self.offload is not None:
+                if self.offload.should_offload(len(data)):
+                    future = self.offload.submit(self.codec.decode, data)
+                    future.add_done_callback(functools.partial(self.on_datagram_decoded, address))
+                    return
+                self.offload.record_inline()
+
+            decode_hook = self.hook_decode
+            if decode_hook is not None:
+                decode_start = self.hook_clock()
+            try:
+                decoded = self.codec.decode(data)
+            except CodecError as e:
+                if self.metrics is not None:
+                    self.metrics.error('decode')
+                self.endpoint.logger.warning('Invalid incoming data encoding: {} from {}:{}'.format(e, *address))
+            else:
+                if decode_hook is not None:
+                    decode_hook('decode', None, decode_start, self.hook_clock(), len(data))
+                self.datagram_decoded(decoded, address)
+        finally:
+            if hook is not None:
+                hook('datagram_received', None, start, self.hook_clock(), len(data))
+
+    def on_datagram_decoded(self, address, future):
+        """
+        Callback raised when a datagram decoded in the executor is ready.
+        """
+        try:
+            data = future.result()
         except CodecError as e:
+            if self.metrics is not None:
+                self.metrics.error('decode')
             self.endpoint.logger.warning('Invalid incoming data encoding: {} from {}:{}'.format(e, *address))
         else:
-            try:
-                message = self.message_factory.from_dict(data)
-            except KettleMessageFormatError as e:
-                self.endpoint.logger.warning('Invalid incoming message: {} from {}:{}'.format(e, *address))
+            self.datagram_decoded(data, address)
+
+    def datagram_decoded(self, data, address):
+        """
+        Build a message from decoded datagram data and dispatch it.
+        """
+        try:
+            message = self.message_factory.from_dict(data)
+        except KettleMessageFormatError as e:
+            if self.metrics is not None:
+                self.metrics.error('message')
+            self.endpoint.logger.warning('Invalid incoming message: {} from {}:{}'.format(e, *address))
+        else:
+            if self.metrics is not None:
+                self.metrics.message(message.type, message.rpc, 'inbound')
+            if self.admission is not None and message.type == MessageType.request.name:
+                self.admit_request(message, address)
             else:
-                self.loop.create_task(self.on_message(message, address))
+                self.on_message(message, address)
+
+    def admit_request(self, message, address):
+        """
+        Pass an inbound request through admission control, shedding it if the node is overloaded.
+
+        Admitted requests are handled immediately unless a backlog is already waiting to be drained. The
+        backlog is drained on a later loop iteration, after any responses that have already arrived, so
+        replies to our own requests are never stuck behind a flood of new work.
+        """
+        reason = self.admission.admit(message, address)
+        if reason is not None:
+            self.shed_request(message, address, reason)
+        elif not self.draining:
+            self.drain_requests()
+
+    def drain_requests(self):
+        """
+        Start handling queued inbound requests up to the admission controller concurrency limit.
+        """
+        self.draining = False
+        while True:
+            item = self.admission.next()
+            if item is None:
+                break
+            task = self.on_message(*item)
+            if task is None:
+                self.admission.done()
+            else:
+                task.add_done_callback(self.on_request_done)
+
+    def on_request_done(self, task):
+        """
+        Callback raised when an admitted inbound request handled by a task has finished.
+        """
+        self.admission.done()
+        if self.admission.pending and not self.draining:
+            self.draining = True
+            self.loop.call_soon(self.drain_requests)
+
+    def shed_request(self, message, address, reason):
+        """
+        Reject an inbound request that failed admission with a cheap error reply, or drop it silently.
+        """
+        self.endpoint.logger.event('request_shed', sample=self.shed_event_sample, rpc=message.rpc, reason=reason,
+                                   peer=address)
+        if self.admission.reply:
+            error = self.message_factory.error(self.endpoint.id, self.endpoint.address, message.rpc,
+                                               message.rpc_id, [reason])
+            self.send_message(error, address)
 
     def error_received(self, exc):
         """
         Callback raised by asyncio protocol when datagram received causes an error.
         """
         self.error_count += 1
+        if self.metrics is not None:
+            self.metrics.error('socket')
         self.loop.create_task(self.on_error(exc))
 
     def send_message(self, msg, address):
         """
         Send an arbitrary message object to the given address.
         """
-        if self.transport:
+        if not self.transport:
+            return
+
+        hook = self.hook_send_message
+        if hook is not None:
+            start, rpc = self.hook_clock(), msg.rpc
+        data = None
+
+        try:
+            if self.metrics is not None:
+                self.metrics.message(msg.type, msg.rpc, 'outbound')
             try:
                 msg = self.message_factory.to_dict(msg)
             except KettleMessageFormatError as e:
                 self.endpoint.logger.warning('Invalid outgoing message data: {} to {}:{}'.format(e, *address))
+                return
+
+            # Encode messages carrying large values in the executor and send them once ready.
+            if self.offload is not None:
+                if self.offload.should_offload(self.offload.estimate(msg)):
+                    future = self.offload.submit(self.codec.encode, msg)
+                    future.add_done_callback(functools.partial(self.on_message_encoded, address))
+                    return
+                self.offload.record_inline()
+
+            encode_hook = self.hook_encode
+            if encode_hook is not None:
+                encode_start = self.hook_clock()
+            try:
+                data = self.codec.encode(msg)
+            except CodecError as e:
+                if self.metrics is not None:
+                    self.metrics.error('encode')
+                self.endpoint.logger.warning('Invalid outgoing data encoding: {} to {}:{}'.format(e, *address))
             else:
-                try:
-                    data = self.codec.encode(msg)
-                except CodecError as e:
-                    self.endpoint.logger.warning('Invalid outgoing data encoding: {} to {}:{}'.format(e, *address))
-                else:
-                    self.transport.sendto(data, address)
+                if encode_hook is not None:
+                    encode_hook('encode', None, encode_start, self.hook_clock(), len(data))
+                self.send_datagram(data, address)
+        finally:
+            if hook is not None:
+                hook('send_message', rpc, start, self.hook_clock(), len(data) if data is not None else None)
+
+    def on_message_encoded(self, address, future):
+        """
+        Callback raised when a message encoded in the executor is ready to send.
+        """
+        try:
+            data = future.result()
+        except CodecError as e:
+            self.endpoint.logger.warning('Invalid outgoing data encoding: {} to {}:{}'.format(e, *address))
+        else:
+            self.send_datagram(data, address)
+
+    def send_datagram(self, data, address):
+        """
+        Send encoded data to the given address, through the outbound queue when batching is enabled.
+        """
+        if self.capture is not None:
+            self.capture.outbound(data, address)
+        if self.outbound is not None:
+            self.outbound.append(data, address)
+        elif self.transport:
+            self.transport.sendto(data, address)
 
     def send_request(self, request, address, timeout=None, exception=None):
         """
         Send an RPC request to the given node address.
+
+        Requests are handed to the congestion controller, which may hold them back until the destination
+        has room in its in-flight window. The timeout starts now, so it bounds the time spent waiting in
+        that queue as well as the round trip.
         """
         # Build future to track this RPC request.
         timeout = timeout or self.default_request_timeout
         future = self.futures[request.rpc_id] = asyncio.Future(loop=self.loop)
 
         # Register callback to handle request timeouts.
-        self.loop.call_later(timeout, self.on_send_request_timeout, request.rpc_id, exception)
+        handle = self.loop.call_later(timeout, self.on_send_request_timeout, request.rpc_id, exception)
+        self.requests[request.rpc_id] = (address, handle)
 
-        # Send request to remote node.
-        self.send_message(request, address)
+        # Send request to remote node now or once the congestion window opens.
+        send = functools.partial(self.dispatch_request, request, address)
+        if self.congestion is None:
+            send()
+        else:
+            self.queued[request.rpc_id] = send
+            self.congestion.submit(address, send)
         return future
 
+    def dispatch_request(self, request, address):
+        """
+        Transmit an RPC request. Returns `False` if the caller abandoned the request while it was waiting
+        to be sent.
+        """
+        self.queued.pop(request.rpc_id, None)
+        future = self.futures.get(request.rpc_id)
+        if future is None or future.done():
+            self.futures.pop(request.rpc_id, None)
+            address, handle = self.requests.pop(request.rpc_id, (None, None))
+            if handle is not None:
+                handle.cancel()
+            return False
+
+        if self.metrics is not None:
+            self.metrics.request_sent(request)
+
+        self.send_message(request, address)
+        return True
+
+    def release_request(self, request_id, success=True, rejected=False):
+        """
+        Stop tracking an RPC request. A request that was sent gives its slot back to the congestion
+        controller; one still waiting to be sent is taken out of its queue.
+        """
+        try:
+            address, handle = self.requests.pop(request_id)
+        except KeyError:
+            return
+
+        handle.cancel()
+        send = self.queued.pop(request_id, None)
+        if self.congestion is None:
+            return
+        if send is not None:
+            self.congestion.discard(address, send)
+        else:
+            self.congestion.release(address, success, rejected)
+
+    def fail_requests(self, address, exception):
+        """
+        Fail every request to the given address that is still waiting to be sent, e.g. once the address is
+        known to be unreachable.
+        """
+        for request_id in [i for i in self.queued if self.requests[i][0] == address]:
+            future = self.futures.pop(request_id, None)
+            self.release_request(request_id, success=False)
+            if future is not None and not future.done():
+                future.set_exception(exception)
+
     def send_response(self, response, address):
         """
         Send an RPC response to the given node address.
@@ -209,13 +580,37 @@ class Protocol(asyncio.DatagramProtocol):
         it means that no response has been received and we should raise some sort of notification to the caller.
         """
         future = self.futures.pop(request_id, None)
-        if future:
+        self.release_request(request_id, success=False)
+        if self.metrics is not None:
+            self.metrics.request_done(request_id, 'timeout')
+        if future and not future.done():
             future.set_exception(exception or self.default_request_timeout_exception)
 
+    def stats(self):
+        """
+        Return a dictionary snapshot of protocol counters, including admission and congestion control. `late`
+        counts responses that arrived after their request had timed out.
+        """
+        stats = dict(errors=self.error_count, late=self.late_count, futures=len(self.futures),
+                     requests=len(self.requests))
+        if self.admission is not None:
+            stats.update(self.admission.counters)
+            stats.update(pending=len(self.admission.pending), active=self.admission.active)
+        if self.congestion is not None:
+            stats.update(queued=self.congestion.queued, timeouts=self.congestion.timeouts,
+                         rejections=self.congestion.rejections)
+        if self.offload is not None:
+            stats.update(('offload_' + k, v) for k, v in self.offload.stats().items())
+        return stats
+
     def close(self):
         """
         Close the protocol.
         """
+        if self.outbound is not None:
+            self.outbound.flush()
+        if self.metrics is not None:
+            self.metrics.close()
         if self.transport:
             self.transport.close()
 
@@ -241,21 +636,36 @@ class Protocol(asyncio.DatagramProtocol):
         """
         self.endpoint.logger.warning('Previous message could not be delivered! {}'.format(exc))
 
-    @asyncio.coroutine
     def on_message(self, msg, address):
         """
         Callback raised when a valid message is received.
+
+        Handlers that never wait run inline. Handlers that return a coroutine are scheduled as a task, which
+        is returned to the caller; otherwise `None` is returned.
         """
         try:
             handler = self.handlers[msg.type]
         except KeyError:
             self.endpoint.logger.warning('Invalid incoming message type: {} from {}:{}'.format(msg.type, *address))
-        else:
-            yield from handler(msg, address)
+            return None
+
+        try:
+            result = handler(msg, address)
+        except Exception as e:
+            self.endpoint.logger.exception('Failed to handle message: {} from {}:{}'.format(e, *address))
+            return None
 
+        if asyncio.iscoroutine(result):
+            return self.loop.create_task(result)
+        return None
+
+    def resolve_endpoint(self, message):
+        """
+        Return the endpoint that should handle the given inbound request, or `None` if no endpoint should.
+        """
+        return self.endpoint
 
     @msg(MessageType.request)
-    @asyncio.coroutine
     def on_message_request(self, message, address):
         """
         Callback raised when a valid request message is received.
@@ -263,24 +673,59 @@ class Protocol(asyncio.DatagramProtocol):
         try:
             remote = self.remotes[message.rpc]
         except KeyError:
-            self.endpoint.logger.warning('Invalid request rpc type: {} from {}:{}'.format(message.func, *address))
+            self.endpoint.logger.warning('Invalid request rpc type: {} from {}:{}'.format(message.rpc, *address))
         else:
-            yield from remote(self.endpoint, message, address)
+            endpoint = self.resolve_endpoint(message)
+            if endpoint is None:
+                if self.metrics is not None:
+                    self.metrics.error('target')
+                self.endpoint.logger.warning('Invalid request target: {} from {}:{}'.format(message.target, *address))
+                return None
+
+            hook = self.hook_on_message_request
+            if hook is None:
+                return remote(endpoint, message, address)
+
+            start = self.hook_clock()
+            try:
+                return remote(endpoint, message, address)
+            finally:
+                hook('on_message_request', message.rpc, start, self.hook_clock(), None)
 
     @msg(MessageType.response)
-    @asyncio.coroutine
     def on_message_response(self, message, address):
         """
         Callback raised when a valid response message is received.
         """
         try:
-            future = self.futures[message.rpc_id]
+            future = self.futures.pop(message.rpc_id)
         except KeyError:
+            self.late_count += 1
             self.endpoint.logger.warning('Invalid response message id: {} from {}:{}'.format(message.rpc_id, *address))
         else:
-            if not future.cancelled():
+            self.release_request(message.rpc_id, success=True)
+            if self.metrics is not None:
+                self.metrics.request_done(message.rpc_id, 'ok')
+            if not future.done():
                 future.set_result(message)
 
+    @msg(MessageType.error)
+    def on_message_error(self, message, address):
+        """
+        Callback raised when a remote node rejects one of our requests.
+        """
+        try:
+            future = self.futures.pop(message.rpc_id)
+        except KeyError:
+            self.endpoint.logger.warning('Invalid error message id: {} from {}:{}'.format(message.rpc_id, *address))
+        else:
+            # A rejection means the remote node is overloaded; back off, but don't count it as loss.
+            self.release_request(message.rpc_id, success=False, rejected=True)
+            if self.metrics is not None:
+                self.metrics.request_done(message.rpc_id, 'rejected')
+            if not future.done():
+                future.set_exception(KettleRpcRejected(*message.payload))
+
 
 class ServerProtocol(Protocol):
     """
@@ -289,5 +734,34 @@ class ServerProtocol(Protocol):
 
 class ClientProtocol(Protocol):
     """
+    Protocol for endpoints that query the network without serving requests.
     """
 
+    admission_factory = None
+
+    @msg(MessageType.request)
+    def on_message_request(self, message, address):
+        """
+        Callback raised when a request message is received; clients don't serve requests so it is dropped.
+        """
+        self.endpoint.logger.debug('Ignoring request rpc: %s from %s:%s', message.rpc, *address)
+
+
+class MultiplexProtocol(ServerProtocol):
+    """
+    Server protocol shared by many endpoints of the same type on a single socket.
+
+    Inbound requests are routed to the endpoint whose node id matches the request target. Requests without a
+    target, from clients or peers addressing the socket, are handled by the default endpoint; requests for a node
+    that isn't hosted here are dropped rather than answered under another node's id. Responses are matched to
+    requests by rpc id, so every endpoint shares the same request futures, congestion and admission control.
+    """
+
+    def __init__(self, endpoint=None, loop=None):
+        super(MultiplexProtocol, self).__init__(endpoint, loop)
+        self.endpoints = {}
+
+    def resolve_endpoint(self, message):
+        if message.target is None:
+            return self.endpoint
+        return self.endpoints.get(message.target)
@@ -8,9 +8,11 @@ __all__ = ['KBucket', 'RoutingTable']
 
 
 import itertools
+import random
+import time
 
 from kettle.constants import K, HASH_LENGTH
-from kettle.log import LOGGER
+from kettle.log import ClassLogger
 
 
 class KBucket:
@@ -18,12 +20,15 @@ class KBucket:
     Represents a bucket (and cache) for a nodes with a distance of 2^i to 2^i+1. Buckets store node
     contact information with least-recently seen at the head and most-recently seen at the tail.
     """
+
+    logger = ClassLogger()
+
     def __init__(self, i, k=K):
         self.i = i
         self.k = k
         self.bucket = []
         self.cache = []
-        self.logger = LOGGER.child(self)
+        self.last_touched = time.monotonic()
 
     def __repr__(self):
         return '<KBucket(i={0}, k={1}, bucket=({2},{1}), cache=({3},{1}))>'.format(self.k, len(self.bucket),
@@ -38,6 +43,18 @@ class KBucket:
     def __len__(self):
         return len(self.bucket) + len(self.cache)
 
+    def touch(self):
+        """
+        Mark the bucket as recently active so it isn't refreshed.
+        """
+        self.last_touched = time.monotonic()
+
+    def is_stale(self, age, now=None):
+        """
+        Return `True` if the bucket hasn't been touched in the last `age` seconds.
+        """
+        return (now or time.monotonic()) - self.last_touched >= age
+
     def ordered(self):
         """
         Return iterable that yields back bucket nodes in most-recently seen order.
@@ -70,29 +87,34 @@ class KBucket:
 
     def update(self, node):
         """
-        Update the k-bucket with the given node.
+        Update the k-bucket with the given node. Returns `True` if the node is in the bucket afterwards and
+        `False` if the bucket is full and it was cached or ignored.
 
         :param node: Node to update in bucket.
         """
+        self.last_touched = time.monotonic()
+
         # If this node is already in our bucket and cache, remove it and re-add it so we maintain
         # the most-recently seen ordering of the bucket and cache.
         if node in self:
-            self.logger.debug('Updating existing node {} in bucket {}'.format(node, self.i))
+            self.logger.debug('Updating existing node %s in bucket %s', node, self.i)
             self.remove(node, False)
 
         # If the bucket is full, try and add the node to the cache if it isn't also full.
         if self.is_bucket_full():
             if self.is_cache_full():
-                self.logger.debug('Ignoring node {} because bucket/cache {} is full'.format(node, self.i))
+                self.logger.debug('Ignoring node %s because bucket/cache %s is full', node, self.i)
             else:
-                self.logger.debug('Adding node {} to cache {}'.format(node, self.i))
+                self.logger.debug('Adding node %s to cache %s', node, self.i)
                 self.cache.append(node)
+            return False
 
         # Add this node to our bucket since we have space. This is because it's either a new node
         # or an existing one we just removed.
         else:
-            self.logger.debug('Adding node {} to bucket {}'.format(node, self.i))
+            self.logger.debug('Adding node %s to bucket %s', node, self.i)
             self.bucket.append(node)
+            return True
 
     def remove(self, node, replace=True):
         """
@@ -103,44 +125,74 @@ class KBucket:
         """
         # Remove node if exists in our main bucket.
         if node in self.bucket:
-            self.logger.debug('Removing node {} from bucket {}'.format(node, self.i))
+            self.logger.debug('Removing node %s from bucket %s', node, self.i)
             self.bucket.remove(node)
 
             # If we're requesting a replacement and have active nodes in our cache,
             # replace the removed node with the most-recently seen node from the cache.
             if replace and not self.is_cache_empty():
                 cached_node = self.cache.pop()
-                self.logger.debug('Replacing with node {} from cache {}'.format(cached_node, self.i))
+                self.logger.debug('Replacing with node %s from cache %s', cached_node, self.i)
                 self.bucket.append(cached_node)
 
         # Remove node if in our cache.
         elif node in self.cache:
-            self.logger.debug('Removing node {} from cache {}'.format(node, self.i))
+            self.logger.debug('Removing node %s from cache %s', node, self.i)
             self.cache.remove(node)
 
 
+class Buckets(dict):
+    """
+    The :class:`~kettle.routing.KBucket` instances of a routing table, keyed by index and created the first
+    time an index is used.
+
+    Most buckets of a table stay empty, so creating them on demand keeps new nodes cheap. A bucket created
+    late counts as last touched when the table was created, so it is refreshed on the same schedule as if it
+    had always existed.
+    """
+
+    def __init__(self, k=K, sz=HASH_LENGTH):
+        super().__init__()
+        self.k = k
+        self.sz = sz
+        self.created = time.monotonic()
+
+    def __missing__(self, index):
+        if not 0 <= index < self.sz:
+            raise IndexError('Bucket index out of range: {}'.format(index))
+        bucket = self[index] = KBucket(index, self.k)
+        bucket.last_touched = self.created
+        return bucket
+
+
 class RoutingTable(object):
     """
     Represents a table that maintains nodes within a network across the entire id hash key space.
     """
+
+    logger = ClassLogger()
+
     def __init__(self, node, k=K, sz=HASH_LENGTH):
         self.node_id = node.node_id
         self.k = k
         self.sz = sz
-        self.table = [KBucket(i, k) for i in range(0, self.sz)]
-        self.logger = LOGGER.child(self)
+        self.table = Buckets(k, sz)
+        self.prober = None
 
     def __repr__(self):
         return '<{}(node_id={}, k={})>'.format(self.__class__.__name__, self.node_id, self.k)
 
     def __str__(self):
-        return '{} [{}] {}/{}'.format(self.__class__.__name__, self.node_id.id, len(self), len(self.table) * self.k)
+        return '{} [{}] {}/{}'.format(self.__class__.__name__, self.node_id.id, len(self), self.sz * self.k)
 
     def __len__(self):
-        return sum(map(len, self.table))
+        return sum(map(len, self.table.values()))
 
     def __iter__(self):
-        return iter(self.table)
+        """
+        Iterate over the buckets created so far in index order; buckets never used hold no nodes.
+        """
+        return iter([self.table[i] for i in sorted(self.table)])
 
     def update(self, node_id):
         """
@@ -153,9 +205,11 @@ class RoutingTable(object):
 
         # Calculate index of KBucket to store node in based on distance from ourselves.
         index = self.node_id.get_distance_bit(node_id)
-        self.logger.debug('Updating node {} from bucket {}'.format(node_id, index))
+        self.logger.debug('Updating node %s from bucket %s', node_id, index)
 
-        self.table[index].update(node_id)
+        # A full bucket asks the prober to check whether its least-recently seen node is still alive.
+        if not self.table[index].update(node_id) and self.prober is not None:
+            self.prober.schedule(index)
 
     def remove(self, node_id):
         """
@@ -169,10 +223,73 @@ class RoutingTable(object):
 
         # Calculate index of KBucket to store node in based on distance from ourselves.
         index = self.node_id.get_distance_bit(node_id)
-        self.logger.debug('Removing node {} from bucket {}'.format(node_id, index))
+        self.logger.debug('Removing node %s from bucket %s', node_id, index)
 
         self.table[index].remove(node_id)
 
+    def touch(self, key):
+        """
+        Mark the :class:`~kettle.routing.KBucket` whose range covers the given key as recently active.
+
+        :param key: Key being looked up.
+        """
+        self.table[self.node_id.get_distance_bit(key)].touch()
+
+    def stale_buckets(self, age):
+        """
+        Return indices of the buckets, from our closest neighbour outwards, that haven't been touched in the
+        last `age` seconds. Buckets closer than our nearest neighbour can't hold any nodes and are skipped.
+        Buckets that haven't been created yet count as last touched when the table was created.
+
+        :param age: Number of seconds after which a bucket is considered stale.
+        """
+        nearest = self.nearest_index()
+        if nearest is None:
+            return []
+        now = time.monotonic()
+        unused = now - self.table.created >= age
+        stale = []
+        for i in range(nearest, self.sz):
+            bucket = self.table.get(i)
+            if bucket.is_stale(age, now) if bucket is not None else unused:
+                stale.append(i)
+        return stale
+
+    def restore(self, entries):
+        """
+        Restore nodes loaded from a snapshot, keeping their bucket/cache placement and least-recently seen order.
+
+        Nodes are re-bucketed by distance, so a snapshot taken under a different table id is still usable. Bucket
+        nodes go through :meth:`update`, so those that no longer fit are cached and the full bucket is probed.
+
+        :param entries: Iterable of `(index, node_id, cache)` tuples as returned by :func:`~kettle.snapshot.loads`.
+        """
+        for _, node_id, cache in entries:
+            if self.node_id == node_id:
+                continue
+            bucket = self.table[self.node_id.get_distance_bit(node_id)]
+            if node_id in bucket:
+                continue
+            if not cache:
+                self.update(node_id)
+            elif not bucket.is_cache_full():
+                bucket.cache.append(node_id)
+
+    def random_id(self, index):
+        """
+        Return a random id that falls within the range of the :class:`~kettle.routing.KBucket` at the given index.
+
+        :param index: Index of the :class:`~kettle.routing.KBucket` in the table.
+        """
+        distance = (1 << index) | random.getrandbits(index) if index else random.getrandbits(1)
+        return self.node_id.id ^ distance
+
+    def nearest_index(self):
+        """
+        Return the index of the closest non-empty :class:`~kettle.routing.KBucket`, or `None` if the table is empty.
+        """
+        return min((i for i, bucket in self.table.items() if len(bucket)), default=None)
+
     def find_k_closest_nodes_triples(self, key, exclude=None, k=None):
         """
         Find the `k` closest nodes as a list of `triples`.
@@ -227,4 +344,4 @@ class RoutingTable(object):
 
         # Go through +-1 bucket indicies and yield back buckets until we've exhausted the key space.
         for buckets in itertools.zip_longest(range(index, start - 1, -1), range(index + 1, end, 1)):
-            yield from (self.table[b] for b in buckets if b is not None)
+            yield from (self.table[b] for b in buckets if b in self.table)
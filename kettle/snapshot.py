@@ -0,0 +1,129 @@
+"""
+    kettle.snapshot
+    ~~~~~~~~~~~~~~~
+
+    Contains a compact binary snapshot format for persisting a routing table between restarts.
+"""
+__all__ = ['SnapshotError', 'dumps', 'loads', 'save', 'load']
+
+
+import os
+import socket
+import struct
+
+from kettle.exceptions import KettleError
+from kettle.id import NodeId
+
+
+#: Leading bytes identifying a routing table snapshot.
+MAGIC = b'KTRT'
+
+#: Version of the snapshot format.
+VERSION = 1
+
+#: Header: magic, version, k, id size in bytes, table node id follows.
+HEADER = struct.Struct('!4sBHB')
+
+#: Entry: bucket index, flags, port; address and node id follow.
+ENTRY = struct.Struct('!HBH')
+
+#: Entry flag set for nodes stored in a bucket's replacement cache.
+FLAG_CACHE = 0x01
+
+#: Entry flag set for nodes with an IPv6 address.
+FLAG_IPV6 = 0x02
+
+
+class SnapshotError(KettleError):
+    pass
+
+
+def pack_entry(index, node_id, cache, id_size):
+    """
+    Return the packed bytes for a single node entry, or `None` if its host isn't a numeric IP address.
+    """
+    host, port = node_id.address[:2]
+    flags = FLAG_CACHE if cache else 0
+    try:
+        packed = socket.inet_pton(socket.AF_INET, host)
+    except (OSError, TypeError):
+        try:
+            packed = socket.inet_pton(socket.AF_INET6, host)
+        except (OSError, TypeError):
+            return None
+        flags |= FLAG_IPV6
+    return ENTRY.pack(index, flags, port) + packed + node_id.id.to_bytes(id_size, 'big')
+
+
+def dumps(table):
+    """
+    Return a snapshot of the given :class:`~kettle.routing.RoutingTable` as bytes.
+
+    Buckets and replacement caches are written in least-recently seen order so it is preserved on restore.
+    """
+    id_size = table.sz // 8
+    chunks = [HEADER.pack(MAGIC, VERSION, table.k, id_size), table.node_id.id.to_bytes(id_size, 'big')]
+    for bucket in table:
+        for cache, nodes in ((False, bucket.bucket), (True, bucket.cache)):
+            for node_id in nodes:
+                entry = pack_entry(bucket.i, node_id, cache, id_size)
+                if entry is not None:
+                    chunks.append(entry)
+    return b''.join(chunks)
+
+
+def loads(data):
+    """
+    Parse a snapshot created by :func:`dumps`.
+
+    Returns a tuple of the table's node id and a list of `(index, node_id, cache)` entries.
+    """
+    try:
+        magic, version, k, id_size = HEADER.unpack_from(data, 0)
+    except struct.error as e:
+        raise SnapshotError('Invalid snapshot header: {}'.format(e))
+    if magic != MAGIC or version != VERSION:
+        raise SnapshotError('Unsupported snapshot: magic={!r}, version={}'.format(magic, version))
+
+    offset = HEADER.size
+    table_id = int.from_bytes(data[offset:offset + id_size], 'big')
+    offset += id_size
+
+    entries = []
+    try:
+        while offset < len(data):
+            index, flags, port = ENTRY.unpack_from(data, offset)
+            offset += ENTRY.size
+
+            family, size = (socket.AF_INET6, 16) if flags & FLAG_IPV6 else (socket.AF_INET, 4)
+            host = socket.inet_ntop(family, data[offset:offset + size])
+            offset += size
+
+            if offset + id_size > len(data):
+                raise SnapshotError('Truncated snapshot entry')
+            node_id = NodeId((host, port), int.from_bytes(data[offset:offset + id_size], 'big'))
+            offset += id_size
+
+            entries.append((index, node_id, bool(flags & FLAG_CACHE)))
+    except (struct.error, ValueError) as e:
+        raise SnapshotError('Invalid snapshot entry: {}'.format(e))
+
+    return table_id, entries
+
+
+def save(table, path):
+    """
+    Atomically write a snapshot of the given table to a file.
+    """
+    temp = '{}.tmp'.format(path)
+    with open(temp, 'wb') as f:
+        f.write(dumps(table))
+    os.replace(temp, path)
+
+
+def load(path):
+    """
+    Read a snapshot file; see :func:`loads`.
+    """
+    with open(path, 'rb') as f:
+        return loads(f.read())
@@ -0,0 +1,137 @@
+"""
+    kettle.tracing
+    ~~~~~~~~~~~~~~
+
+    Contains sampled span tracing of lookups and RPC requests, exported as JSON lines.
+"""
+__all__ = ['Span', 'Tracer']
+
+
+import itertools
+import json
+import random
+import time
+
+from kettle.constants import DEFAULT_TRACE_SAMPLE_RATE
+
+
+class Span:
+    """
+    A timed operation within a trace. Spans form a tree under the root span of their trace, and the whole
+    tree is written out when the root finishes.
+    """
+
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent', 'name', 'start', 'end', 'outcome', 'attributes',
+                 'children')
+
+    def __init__(self, tracer, trace_id, span_id, parent, name, attributes):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent = parent
+        self.name = name
+        self.start = tracer.clock()
+        self.end = None
+        self.outcome = None
+        self.attributes = attributes
+        self.children = []
+
+    def __repr__(self):
+        return '<{}(name={}, trace_id={}, span_id={}, outcome={})>'.format(self.__class__.__name__, self.name,
+                                                                           self.trace_id, self.span_id, self.outcome)
+
+    @property
+    def duration(self):
+        return None if self.end is None else self.end - self.start
+
+    def child(self, name, **attributes):
+        """
+        Start a span nested under this one.
+        """
+        span = Span(self.tracer, self.trace_id, next(self.tracer.ids), self, name, attributes)
+        self.children.append(span)
+        return span
+
+    def update(self, **attributes):
+        """
+        Add attributes to the span; allowed until its trace is written.
+        """
+        self.attributes.update(attributes)
+
+    def finish(self, outcome='ok', **attributes):
+        """
+        End the span with the given outcome. Finishing the root span writes out the trace.
+        """
+        if self.end is not None:
+            return
+        self.end = self.tracer.clock()
+        self.outcome = outcome
+        self.attributes.update(attributes)
+        if self.parent is None:
+            self.tracer.emit(self)
+
+    def to_dict(self, origin):
+        """
+        Return the span as a dictionary, with times in seconds relative to `origin`.
+        """
+        return dict(attributes=self.attributes, duration=self.duration, id=self.span_id, name=self.name,
+                    offset=self.start - origin, outcome=self.outcome or 'unfinished',
+                    parent=self.parent.span_id if self.parent is not None else None)
+
+
+class Tracer:
+    """
+    Records a sample of traces and writes each as one JSON line to `path` or `stream`.
+
+    Only a `sample_rate` fraction of :meth:`start` calls return a span; the rest return `None`, and callers
+    skip all tracing work for them. A trace line holds the root span's name, wall clock start, duration and
+    outcome and a flat list of every span in its tree, linked by parent id.
+    """
+
+    def __init__(self, path=None, stream=None, sample_rate=DEFAULT_TRACE_SAMPLE_RATE, seed=None,
+                 clock=time.perf_counter):
+        self.path = path
+        self.stream = stream if stream is not None else open(path, 'a', buffering=1)
+        self.sample_rate = sample_rate
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.ids = itertools.count(1)
+        self.started = 0
+        self.written = 0
+
+    def __repr__(self):
+        return '<{}(path={}, sample_rate={}, written={})>'.format(self.__class__.__name__, self.path,
+                                                                  self.sample_rate, self.written)
+
+    def start(self, name, **attributes):
+        """
+        Start a new trace, returning its root span, or `None` if the trace isn't sampled.
+        """
+        if self.sample_rate < 1 and self.random.random() >= self.sample_rate:
+            return None
+        self.started += 1
+        span_id = next(self.ids)
+        return Span(self, span_id, span_id, None, name, attributes)
+
+    def emit(self, root):
+        """
+        Write a finished trace.
+        """
+        spans = []
+        pending = list(root.children)
+        while pending:
+            span = pending.pop(0)
+            spans.append(span.to_dict(root.start))
+            pending.extend(span.children)
+
+        record = dict(trace_id=root.trace_id, name=root.name, timestamp=time.time() - root.duration,
+                      duration=root.duration, outcome=root.outcome, attributes=root.attributes, spans=spans)
+        self.stream.write(json.dumps(record, sort_keys=True, default=str) + '\n')
+        self.written += 1
+
+    def close(self):
+        """
+        Close the output file, if the tracer opened it.
+        """
+        if self.path is not None:
+            self.stream.close()
@@ -0,0 +1,41 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import unittest
+
+from kettle.admission import AdmissionController
+
+
+class AdmissionTestCase(unittest.TestCase):
+
+    def test_default_rate_admits_busy_peer(self):
+        # One peer sending 2000 requests a second for a second, each handled straight away.
+        now = [0.0]
+        admission = AdmissionController(clock=lambda: now[0])
+        for _ in range(2000):
+            now[0] += 0.0005
+            self.assertIsNone(admission.admit(None, ('10.0.0.1', 8800)))
+            admission.next()
+            admission.done()
+        self.assertEqual(admission.counters['admitted'], 2000)
+
+    def test_default_rate_sheds_flooding_peer(self):
+        # One peer sending 10000 requests a second for two seconds only gets its burst and sustained rate.
+        now = [0.0]
+        admission = AdmissionController(clock=lambda: now[0])
+        for _ in range(20000):
+            now[0] += 0.0001
+            if admission.admit(None, ('10.0.0.1', 8800)) is None:
+                admission.next()
+                admission.done()
+        self.assertAlmostEqual(admission.counters['admitted'], 4000, delta=10)
+        self.assertEqual(admission.counters[AdmissionController.rate_limited], 20000 - admission.counters['admitted'])
+
+    def test_rate_limit_sheds_flood(self):
+        admission = AdmissionController(rate=10, burst=5, clock=lambda: 0.0)
+        reasons = [admission.admit(None, ('10.0.0.1', 8800)) for _ in range(10)]
+        self.assertEqual(reasons.count(None), 5)
+        self.assertEqual(reasons.count(AdmissionController.rate_limited), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
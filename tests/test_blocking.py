@@ -0,0 +1,52 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import asyncio
+import concurrent.futures
+import threading
+import unittest
+
+from kettle.blocking import BlockingClient
+from kettle.node import Node
+
+
+class BlockingClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.node = Node(('127.0.0.1', 19850), loop=self.loop)
+        self.node.listen()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.node.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def test_put_get(self):
+        with BlockingClient(('127.0.0.1', 0), seeds=[self.node.address], timeout=5) as client:
+            self.assertEqual(client.ping(self.node.address), self.node.id)
+            self.assertEqual(client.put('drink', 'Round-tine'), 1)
+            self.assertEqual(client.get_many(['drink', 'food']), {'drink': 'Round-tine'})
+
+    def test_close_releases_socket_and_tasks(self):
+        client = BlockingClient(('127.0.0.1', 0), timeout=5)
+        sock = client.client.connection.protocol.transport.get_extra_info('socket')
+        future = asyncio.run_coroutine_threadsafe(client.client.ping(('127.0.0.1', 19851)), client.loop)
+        client.close()
+        self.assertFalse(client.thread.is_alive())
+        self.assertTrue(client.loop.is_closed())
+        self.assertEqual(sock.fileno(), -1)
+        self.assertTrue(future.cancelled())
+
+    def test_failed_bootstrap_stops_thread(self):
+        threads = threading.active_count()
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            BlockingClient(('127.0.0.1', 0), seeds=[('127.0.0.1', 19851)], timeout=0.1)
+        self.assertEqual(threading.active_count(), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import asyncio
+import unittest
+
+from kettle.breaker import CircuitBreaker
+from kettle.connection import ServerConnection
+from kettle.exceptions import KettleRpcRejected, KettleRpcTimeout, KettleRpcUnavailable
+from kettle.loopback import LoopbackNetwork
+from kettle.node import Node
+
+
+class BreakerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.network = LoopbackNetwork(self.loop)
+        address = ('10.0.0.1', 8800)
+        self.node = Node(address, loop=self.loop, connection=ServerConnection(address, self.loop, network=self.network))
+        self.node.listen()
+        self.now = [0.0]
+        self.node.breaker = CircuitBreaker(threshold=1, timeout=10, clock=lambda: self.now[0])
+        self.peer = ('10.0.0.2', 8800)
+        self.hooks = []
+        self.node.add_hook('rpc', lambda *args: self.hooks.append(args))
+
+    def tearDown(self):
+        self.node.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def ping(self, timeout=0.01):
+        return self.loop.run_until_complete(self.node.ping(self.peer, timeout=timeout))
+
+    def open_circuit(self):
+        with self.assertRaises(KettleRpcTimeout):
+            self.ping()
+        self.assertEqual(self.node.breaker.state(self.peer), CircuitBreaker.open)
+        self.now[0] += 10
+
+    def test_open_circuit_skips_hook(self):
+        self.open_circuit()
+        self.now[0] -= 5
+        with self.assertRaises(KettleRpcUnavailable):
+            self.ping()
+        self.assertEqual(len(self.hooks), 1)
+
+    def test_cancelled_trial_releases_circuit(self):
+        self.open_circuit()
+        task = self.loop.create_task(self.node.ping(self.peer, timeout=1))
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.assertFalse(self.node.breaker.allow(self.peer))
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            self.loop.run_until_complete(task)
+        self.assertEqual(self.node.breaker.state(self.peer), CircuitBreaker.half_open)
+        self.assertTrue(self.node.breaker.allow(self.peer))
+
+    def test_only_trial_releases_circuit(self):
+        breaker = CircuitBreaker(threshold=1, timeout=10, clock=lambda: self.now[0])
+        earlier = breaker.allow(self.peer)
+        breaker.record_failure(self.peer, earlier)
+        self.now[0] += 10
+        trial = breaker.allow(self.peer)
+        self.assertTrue(trial)
+        breaker.release(self.peer, earlier)
+        self.assertFalse(breaker.allow(self.peer))
+        breaker.release(self.peer, trial)
+        self.assertTrue(breaker.allow(self.peer))
+
+    def test_only_trial_failure_reopens_circuit(self):
+        breaker = CircuitBreaker(threshold=1, timeout=10, clock=lambda: self.now[0])
+        breaker.record_failure(self.peer, breaker.allow(self.peer))
+        self.now[0] += 10
+        trial = breaker.allow(self.peer)
+        self.assertFalse(breaker.record_failure(self.peer, True))
+        self.assertEqual(breaker.state(self.peer), CircuitBreaker.half_open)
+        self.assertFalse(breaker.allow(self.peer))
+        self.assertTrue(breaker.record_failure(self.peer, trial))
+        self.assertEqual(breaker.state(self.peer), CircuitBreaker.open)
+
+    def test_rejected_trial_closes_circuit(self):
+        self.open_circuit()
+
+        @asyncio.coroutine
+        def reject(request, address, timeout=None):
+            raise KettleRpcRejected('overloaded')
+
+        self.node.connection.send_request = reject
+        with self.assertRaises(KettleRpcRejected):
+            self.ping()
+        self.assertEqual(self.node.breaker.state(self.peer), CircuitBreaker.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
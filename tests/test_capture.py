@@ -0,0 +1,101 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import asyncio
+import io
+import unittest
+
+from kettle.capture import CaptureReader, CaptureRecord, CaptureWriter, Replayer
+from kettle.connection import ServerConnection
+from kettle.id import Id
+from kettle.loopback import LoopbackNetwork
+from kettle.node import Node
+
+
+class CaptureTestCase(unittest.TestCase):
+
+    def capture(self, records):
+        """
+        Return the bytes of a capture holding the given records, timed by their offsets.
+        """
+        stream = io.BytesIO()
+        times = iter([10.0] + [10.0 + record.offset for record in records])
+        writer = CaptureWriter(stream=stream, clock=lambda: next(times))
+        for record in records:
+            writer.write(record.data, record.address, record.outbound)
+        writer.close()
+        return stream.getvalue()
+
+    def read(self, data):
+        return list(CaptureReader(stream=io.BytesIO(data)))
+
+    def test_round_trip(self):
+        records = [CaptureRecord(0.0, False, ('10.0.0.1', 8800), b'ipv4'),
+                   CaptureRecord(0.25, True, ('fe80::1', 8801), b'ipv6'),
+                   CaptureRecord(1.5, False, ('node.example.com', 8802), b'name'),
+                   CaptureRecord(2.0, True, ('10.0.0.1', 8800), b'')]
+        self.assertEqual(self.read(self.capture(records)), records)
+
+    def test_truncated_last_record_ends_iteration(self):
+        records = [CaptureRecord(0.0, False, ('10.0.0.1', 8800), b'first'),
+                   CaptureRecord(0.5, False, ('::1', 8800), b'second')]
+        data = self.capture(records)
+        self.assertEqual(self.read(data[:-1]), records[:1])
+        # Cut inside the header of the last record.
+        self.assertEqual(self.read(data[:-len(b'second') - 20]), records[:1])
+
+    def test_not_a_capture(self):
+        with self.assertRaises(ValueError):
+            CaptureReader(stream=io.BytesIO(b'JUNKJUNKJUNKJUNK'))
+        with self.assertRaises(ValueError):
+            CaptureReader(stream=io.BytesIO(b'KCAP'))
+
+
+class ReplayerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.nodes = []
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def node(self, network, address):
+        node = Node(address, loop=self.loop, connection=ServerConnection(address, self.loop, network=network))
+        node.listen()
+        self.nodes.append(node)
+        return node
+
+    def read(self, stream):
+        return list(CaptureReader(stream=io.BytesIO(stream.getvalue())))
+
+    def test_replay_as_fast_as_possible(self):
+        network = LoopbackNetwork(self.loop, latency=0.01)
+        captured = self.node(network, ('10.0.0.1', 8800))
+        sender = self.node(network, ('10.0.0.2', 8800))
+        stream = io.BytesIO()
+        captured.connection.protocol.capture = CaptureWriter(stream=stream)
+        self.loop.run_until_complete(sender.ping(captured.node_id))
+        self.loop.run_until_complete(sender.store(captured.node_id, Id.from_key('drink'), 'Round-tine'))
+        captured.connection.protocol.capture.close()
+
+        records = self.read(stream)
+        inbound = [record for record in records if not record.outbound]
+        self.assertEqual(len(inbound), 2)
+        self.assertEqual(len(records), 4)
+
+        # Replay into a fresh node on another network; its replies go nowhere.
+        replay_network = LoopbackNetwork(self.loop)
+        replay = self.node(replay_network, ('10.0.0.1', 8800))
+        replayer = Replayer(replay.connection.protocol, records, speed=0, loop=self.loop)
+        report = self.loop.run_until_complete(replayer.run())
+        self.assertEqual(report['replayed'], 2)
+        self.assertEqual(report['bytes'], sum(len(record.data) for record in inbound))
+        self.assertEqual(replay.db, {Id.from_key('drink'): 'Round-tine'})
+        self.assertEqual(replay_network.counters['sent'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import asyncio
+import unittest
+
+from kettle.admission import AdmissionController
+from kettle.connection import ClientConnection, ServerConnection
+from kettle.exceptions import KettleRpcRejected
+from kettle.loopback import LoopbackNetwork
+from kettle.node import Node
+from kettle.peer import Client
+
+
+class ClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.network = LoopbackNetwork(self.loop)
+        address = ('10.0.0.1', 8800)
+        self.node = Node(address, loop=self.loop, connection=ServerConnection(address, self.loop, network=self.network))
+        self.node.listen()
+        address = ('10.0.1.1', 9000)
+        self.client = Client(address, loop=self.loop, max_peer_requests=2, retries=10, backoff=0.01)
+        self.client.connection = ClientConnection(address, self.loop, network=self.network)
+        self.client.connect()
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.node.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def test_peer_requests_capped(self):
+        counts = [0, 0]
+
+        @asyncio.coroutine
+        def rpc(node, span=None):
+            counts[0] += 1
+            counts[1] = max(counts)
+            yield from asyncio.sleep(0.01, loop=self.loop)
+            counts[0] -= 1
+            return True
+
+        calls = [self.client.call(rpc, self.node.address) for _ in range(6)]
+        results = self.loop.run_until_complete(asyncio.gather(*calls, loop=self.loop))
+        self.assertEqual(results, [True] * 6)
+        self.assertEqual(counts[1], 2)
+        self.assertEqual(self.client.peers, {})
+
+    def test_rejected_requests_retried(self):
+        self.node.connection.protocol.admission = AdmissionController(rate=200, burst=2)
+        self.loop.run_until_complete(self.client.bootstrap([self.node.address]))
+        stored = self.loop.run_until_complete(self.client.put_many(dict(('key-{}'.format(i), i) for i in range(10))))
+        self.assertEqual(set(stored.values()), {1})
+        self.assertGreater(self.node.connection.protocol.admission.counters[AdmissionController.rate_limited], 0)
+
+    def test_rejection_raised_after_retries(self):
+        self.client.retries = 2
+        attempts = []
+
+        @asyncio.coroutine
+        def rpc(node, span=None):
+            attempts.append(node)
+            raise KettleRpcRejected('overloaded')
+
+        with self.assertRaises(KettleRpcRejected):
+            self.loop.run_until_complete(self.client.call(rpc, self.node.address))
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(self.client.peers, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
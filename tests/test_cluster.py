@@ -0,0 +1,45 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import time
+import unittest
+
+from kettle.cluster import Supervisor
+
+
+class ClusterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.supervisor = Supervisor(('127.0.0.1', 19800), workers=2, nodes=2, report_interval=0.1)
+
+    def tearDown(self):
+        self.supervisor.stop(timeout=1)
+
+    def wait(self, predicate, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.supervisor.poll(0.1)
+            self.supervisor.check()
+            if predicate():
+                return True
+        return False
+
+    def test_worker_requests_answered(self):
+        self.assertEqual(self.supervisor.worker_seeds(0), [])
+        self.assertEqual(self.supervisor.worker_seeds(1), [('127.0.0.1', 19800)])
+        self.supervisor.start()
+
+        # The second worker bootstraps from the first, so it sends requests and must get their responses.
+        def joined():
+            report = self.supervisor.reports.get(1)
+            return report is not None and report['stats']['contacts'] >= 2 and not report['stats']['futures']
+        self.assertTrue(self.wait(joined))
+
+        stats = self.supervisor.reports[1]['stats']
+        self.assertEqual(stats['timeouts'], 0)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(set(self.supervisor.health()), {0, 1})
+        self.assertTrue(all(h['alive'] for h in self.supervisor.health().values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import asyncio
+import unittest
+
+from kettle.congestion import CongestionController
+from kettle.connection import ServerConnection
+from kettle.exceptions import KettleRpcTimeout, KettleRpcUnavailable
+from kettle.loopback import LoopbackNetwork
+from kettle.node import Node
+
+
+class CongestionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.network = LoopbackNetwork(self.loop)
+        address = ('10.0.0.1', 8800)
+        self.node = Node(address, loop=self.loop,
+                         connection=ServerConnection(address, self.loop, network=self.network))
+        self.node.breaker = None
+        self.node.listen()
+        self.protocol = self.node.connection.protocol
+        self.protocol.congestion = CongestionController(window=1)
+
+    def tearDown(self):
+        self.node.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def gather(self, *coros):
+        return self.loop.run_until_complete(asyncio.gather(*coros, loop=self.loop, return_exceptions=True))
+
+    def test_timeout_bounds_time_queued(self):
+        # Nothing listens at the address, so the first request holds the window until it times out.
+        start = self.loop.time()
+        results = self.gather(*(self.node.ping(('10.0.0.2', 8800), timeout=0.05) for _ in range(3)))
+        self.assertTrue(all(isinstance(r, KettleRpcTimeout) for r in results))
+        self.assertLess(self.loop.time() - start, 0.1)
+        self.assertEqual(self.protocol.congestion.queued, 0)
+        self.assertFalse(self.protocol.requests)
+        self.assertFalse(self.protocol.queued)
+
+    def test_fail_requests_fails_queued_only(self):
+        address = ('10.0.0.2', 8800)
+        tasks = [self.loop.create_task(self.node.ping(address, timeout=0.05)) for _ in range(3)]
+        self.loop.run_until_complete(asyncio.sleep(0.01, loop=self.loop))
+        self.node.connection.fail_requests(address, KettleRpcUnavailable('down'))
+        results = self.gather(*tasks)
+        self.assertIsInstance(results[0], KettleRpcTimeout)
+        self.assertIsInstance(results[1], KettleRpcUnavailable)
+        self.assertIsInstance(results[2], KettleRpcUnavailable)
+        self.assertEqual(self.protocol.congestion.queued, 0)
+
+    def test_rejection_is_not_loss(self):
+        congestion = self.protocol.congestion
+        congestion.submit('peer', lambda: True)
+        congestion.release('peer', success=False, rejected=True)
+        self.assertEqual(congestion.timeouts, 0)
+        self.assertEqual(congestion.rejections, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import asyncio
+import time
+import unittest
+
+from kettle.connection import ServerConnection
+from kettle.loopback import LoopbackNetwork, VirtualClockEventLoop
+from kettle.node import Node
+
+
+class VirtualClockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = VirtualClockEventLoop()
+        self.network = LoopbackNetwork(self.loop, latency=0.25)
+        self.nodes = []
+        for host in ('10.0.0.1', '10.0.0.2'):
+            address = (host, 8800)
+            node = Node(address, loop=self.loop, connection=ServerConnection(address, self.loop, network=self.network))
+            node.listen()
+            self.nodes.append(node)
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def test_sleep_advances_clock_only(self):
+        start = time.monotonic()
+        self.loop.run_until_complete(asyncio.sleep(60, loop=self.loop))
+        self.assertEqual(self.loop.time(), 60)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_round_trip_measures_link_latency(self):
+        first, second = self.nodes
+        start = self.loop.time()
+        self.loop.run_until_complete(first.ping(second.node_id))
+        self.assertAlmostEqual(self.loop.time() - start, 0.5)
+        self.assertEqual(first.connection.protocol.stats()['late'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
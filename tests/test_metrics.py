@@ -0,0 +1,94 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import asyncio
+import functools
+import unittest
+
+from kettle.connection import ServerConnection
+from kettle.loopback import LoopbackNetwork
+from kettle.metrics import Histogram, ProtocolMetrics, Registry
+from kettle.node import Node
+from kettle.protocol import ServerProtocol
+
+
+class ExpositionTestCase(unittest.TestCase):
+
+    def test_counter_and_gauge_format(self):
+        registry = Registry()
+        registry.counter('kettle_test_total', 'Things counted.', ('kind',)).inc(('a"b',), 3)
+        gauge = registry.gauge('kettle_test_value', 'A value.')
+        gauge.set(2)
+        gauge.add_callback(lambda: 5)
+        self.assertEqual(registry.expose(), '\n'.join([
+            '# HELP kettle_test_total Things counted.',
+            '# TYPE kettle_test_total counter',
+            'kettle_test_total{kind="a\\"b"} 3',
+            '# HELP kettle_test_value A value.',
+            '# TYPE kettle_test_value gauge',
+            'kettle_test_value 7',
+            '']))
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('kettle_test_seconds', 'Durations.', ('op',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, ('get',))
+        self.assertEqual(histogram.expose().split('\n')[2:], [
+            'kettle_test_seconds_bucket{op="get",le="0.1"} 2',
+            'kettle_test_seconds_bucket{op="get",le="1.0"} 3',
+            'kettle_test_seconds_bucket{op="get",le="+Inf"} 4',
+            'kettle_test_seconds_sum{op="get"} 2.65',
+            'kettle_test_seconds_count{op="get"} 4'])
+
+    def test_histogram_quantile(self):
+        histogram = Histogram('kettle_test_seconds', buckets=(0.1, 1.0))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.count(), 4)
+        self.assertEqual(histogram.quantile(0.25), 0.1)
+        self.assertEqual(histogram.quantile(0.5), 1.0)
+        self.assertEqual(histogram.quantile(1.0), float('inf'))
+
+
+class ProtocolMetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.network = LoopbackNetwork(self.loop)
+        self.registry = Registry()
+        self.factory = ServerProtocol.metrics_factory
+        ServerProtocol.metrics_factory = functools.partial(ProtocolMetrics, registry=self.registry)
+        self.nodes = []
+        for host in ('10.0.0.1', '10.0.0.2'):
+            address = (host, 8800)
+            node = Node(address, loop=self.loop, connection=ServerConnection(address, self.loop, network=self.network))
+            node.listen()
+            self.nodes.append(node)
+
+    def tearDown(self):
+        ServerProtocol.metrics_factory = self.factory
+        for node in self.nodes:
+            node.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def test_shared_registry_labels_each_endpoint(self):
+        first, second = self.nodes
+        self.loop.run_until_complete(first.store(second.node_id, 42, 'value'))
+
+        self.assertEqual(self.registry['kettle_storage_keys'].collect(), {('10.0.0.1:8800',): 0,
+                                                                          ('10.0.0.2:8800',): 1})
+        table = self.registry['kettle_table_nodes'].collect()
+        self.assertEqual({key[0] for key in table}, {'10.0.0.1:8800', '10.0.0.2:8800'})
+        in_flight = self.registry['kettle_in_flight'].collect()
+        self.assertEqual(in_flight[('10.0.0.1:8800', 'sent')], 0)
+        self.assertEqual(in_flight[('10.0.0.2:8800', 'futures')], 0)
+
+        latency = self.registry['kettle_request_latency_seconds']
+        self.assertEqual(latency.count(('10.0.0.1:8800', 'store', 'ok')), 1)
+        self.assertEqual(latency.count(('10.0.0.2:8800', 'store', 'ok')), 0)
+        self.assertIn('kettle_storage_keys{endpoint="10.0.0.2:8800"} 1', self.registry.expose())
+
+
+if __name__ == '__main__':
+    unittest.main()
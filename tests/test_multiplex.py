@@ -0,0 +1,61 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import asyncio
+import unittest
+
+from kettle.connection import MultiplexConnection
+from kettle.exceptions import KettleRpcTimeout
+from kettle.id import NodeId
+from kettle.loopback import LoopbackNetwork
+from kettle.message import Message
+from kettle.node import Node
+
+
+class MultiplexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.network = LoopbackNetwork(self.loop)
+        self.connection = MultiplexConnection(('10.0.0.1', 8800), self.loop, network=self.network)
+        self.nodes = [Node(self.connection.address, loop=self.loop, connection=self.connection) for _ in range(3)]
+        for node in self.nodes:
+            node.listen()
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def test_nodes_share_connection(self):
+        self.assertTrue(all(node.connection is self.connection for node in self.nodes))
+        self.assertEqual(len(self.connection), 3)
+        self.assertEqual(len(self.network), 1)
+
+    def test_rpc_between_nodes(self):
+        first, second, third = self.nodes
+        result = self.loop.run_until_complete(first.ping(second.node_id))
+        self.assertEqual(result, second.id)
+
+        self.loop.run_until_complete(first.store(third.node_id, 42, 'value'))
+        self.assertEqual(third.db, {42: 'value'})
+        self.assertEqual(second.db, {})
+        self.assertIn(first.node_id, list(third.table.find_k_closest_nodes(first.id)))
+
+    def test_unknown_target_dropped(self):
+        first = self.nodes[0]
+        first.breaker = None
+        missing = NodeId(self.connection.address)
+        with self.assertRaises(KettleRpcTimeout):
+            self.loop.run_until_complete(first.ping(missing, timeout=0.05))
+
+    def test_untargeted_message_compatible(self):
+        message = Message.request(1, ('10.0.0.1', 8800), 'ping', ())
+        self.assertNotIn('target', message.to_dict())
+        self.assertEqual(Message.from_dict(message.to_dict()).target, None)
+        message = Message.request(1, ('10.0.0.1', 8800), 'ping', (), target=2)
+        self.assertEqual(Message.from_dict(message.to_dict()).target, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
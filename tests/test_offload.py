@@ -0,0 +1,62 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import asyncio
+import unittest
+
+from kettle.connection import ServerConnection
+from kettle.id import Id
+from kettle.loopback import LoopbackNetwork
+from kettle.node import Node
+from kettle.offload import Offloader
+
+
+class OffloadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.network = LoopbackNetwork(self.loop)
+        self.nodes = []
+        for host in ('10.0.0.1', '10.0.0.2'):
+            address = (host, 8800)
+            node = Node(address, loop=self.loop, connection=ServerConnection(address, self.loop, network=self.network))
+            node.listen()
+            node.connection.protocol.offload = Offloader(self.loop, threshold=1024)
+            self.nodes.append(node)
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def test_small_messages_counted_inline(self):
+        first, second = self.nodes
+        self.loop.run_until_complete(first.ping(second.node_id))
+        stats = first.connection.protocol.offload.stats()
+        # Encoding the request and decoding the response.
+        self.assertEqual(stats['inline'], 2)
+        self.assertEqual(stats['offloaded'], 0)
+
+    def test_large_messages_offloaded(self):
+        first, second = self.nodes
+        self.loop.run_until_complete(first.store(second.node_id, 42, 'x' * 2048))
+        self.assertEqual(second.db, {42: 'x' * 2048})
+        stats = first.connection.protocol.offload.stats()
+        self.assertEqual(stats['offloaded'], 1)
+        self.assertEqual(stats['pending'], 0)
+
+    def test_should_offload_counts_nothing(self):
+        offload = self.nodes[0].connection.protocol.offload
+        self.assertFalse(offload.should_offload(10))
+        self.assertTrue(offload.should_offload(1024))
+        self.assertEqual(offload.stats()['inline'], 0)
+
+    def test_hash_key(self):
+        offload = self.nodes[0].connection.protocol.offload
+        key_id = self.loop.run_until_complete(self.nodes[0].hash_key('x' * 2048))
+        self.assertEqual(key_id, Id.from_key('x' * 2048))
+        self.assertEqual(offload.stats()['offloaded'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
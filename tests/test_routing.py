@@ -0,0 +1,61 @@
+__author__ = 'Andrew Hawker <andrew.r.hawker@gmail.com>'
+
+import collections
+import unittest
+
+from kettle.id import NodeId
+from kettle.routing import RoutingTable
+
+
+Owner = collections.namedtuple('Owner', 'node_id')
+
+
+class Prober:
+
+    def __init__(self):
+        self.scheduled = []
+
+    def schedule(self, index):
+        self.scheduled.append(index)
+
+
+class RoutingTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.table = RoutingTable(Owner(NodeId(('10.0.0.1', 8800), 1)), k=2)
+        self.table.prober = Prober()
+
+    def node(self, n):
+        return NodeId(('10.0.1.{}'.format(n), 8800), (1 << 159) | n)
+
+    def test_restore_full_bucket_caches_and_probes(self):
+        nodes = [self.node(n) for n in range(1, 6)]
+        self.table.restore((159, node_id, False) for node_id in nodes)
+        bucket = self.table.table[159]
+        self.assertEqual(bucket.bucket, nodes[:2])
+        self.assertEqual(bucket.cache, nodes[2:4])
+        self.assertEqual(set(self.table.prober.scheduled), {159})
+
+    def test_stale_buckets_leaves_buckets_uncreated(self):
+        self.table.update(self.node(1))
+        self.table.table[159].last_touched -= 10
+        self.assertEqual(self.table.stale_buckets(5), [159])
+        self.assertEqual(list(self.table.table), [159])
+
+        self.table.table.created -= 10
+        self.assertEqual(self.table.stale_buckets(5), [159])
+        self.table.update(NodeId(('10.0.2.1', 8800), (1 << 150) | 1))
+        self.assertEqual(self.table.stale_buckets(5), list(range(151, 160)))
+        self.assertEqual(sorted(self.table.table), [150, 159])
+
+    def test_restore_keeps_cache_placement(self):
+        nodes = [self.node(n) for n in range(1, 4)]
+        self.table.restore([(159, nodes[0], False), (159, nodes[1], True), (159, nodes[2], False)])
+        bucket = self.table.table[159]
+        self.assertEqual(bucket.bucket, [nodes[0], nodes[2]])
+        self.assertEqual(bucket.cache, [nodes[1]])
+        self.assertEqual(self.table.prober.scheduled, [])
+
+
+if __name__ == '__main__':
+    unittest.main()